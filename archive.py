@@ -0,0 +1,77 @@
+"""Maintenance commands for stock_prices storage and its Parquet cold tier
+
+    python archive.py archive [--before-year 2025]   move closed years out of DuckDB
+    python archive.py compact                        merge each partition into one file
+    python archive.py status                         show what is archived
+    python archive.py cluster                        rewrite stock_prices sorted by symbol, timestamp
+    python archive.py storage                        show table/index sizes and clustering
+
+DuckDB allows one writing process per database file, so stop the API
+server before running any of these (the server re-clusters on its own;
+see STORAGE_CHECK_HOURS).
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+
+from database import StockDatabase
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Archive closed years of stock_prices to Parquet")
+    parser.add_argument("--db", default="stock_data.duckdb", help="DuckDB database file")
+    parser.add_argument("--archive", default=os.getenv("ARCHIVE_PATH", "stock_archive"), help="Parquet archive root")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    archive = commands.add_parser("archive", help="Move bars from closed years into Parquet")
+    archive.add_argument("--before-year", type=int, default=None,
+                         help="Archive bars dated before Jan 1 of this year (default: the current year)")
+    commands.add_parser("compact", help="Rewrite partitions with several files as one sorted file")
+    commands.add_parser("status", help="Show archived rows and files per symbol")
+    commands.add_parser("cluster", help="Rewrite stock_prices sorted by (symbol, timestamp), without a primary key")
+    commands.add_parser("storage", help="Show database, table and index sizes and clustering")
+    args = parser.parse_args()
+
+    with StockDatabase(args.db, archive_path=args.archive) as db:
+        if args.command == "archive":
+            counts = db.archive_closed_years(args.before_year)
+            if not counts:
+                print("✅ Nothing to archive")
+            for symbol, rows in sorted(counts.items()):
+                print(f"📦 {symbol}: archived {rows} rows")
+
+        elif args.command == "compact":
+            result = db.compact_archive()
+            print(f"✅ Compacted {result['partitions_compacted']} partitions, removed {result['files_removed']} files")
+
+        elif args.command == "cluster":
+            result = db.cluster_prices()
+            print(f"✅ Clustered stock_prices: {result['before']['row_groups_per_symbol']} -> "
+                  f"{result['after']['row_groups_per_symbol']} row groups per symbol")
+
+        elif args.command == "storage":
+            report = db.storage_report()
+            table = report['stock_prices']
+            print(f"🗄️  Database: {report['database']['used_bytes'] / 2**20:.1f} MiB used, "
+                  f"{report['database']['free_bytes'] / 2**20:.1f} MiB free, WAL {report['database']['wal_size']}")
+            print(f"📊 stock_prices: {table['rows']} rows, {table['bytes'] / 2**20:.1f} MiB, "
+                  f"{table['row_groups']} row groups, {table['symbols']} symbols, "
+                  f"{table['row_groups_per_symbol']} row groups per symbol (max {table['max_row_groups_per_symbol']}), "
+                  f"primary key: {'yes' if table['primary_key'] else 'no'}")
+            print(f"🔑 Index memory: {report['index_memory_bytes'] / 2**20:.1f} MiB")
+            for index in report['indexes']:
+                print(f"   {index['table']}: {index['definition']}")
+
+        else:
+            status = db.archive_status()
+            if not status:
+                print("No archived symbols")
+            for symbol, info in status.items():
+                print(f"{symbol}: {info['archived_rows']} rows before {info['archived_until']:%Y-%m-%d}, "
+                      f"{info['files']} files, {info['bytes'] / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Local stand-in for the Alpha Vantage HTTP API
+
+Serves GLOBAL_QUOTE, TIME_SERIES_DAILY and TIME_SERIES_INTRADAY (compact/full, JSON or
+datatype=csv) and SYMBOL_SEARCH
+from deterministic synthetic data, with configurable latency and error
+injection. Point the app at it with ALPHA_VANTAGE_BASE_URL:
+
+    python -m benchmarks.fake_upstream --port 8765 --latency 0.05 --error-rate 0.01
+    ALPHA_VANTAGE_BASE_URL=http://127.0.0.1:8765/query python main.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.synthetic import daily_index, intraday_index, random_walk, symbol_seed
+
+COMPACT_BARS = 100
+FULL_BARS = 5000
+# Intraday "full" covers about a month of sessions
+FULL_INTRADAY_DAYS = 22
+
+
+class FakeAlphaVantage:
+    """Threaded fake upstream; ``calls`` counts requests per function"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.seed = seed
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._series_cache = {}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/query"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _series(self, symbol: str, outputsize: str, datatype: str = "json", interval: str = None):
+        """Synthetic daily (or ``interval`` intraday) bars for a symbol, cached as the encoded response body"""
+        key = (symbol, outputsize, datatype, interval)
+        body = self._series_cache.get(key)
+        if body is None:
+            if interval:
+                index = intraday_index(FULL_INTRADAY_DAYS, minutes=int(interval.removesuffix("min")))
+                if outputsize != "full":
+                    index = index[-COMPACT_BARS:]
+                time_format, series_key = "%Y-%m-%d %H:%M:%S", f"Time Series ({interval})"
+            else:
+                index = daily_index(FULL_BARS if outputsize == "full" else COMPACT_BARS)
+                time_format, series_key = "%Y-%m-%d", "Time Series (Daily)"
+            frame = random_walk(index, symbol_seed(symbol, self.seed)).iloc[::-1]
+            if datatype == "csv":
+                # Same layout as Alpha Vantage: newest first, CRLF line endings
+                rows = [
+                    f"{ts.strftime(time_format)},{o:.4f},{h:.4f},{l:.4f},{c:.4f},{v}"
+                    for ts, o, h, l, c, v in zip(frame.index, frame['Open'], frame['High'], frame['Low'],
+                                                 frame['Close'], frame['Volume'])
+                ]
+                body = "\r\n".join(["timestamp,open,high,low,close,volume"] + rows + [""]).encode()
+                self._series_cache[key] = body
+                return body
+            series = {
+                ts.strftime(time_format): {
+                    "1. open": f"{o:.4f}", "2. high": f"{h:.4f}", "3. low": f"{l:.4f}",
+                    "4. close": f"{c:.4f}", "5. volume": str(v)
+                }
+                for ts, o, h, l, c, v in zip(frame.index, frame['Open'], frame['High'], frame['Low'],
+                                             frame['Close'], frame['Volume'])
+            }
+            body = json.dumps({
+                "Meta Data": {"2. Symbol": symbol, "4. Output Size": outputsize},
+                series_key: series
+            }).encode()
+            self._series_cache[key] = body
+        return body
+
+    def respond(self, params: dict) -> bytes:
+        function = params.get("function", "")
+        symbol = params.get("symbol") or params.get("keywords") or ""
+        with self._lock:
+            self.calls[function] += 1
+            roll = self._random.random()
+
+        if roll < self.error_rate:
+            return json.dumps({"Error Message": f"Invalid API call for {symbol}"}).encode()
+        if roll < self.error_rate + self.throttle_rate:
+            return json.dumps({"Note": "Thank you for using Alpha Vantage! Our standard API call frequency is 5 calls per minute."}).encode()
+
+        if function == "GLOBAL_QUOTE":
+            rng = random.Random(symbol_seed(symbol, self.seed))
+            previous = 50 + rng.random() * 450
+            price = previous * (1 + (roll - 0.5) * 0.04)
+            return json.dumps({"Global Quote": {
+                "01. symbol": symbol,
+                "05. price": f"{price:.4f}",
+                "06. volume": str(rng.randint(1_000, 1_000_000)),
+                "08. previous close": f"{previous:.4f}"
+            }}).encode()
+
+        if function == "TIME_SERIES_DAILY":
+            return self._series(symbol, params.get("outputsize", "compact"), params.get("datatype", "json"))
+
+        if function == "TIME_SERIES_INTRADAY":
+            return self._series(symbol, params.get("outputsize", "compact"), params.get("datatype", "json"),
+                                params.get("interval", "5min"))
+
+        if function == "SYMBOL_SEARCH":
+            return json.dumps({"bestMatches": [
+                {"1. symbol": symbol.upper(), "2. name": f"{symbol.upper()} Synthetic", "4. region": "United States"}
+            ]}).encode()
+
+        return json.dumps({"Error Message": f"Unsupported function: {function}"}).encode()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                if fake.latency:
+                    time.sleep(fake.latency)
+                body = fake.respond(params)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json" if body[:1] == b"{" else "text/csv")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Alpha Vantage server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 'Error Message' responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of rate-limit 'Note' responses")
+    args = parser.parse_args()
+
+    fake = FakeAlphaVantage(args.host, args.port, args.latency, args.error_rate, args.throttle_rate)
+    print(f"🧪 Fake Alpha Vantage listening on {fake.base_url}")
+    try:
+        fake.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""Benchmark StockDatabase, the history endpoints and the background cycle
+
+    python -m benchmarks.run --scale small
+    python -m benchmarks.run --scale medium --output before.json
+    python -m benchmarks.run --scale medium --compare before.json
+    python -m benchmarks.run --fixtures path/to/recorded/responses
+
+Everything runs against a throwaway database in a temp directory and a
+local FakeAlphaVantage server, never the real API. Results are written as
+JSON (one entry per benchmark with timings in milliseconds) so runs can be
+compared with --compare.
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import duckdb
+import pandas as pd
+
+from benchmarks.fake_upstream import FakeAlphaVantage
+from benchmarks.synthetic import daily_index, generate_ohlcv, intraday_index, symbol_names
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCALES = {
+    "small": {"symbols": 10, "daily_bars": 500, "intraday_symbols": 2, "intraday_days": 5,
+              "queries": 50, "cycle_symbols": 10, "fixture_symbols": 3},
+    "medium": {"symbols": 1000, "daily_bars": 500, "intraday_symbols": 10, "intraday_days": 20,
+               "queries": 200, "cycle_symbols": 50, "fixture_symbols": 10},
+    "large": {"symbols": 10000, "daily_bars": 250, "intraday_symbols": 50, "intraday_days": 20,
+              "queries": 500, "cycle_symbols": 200, "fixture_symbols": 25},
+}
+
+# A benchmark counts as regressed when it is this much slower than the baseline
+REGRESSION_THRESHOLD = 1.10
+
+
+def summarize(samples, rows=None, nbytes=None) -> dict:
+    """Timing summary in milliseconds for a list of per-iteration seconds"""
+    ordered = sorted(samples)
+    total = sum(ordered)
+    result = {
+        "iterations": len(ordered),
+        "total_s": round(total, 4),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+    if rows is not None:
+        result["rows"] = rows
+        result["rows_per_s"] = round(rows / total) if total else None
+    if nbytes is not None:
+        result["bytes"] = nbytes
+    return result
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return time.perf_counter() - start, value
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the app's logging (and any stray prints) while timing"""
+    logging.disable(logging.CRITICAL)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def record_fixtures(fake, directory, count) -> str:
+    """Write full daily histories from the fake upstream as <SYMBOL>.daily.csv / .daily.json"""
+    os.makedirs(directory, exist_ok=True)
+    for symbol in symbol_names(count, prefix="FIX"):
+        params = {"function": "TIME_SERIES_DAILY", "symbol": symbol, "outputsize": "full"}
+        with open(os.path.join(directory, f"{symbol}.daily.json"), "wb") as f:
+            f.write(fake.respond(params))
+        with open(os.path.join(directory, f"{symbol}.daily.csv"), "wb") as f:
+            f.write(fake.respond(dict(params, datatype="csv")))
+    return directory
+
+
+def bench_ingest(fetcher, fixtures_dir) -> dict:
+    """Parse recorded TIME_SERIES_DAILY bodies through the JSON and CSV paths"""
+    from data_fetcher import parse_ohlcv_csv
+
+    results = {}
+    for datatype in ("json", "csv"):
+        paths = sorted(glob.glob(os.path.join(fixtures_dir, f"*.daily.{datatype}")))
+        if not paths:
+            continue
+        samples, rows = [], 0
+        for path in paths:
+            with open(path, "rb") as f:
+                content = f.read()
+            with quiet():
+                if datatype == "csv":
+                    seconds, df = timed(parse_ohlcv_csv, content)
+                else:
+                    seconds, df = timed(lambda: fetcher._parse_historic_data("FIXTURE", json.loads(content)))
+            samples.append(seconds)
+            rows += len(df) if df is not None else 0
+        results[f"parse_daily_{datatype}"] = summarize(samples, rows=rows)
+    return results
+
+
+def bench_database(db, config, rng) -> dict:
+    results = {}
+    symbols = symbol_names(config["symbols"])
+    daily = generate_ohlcv(symbols, daily_index(config["daily_bars"]))
+
+    with quiet():
+        seconds, _ = timed(db.insert_historic_data, None, daily)
+    results["insert_daily_bulk"] = summarize([seconds], rows=len(daily))
+
+    # Re-ingesting the same bars exercises the update path of the upsert
+    with quiet():
+        seconds, _ = timed(db.insert_historic_data, None, daily)
+    results["upsert_daily_bulk"] = summarize([seconds], rows=len(daily))
+
+    sample = symbols[:min(len(symbols), 100)]
+    per_symbol = []
+    for symbol in sample:
+        frame = daily[daily['symbol'] == symbol].drop(columns='symbol')
+        with quiet():
+            per_symbol.append(timed(db.insert_historic_data, symbol, frame.tail(5))[0])
+    results["upsert_tail_per_symbol"] = summarize(per_symbol, rows=5 * len(sample))
+
+    intraday_symbols = symbol_names(config["intraday_symbols"], prefix="INT")
+    intraday = generate_ohlcv(intraday_symbols, intraday_index(config["intraday_days"]))
+    with quiet():
+        seconds, _ = timed(db.insert_historic_data, None, intraday)
+    results["insert_intraday_bulk"] = summarize([seconds], rows=len(intraday))
+
+    # The same bars in the compact intraday layout, appended one session at a time
+    sessions = intraday.groupby(intraday.index.normalize())
+    samples = []
+    with quiet():
+        for _, session in sessions:
+            samples.append(timed(db.insert_intraday_bars, None, 5, session)[0])
+    results["append_intraday_compact"] = summarize(samples, rows=len(intraday))
+
+    days = list(sessions.groups)
+    samples, rows = [], 0
+    for _ in range(config["queries"]):
+        day = rng.choice(days)
+        seconds, df = timed(db.get_intraday_data, rng.choice(intraday_symbols), 5, day, day)
+        samples.append(seconds)
+        rows += len(df)
+    results["get_intraday_data_1d"] = summarize(samples, rows=rows)
+
+    picks = [rng.choice(symbols) for _ in range(config["queries"])]
+    samples, rows = [], 0
+    for symbol in picks:
+        seconds, df = timed(db.get_historic_data, symbol)
+        samples.append(seconds)
+        rows += len(df)
+    results["get_historic_data"] = summarize(samples, rows=rows)
+
+    end = daily_index(config["daily_bars"])[-1]
+    start = end - pd.Timedelta(days=90)
+    samples, rows = [], 0
+    for symbol in picks:
+        seconds, df = timed(db.get_historic_data, symbol, start, end)
+        samples.append(seconds)
+        rows += len(df)
+    results["get_historic_data_90d"] = summarize(samples, rows=rows)
+
+    samples, rows = [], 0
+    for _ in range(max(config["queries"] // 10, 5)):
+        batch = rng.sample(symbols, min(len(symbols), 50))
+        seconds, table = timed(db.get_historic_arrow, batch)
+        samples.append(seconds)
+        rows += table.num_rows
+    results["get_historic_arrow_50_symbols"] = summarize(samples, rows=rows)
+
+    # The update cycle re-upserts each symbol's last stored bar alongside the new one;
+    # cached indicators must extend from there rather than recompute from scratch
+    from indicators import IndicatorEngine, parse_indicators
+
+    engine = IndicatorEngine(db)
+    db.add_write_listener(engine.on_write)
+    indicators = parse_indicators(None)
+    sample = symbols[:min(len(symbols), 20)]
+    engine.compute(sample, indicators)
+    full_computes = engine.full_computes
+    next_bar = daily.index.max() + pd.offsets.BDay()
+    samples = []
+    for symbol in sample:
+        last = daily[daily['symbol'] == symbol].drop(columns='symbol').tail(1)
+        with quiet():
+            db.insert_historic_data(symbol, pd.concat([last, last.set_axis([next_bar])]))
+        samples.append(timed(engine.compute, [symbol], indicators)[0])
+    if engine.full_computes != full_computes:
+        raise RuntimeError("Update-cycle writes dropped cached indicators instead of extending them")
+    results["indicators_after_update_cycle"] = summarize(samples, rows=len(sample))
+
+    # Interleaved appends scatter each symbol over many row groups; re-sort and scan again
+    with quiet():
+        seconds, layout = timed(db.cluster_prices)
+    results["cluster_prices"] = summarize([seconds], rows=db.storage_report()["stock_prices"]["rows"])
+    results["cluster_prices"].update({
+        "row_groups_per_symbol_before": layout["before"]["row_groups_per_symbol"],
+        "row_groups_per_symbol_after": layout["after"]["row_groups_per_symbol"],
+    })
+
+    samples, rows = [], 0
+    for symbol in picks:
+        seconds, df = timed(db.get_historic_data, symbol)
+        samples.append(seconds)
+        rows += len(df)
+    results["get_historic_data_clustered"] = summarize(samples, rows=rows)
+
+    return results
+
+
+def bench_endpoints(client, response_cache, config, rng) -> dict:
+    results = {}
+    symbols = symbol_names(config["symbols"])
+    picks = [rng.choice(symbols) for _ in range(config["queries"])]
+
+    # Picks repeat symbols, so empty the response cache before each request to time the query + encode path
+    for name, url in [
+        ("history_endpoint_json", "/stocks/{symbol}/history"),
+        ("history_endpoint_arrow", "/stocks/{symbol}/history?format=arrow"),
+        ("history_endpoint_weekly", "/stocks/{symbol}/history?interval=1w"),
+    ]:
+        samples, nbytes = [], 0
+        for symbol in picks:
+            response_cache.clear()
+            seconds, response = timed(client.get, url.format(symbol=symbol))
+            response.raise_for_status()
+            samples.append(seconds)
+            nbytes += len(response.content)
+        results[name] = summarize(samples, nbytes=nbytes)
+
+    # The same JSON requests served from a warm response cache
+    for symbol in set(picks):
+        client.get(f"/stocks/{symbol}/history").raise_for_status()
+    samples, nbytes = [], 0
+    for symbol in picks:
+        seconds, response = timed(client.get, f"/stocks/{symbol}/history")
+        response.raise_for_status()
+        samples.append(seconds)
+        nbytes += len(response.content)
+    results["history_endpoint_json_cached"] = summarize(samples, nbytes=nbytes)
+
+    samples, nbytes = [], 0
+    for _ in range(max(config["queries"] // 10, 5)):
+        batch = ",".join(rng.sample(symbols, min(len(symbols), 50)))
+        seconds, response = timed(client.get, f"/stocks/history?symbols={batch}")
+        response.raise_for_status()
+        samples.append(seconds)
+        nbytes += len(response.content)
+    results["history_endpoint_50_symbols"] = summarize(samples, nbytes=nbytes)
+
+    return results
+
+
+def bench_background_cycle(app_module, fake, config) -> dict:
+    """Time one update cycle over symbols the database has never seen (quote + full backfill each)"""
+    symbols = symbol_names(config["cycle_symbols"], prefix="BGC")
+    calls_before = sum(fake.calls.values())
+
+    async def cycle():
+        try:
+            return await app_module.run_update_cycle(symbols)
+        finally:
+            # The pooled HTTP client belongs to this event loop
+            await app_module.fetcher.aclose()
+
+    with quiet():
+        seconds, counts = timed(asyncio.run, cycle())
+    result = summarize([seconds])
+    result.update({
+        "symbols": len(symbols),
+        "symbols_per_s": round(len(symbols) / seconds, 2),
+        "upstream_calls": sum(fake.calls.values()) - calls_before,
+        "updated": counts["updated"],
+        "backfilled": counts["backfilled"],
+    })
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def run(scale: str, latency: float, seed: int, fixtures_dir: str = None) -> dict:
+    config = SCALES[scale]
+    rng = random.Random(seed)
+    workdir = tempfile.mkdtemp(prefix="ohlcv-bench-")
+    cwd = os.getcwd()
+
+    with FakeAlphaVantage(latency=latency, seed=seed) as fake:
+        os.environ.update({
+            "ALPHA_VANTAGE_API_KEY": "benchmark",
+            "ALPHA_VANTAGE_BASE_URL": fake.base_url,
+            "ALPHA_VANTAGE_CALLS_PER_MINUTE": "1000000",
+            "ALPHA_VANTAGE_CALLS_PER_DAY": "1000000",
+            "ARCHIVE_PATH": os.path.join(workdir, "archive"),
+        })
+        # main opens stock_data.duckdb in the working directory on import
+        os.chdir(workdir)
+        sys.path.insert(0, REPO_ROOT)
+        with quiet():
+            import main as app_module
+        from fastapi.testclient import TestClient
+
+        results = {}
+        results.update(bench_database(app_module.db.db, config, rng))
+        # No lifespan: the startup backfill and background loop would skew the timings
+        results.update(bench_endpoints(TestClient(app_module.app), app_module.response_cache, config, rng))
+        results["background_cycle"] = bench_background_cycle(app_module, fake, config)
+        ingest_dir = fixtures_dir or record_fixtures(fake, os.path.join(workdir, "fixtures"),
+                                                     config["fixture_symbols"])
+        results.update(bench_ingest(app_module.fetcher, ingest_dir))
+        app_module.db.close()
+
+    os.chdir(cwd)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "scale": scale,
+            "config": config,
+            "upstream_latency_s": latency,
+            "seed": seed,
+            "fixtures": fixtures_dir,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "duckdb": duckdb.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict) -> list:
+    """Rows of (name, metric, baseline, current, ratio, regressed) for benchmarks present in both runs"""
+    rows = []
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        metric = "p50_ms" if result.get("iterations", 1) > 1 else "total_s"
+        if not before.get(metric):
+            continue
+        ratio = result[metric] / before[metric]
+        rows.append((name, metric, before[metric], result[metric], ratio, ratio > REGRESSION_THRESHOLD))
+    return rows
+
+
+def print_results(report: dict):
+    print(f"\n📊 Benchmarks ({report['meta']['scale']}, rev {report['meta']['git_revision']})")
+    for name, result in report["results"].items():
+        extra = ""
+        if "rows_per_s" in result:
+            extra = f"  {result['rows_per_s']:,} rows/s"
+        elif "symbols_per_s" in result:
+            extra = f"  {result['symbols_per_s']} symbols/s"
+        print(f"  {name:<32} p50 {result['p50_ms']:>10.3f} ms  p95 {result['p95_ms']:>10.3f} ms"
+              f"  total {result['total_s']:>8.3f} s{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the OHLCV benchmark suite")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake upstream latency per call (seconds)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Where to write the JSON report "
+                                         "(default: benchmarks/results/<scale>-<timestamp>.json)")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--fixtures", help="Directory of recorded TIME_SERIES_DAILY bodies "
+                                           "(<SYMBOL>.daily.csv / .daily.json) for the ingest benchmarks; "
+                                           "default: record them from the fake upstream")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else os.path.join(
+        REPO_ROOT, "benchmarks", "results", f"{args.scale}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    fixtures_dir = os.path.abspath(args.fixtures) if args.fixtures else None
+    report = run(args.scale, args.latency, args.seed, fixtures_dir)
+    print_results(report)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Wrote {output}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline)
+        print(f"\n🔍 Compared with {baseline_path}")
+        for name, metric, before, after, ratio, regressed in rows:
+            flag = "⚠️ slower" if regressed else ("✅ faster" if ratio < 1 / REGRESSION_THRESHOLD else "")
+            print(f"  {name:<32} {metric:<7} {before:>10.3f} -> {after:>10.3f}  x{ratio:.2f} {flag}")
+        if any(row[5] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
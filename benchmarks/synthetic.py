@@ -0,0 +1,60 @@
+"""Synthetic OHLCV data for benchmarks"""
+import zlib
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Regular-session minutes (09:30-16:00); 78 five-minute bars a day
+SESSION_MINUTES = 390
+INTRADAY_BARS_PER_DAY = SESSION_MINUTES // 5
+
+
+def symbol_names(count: int, prefix: str = "SYN") -> List[str]:
+    return [f"{prefix}{i:05d}" for i in range(count)]
+
+
+def symbol_seed(symbol: str, seed: int = 0) -> int:
+    """Stable per-symbol seed so every run (and the fake upstream) sees the same series"""
+    return zlib.crc32(symbol.encode()) ^ seed
+
+
+def daily_index(bars: int, end: Optional[pd.Timestamp] = None) -> pd.DatetimeIndex:
+    end = pd.Timestamp(end or pd.Timestamp.now().normalize())
+    return pd.bdate_range(end=end, periods=bars)
+
+
+def intraday_index(days: int, end: Optional[pd.Timestamp] = None, minutes: int = 5) -> pd.DatetimeIndex:
+    sessions = daily_index(days, end)
+    offsets = pd.timedelta_range(start="09:30:00", periods=SESSION_MINUTES // minutes, freq=f"{minutes}min")
+    return pd.DatetimeIndex((sessions.values[:, None] + offsets.values[None, :]).ravel())
+
+
+def random_walk(index: pd.DatetimeIndex, seed: int, start_price: float = 100.0) -> pd.DataFrame:
+    """Fetcher-style OHLCV frame (Open/High/Low/Close/Volume) following a geometric random walk"""
+    rng = np.random.default_rng(seed)
+    n = len(index)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.concatenate([[start_price], close[:-1]]) * (1 + rng.normal(0, 0.002, n))
+    spread = np.abs(rng.normal(0, 0.005, n)) * close
+    return pd.DataFrame({
+        'Open': open_.round(4),
+        'High': (np.maximum(open_, close) + spread).round(4),
+        'Low': (np.minimum(open_, close) - spread).round(4),
+        'Close': close.round(4),
+        'Volume': rng.integers(1_000, 1_000_000, n)
+    }, index=index)
+
+
+def generate_ohlcv(symbols: List[str], index: pd.DatetimeIndex, seed: int = 0) -> pd.DataFrame:
+    """One frame with a ``symbol`` column holding a random walk per symbol over ``index``
+
+    The layout is what StockDatabase.insert_historic_data accepts for
+    multi-symbol inserts.
+    """
+    frames = []
+    for symbol in symbols:
+        frame = random_walk(index, symbol_seed(symbol, seed), start_price=50 + symbol_seed(symbol) % 450)
+        frame.insert(0, 'symbol', symbol)
+        frames.append(frame)
+    return pd.concat(frames)
@@ -1,302 +1,769 @@
 import os
+import asyncio
+import json
+import logging
+import time
 import requests
+import httpx
 from datetime import datetime, timedelta
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from typing import Optional, Dict, Any
+from quote_cache import QuoteCache
+from observability import UPSTREAM_LATENCY
+from rate_limiter import AlphaVantageScheduler, Priority, RateLimitExceeded
 
-class StockDataFetcher:
-    def __init__(self):
+logger = logging.getLogger("ohlcv.fetcher")
+
+DEFAULT_BASE_URL = "https://www.alphavantage.co/query"
+
+# Default per-call deadlines in seconds
+QUOTE_TIMEOUT = 10
+HISTORY_TIMEOUT = 15
+SEARCH_TIMEOUT = 10
+
+# Wire formats for TIME_SERIES_DAILY/INTRADAY; csv skips the per-bar JSON objects entirely
+HISTORY_DATATYPES = ("csv", "json")
+
+DAILY_SERIES_KEY = "Time Series (Daily)"
+
+# Column types for Alpha Vantage's daily and intraday CSV (timestamp,open,high,low,close,volume)
+OHLCV_CSV_TYPES = {
+    "timestamp": pa.timestamp("us"),
+    "open": pa.float64(),
+    "high": pa.float64(),
+    "low": pa.float64(),
+    "close": pa.float64(),
+    "volume": pa.int64(),
+}
+
+class _SearchFailed:
+    """Falsy singleton, so ``if fetcher.search_symbol(s):`` treats a failed search like no match"""
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return "SEARCH_FAILED"
+
+
+# search_symbol result when the search itself failed (rate limit, HTTP or network error,
+# error payload), as opposed to None when Alpha Vantage found no matches. Both are falsy;
+# compare with ``is SEARCH_FAILED`` to tell them apart.
+SEARCH_FAILED = _SearchFailed()
+
+# Indian tickers for which NSE/BSE listings are preferred in symbol search
+PREFERRED_INDIAN_SYMBOLS = ["TCS", "RELIANCE", "INFY", "HDFCBANK", "ICICIBANK"]
+
+
+class CsvFormatError(ValueError):
+    """A datatype=csv body that doesn't match the expected OHLCV columns"""
+
+
+def parse_ohlcv_csv(content: bytes) -> pd.DataFrame:
+    """Parse a TIME_SERIES_DAILY or TIME_SERIES_INTRADAY CSV body into a date-indexed OHLCV frame
+
+    Columns are parsed straight into typed Arrow buffers, with no per-row
+    Python objects, and come back in the same shape as the JSON path:
+    ascending DatetimeIndex named Date, with Open/High/Low/Close/Volume.
+    Raises CsvFormatError if the header or any value doesn't parse.
+    """
+    try:
+        table = pa_csv.read_csv(
+            pa.py_buffer(content),
+            convert_options=pa_csv.ConvertOptions(
+                column_types=OHLCV_CSV_TYPES,
+                include_columns=list(OHLCV_CSV_TYPES)
+            )
+        )
+    except (pa.ArrowInvalid, KeyError) as e:
+        raise CsvFormatError(str(e)) from e
+
+    frame = pd.DataFrame({
+        'Open': table.column('open').to_numpy(),
+        'High': table.column('high').to_numpy(),
+        'Low': table.column('low').to_numpy(),
+        'Close': table.column('close').to_numpy(),
+        'Volume': table.column('volume').to_numpy()
+    }, index=pd.DatetimeIndex(table.column('timestamp').to_numpy(), name='Date'))
+    # Alpha Vantage lists newest first
+    return frame.iloc[::-1] if frame.index.is_monotonic_decreasing else frame.sort_index()
+
+
+class AlphaVantageClientBase:
+    """Request building and response parsing shared by the sync and async fetchers"""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 scheduler: Optional[AlphaVantageScheduler] = None):
         # Get Alpha Vantage API key from environment variable
-        self.api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
+        self.api_key = api_key or os.getenv('ALPHA_VANTAGE_API_KEY')
         if not self.api_key:
             raise ValueError("ALPHA_VANTAGE_API_KEY environment variable is required")
 
-        self.base_url = "https://www.alphavantage.co/query"
-        self.cache = {}
+        # Overridable so the fetchers can run against a local fake Alpha Vantage server
+        self.base_url = base_url or os.getenv('ALPHA_VANTAGE_BASE_URL', DEFAULT_BASE_URL)
+
+        # Latest quotes by symbol; every successful live fetch is written through
+        self.cache = QuoteCache(
+            max_entries=int(os.getenv('QUOTE_CACHE_SIZE', '1024')),
+            open_ttl=float(os.getenv('QUOTE_TTL_MARKET_OPEN', '15')),
+            closed_ttl=float(os.getenv('QUOTE_TTL_MARKET_CLOSED', '3600')),
+            is_market_open=self.is_market_open
+        )
+
+        # Every upstream call takes a token from the shared budget first
+        self.scheduler = scheduler or AlphaVantageScheduler(
+            per_minute=int(os.getenv('ALPHA_VANTAGE_CALLS_PER_MINUTE', '5')),
+            per_day=int(os.getenv('ALPHA_VANTAGE_CALLS_PER_DAY', '25')),
+            # Survives restarts so the daily budget isn't handed out twice; empty disables
+            state_path=os.getenv('ALPHA_VANTAGE_QUOTA_FILE', 'alpha_vantage_quota.json') or None
+        )
+
+        # History is requested as CSV unless configured otherwise
+        self.history_datatype = os.getenv('ALPHA_VANTAGE_HISTORY_DATATYPE', 'csv').lower()
+        if self.history_datatype not in HISTORY_DATATYPES:
+            raise ValueError(f"ALPHA_VANTAGE_HISTORY_DATATYPE must be one of: {', '.join(HISTORY_DATATYPES)}")
+
+    def _live_price_params(self, symbol: str) -> Dict[str, str]:
+        return {
+            "function": "GLOBAL_QUOTE",
+            "symbol": symbol,
+            "apikey": self.api_key
+        }
+
+    def _historic_params(self, symbol: str, period: str, datatype: str = "json") -> Dict[str, str]:
+        # Convert period to Alpha Vantage format
+        if period in ("compact", "full"):
+            outputsize = period
+        elif period == "2y":
+            outputsize = "full"
+        else:
+            outputsize = "compact"
+
+        params = {
+            "function": "TIME_SERIES_DAILY",
+            "symbol": symbol,
+            "outputsize": outputsize,
+            "apikey": self.api_key
+        }
+        if datatype == "csv":
+            params["datatype"] = "csv"
+        return params
+
+    def _intraday_params(self, symbol: str, interval_minutes: int, outputsize: str = "compact",
+                         datatype: str = "json") -> Dict[str, str]:
+        params = {
+            "function": "TIME_SERIES_INTRADAY",
+            "symbol": symbol,
+            "interval": f"{interval_minutes}min",
+            "outputsize": outputsize,
+            "apikey": self.api_key
+        }
+        if datatype == "csv":
+            params["datatype"] = "csv"
+        return params
+
+    def _search_params(self, keywords: str) -> Dict[str, str]:
+        return {
+            "function": "SYMBOL_SEARCH",
+            "keywords": keywords,
+            "apikey": self.api_key
+        }
+
+    @staticmethod
+    def _outcome(status_code: int) -> str:
+        """Metric label for an upstream response"""
+        return "ok" if status_code == 200 else f"http_{status_code}"
+
+    @staticmethod
+    def _check_api_errors(data: Dict[str, Any], context: str, dump_note: bool = True) -> bool:
+        """Report Alpha Vantage error/note payloads; returns False when the payload is unusable"""
+        if "Error Message" in data:
+            logger.warning("❌ Alpha Vantage Error %s: %s", context, data['Error Message'])
+            logger.debug("   Full Response: %s", data)
+            return False
 
-    def get_live_price(self, symbol: str) -> Optional[Dict[str, Any]]:
-        """Fetch live price data for a symbol using Alpha Vantage"""
-        try:
-            params = {
-                "function": "GLOBAL_QUOTE",
-                "symbol": symbol,
-                "apikey": self.api_key
-            }
+        if "Note" in data:
+            logger.warning("⚠️ Alpha Vantage Note %s: %s", context, data['Note'])
+            if dump_note:
+                logger.debug("   Full Response: %s", data)
 
-            print(f"🔍 Fetching live price for {symbol}...")
-            response = requests.get(self.base_url, params=params, timeout=10)
+        return True
 
-            print(f"📡 API Response Status: {response.status_code}")
+    def _parse_live_price(self, symbol: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Turn a GLOBAL_QUOTE payload into a latest-price record"""
+        # Check for Alpha Vantage specific errors
+        if not self._check_api_errors(data, f"for {symbol}"):
+            return None
 
-            if response.status_code != 200:
-                print(f"❌ HTTP Error for {symbol}: {response.status_code}")
-                print(f"   Full Response: {response.text}")
-                return None
+        if "Global Quote" not in data or not data["Global Quote"]:
+            logger.warning("❌ No quote data available for %s", symbol)
+            logger.debug("   Response keys: %s", list(data.keys()))
+            logger.debug("   Full Response: %s", data)
+            return None
 
-            data = response.json()
+        quote = data["Global Quote"]
+        logger.debug("📊 Quote data keys: %s", list(quote.keys()))
 
-            # Check for Alpha Vantage specific errors
-            if "Error Message" in data:
-                print(f"❌ Alpha Vantage Error for {symbol}: {data['Error Message']}")
-                print(f"   Full Response: {data}")
-                return None
+        # Extract data from Alpha Vantage response
+        current_price = float(quote.get("05. price", 0))
+        previous_close = float(quote.get("08. previous close", 0))
+        volume = int(quote.get("06. volume", 0))
 
-            if "Note" in data:
-                print(f"⚠️ Alpha Vantage Note for {symbol}: {data['Note']}")
-                print(f"   Full Response: {data}")
+        if current_price == 0:
+            logger.warning("❌ Invalid price data for %s: price = %s", symbol, current_price)
+            return None
 
-            if "Global Quote" not in data or not data["Global Quote"]:
-                print(f"❌ No quote data available for {symbol}")
-                print(f"   Response keys: {list(data.keys())}")
-                print(f"   Full Response: {data}")
-                return None
+        if current_price and previous_close:
+            change_percent = ((current_price - previous_close) / previous_close) * 100
+        else:
+            change_percent = 0.0
+
+        logger.debug("✅ Successfully fetched data for %s: ₹%.2f", symbol, current_price)
+        return {
+            'symbol': symbol,
+            'price': current_price,
+            'change_percent': change_percent,
+            'volume': volume,
+            'last_updated': datetime.now()
+        }
+
+    def _parse_historic_data(self, symbol: str, data: Dict[str, Any],
+                             series_key: str = DAILY_SERIES_KEY) -> Optional[pd.DataFrame]:
+        """Turn a TIME_SERIES_DAILY (or INTRADAY, via ``series_key``) payload into a date-indexed OHLCV frame"""
+        # Check for Alpha Vantage specific errors
+        if not self._check_api_errors(data, f"for {symbol} historical"):
+            return None
+
+        if series_key not in data:
+            logger.warning("❌ No historical data available for %s", symbol)
+            logger.debug("   Response keys: %s", list(data.keys()))
+            logger.debug("   Full Response: %s", data)
+            return None
+
+        time_series = data[series_key]
+        record_count = len(time_series)
+        logger.debug("📊 Retrieved %s historical records for %s", record_count, symbol)
+
+        # Convert to DataFrame
+        records = []
+        for date_str, daily_data in time_series.items():
+            try:
+                records.append({
+                    'Date': date_str,
+                    'Open': float(daily_data['1. open']),
+                    'High': float(daily_data['2. high']),
+                    'Low': float(daily_data['3. low']),
+                    'Close': float(daily_data['4. close']),
+                    'Volume': int(daily_data['5. volume'])
+                })
+            except (ValueError, KeyError) as e:
+                logger.warning("⚠️ Skipping invalid record for %s: %s", date_str, e)
+                continue
+
+        if not records:
+            logger.warning("❌ No valid records found for %s", symbol)
+            return None
+
+        df = pd.DataFrame(records)
+        df['Date'] = pd.to_datetime(df['Date'])
+        df.set_index('Date', inplace=True)
+        df.sort_index(inplace=True)
+
+        logger.debug("✅ Successfully processed %s historical records for %s", len(df), symbol)
+        return df
+
+    def _parse_historic_response(self, symbol: str, content: bytes, datatype: str,
+                                 series_key: str = DAILY_SERIES_KEY) -> Optional[pd.DataFrame]:
+        """Parse a TIME_SERIES_DAILY or INTRADAY body in either wire format
+
+        Alpha Vantage answers errors and rate-limit notes with JSON even when
+        CSV was requested, so a JSON-looking body always takes the JSON path.
+        """
+        if datatype != "csv" or content.lstrip()[:1] == b"{":
+            return self._parse_historic_data(symbol, json.loads(content), series_key)
+
+        df = parse_ohlcv_csv(content)
+        if df.empty:
+            logger.warning("❌ No valid records found for %s", symbol)
+            return None
+        logger.debug("✅ Successfully parsed %s CSV historical records for %s", len(df), symbol)
+        return df
+
+    @staticmethod
+    def _filter_date_range(df: Optional[pd.DataFrame], start_date: str, end_date: str) -> Optional[pd.DataFrame]:
+        if df is None or df.empty:
+            return None
+
+        # Filter by date range
+        start = pd.to_datetime(start_date)
+        end = pd.to_datetime(end_date)
 
-            quote = data["Global Quote"]
-            print(f"📊 Quote data keys: {list(quote.keys())}")
+        mask = (df.index >= start) & (df.index <= end)
+        return df[mask]
 
-            # Extract data from Alpha Vantage response
-            current_price = float(quote.get("05. price", 0))
-            previous_close = float(quote.get("08. previous close", 0))
-            volume = int(quote.get("06. volume", 0))
+    def _select_symbol(self, keywords: str, data: Dict[str, Any]):
+        """Pick the best symbol from a SYMBOL_SEARCH payload
 
-            if current_price == 0:
-                print(f"❌ Invalid price data for {symbol}: price = {current_price}")
+        Returns None only when the payload says there are no matches; error
+        and rate-limit payloads (no ``bestMatches``) return SEARCH_FAILED.
+        """
+        # Check for Alpha Vantage specific errors
+        if not self._check_api_errors(data, "in symbol search", dump_note=False):
+            return SEARCH_FAILED
+
+        if "bestMatches" not in data:
+            logger.warning("❌ Unusable symbol search response for: %s", keywords)
+            logger.debug("   Response keys: %s", list(data.keys()))
+            return SEARCH_FAILED
+
+        # Check if we have search results
+        if not data["bestMatches"]:
+            logger.warning("❌ No symbol matches found for: %s", keywords)
+            return None
+
+        best_matches = data["bestMatches"]
+        logger.debug("📊 Found %s symbol matches", len(best_matches))
+
+        # Look for the best match (prioritize NSE symbols for Indian stocks)
+        for match in best_matches:
+            symbol = match.get("1. symbol", "")
+            name = match.get("2. name", "")
+            region = match.get("4. region", "")
+
+            logger.debug("   Match: %s - %s (%s)", symbol, name, region)
+
+            # For Indian stocks, prefer NSE (.NS) over BSE (.BO)
+            if keywords.upper() in PREFERRED_INDIAN_SYMBOLS:
+                if symbol.endswith(".NS"):
+                    logger.debug("✅ Selected NSE symbol: %s", symbol)
+                    return symbol
+                elif symbol.endswith(".BO") and not any(m.get("1. symbol", "").endswith(".NS") for m in best_matches):
+                    logger.debug("✅ Selected BSE symbol: %s", symbol)
+                    return symbol
+
+        # If no preference, return the first match
+        if best_matches:
+            best_symbol = best_matches[0].get("1. symbol", "")
+            logger.debug("✅ Selected best match: %s", best_symbol)
+            return best_symbol
+
+        return None
+
+    def is_market_open(self) -> bool:
+        """Check if the market is currently open (for informational purposes)"""
+        now = datetime.now()
+        # Simple check for weekdays and typical market hours (9:15 AM - 3:30 PM IST)
+        # Note: Even when market is closed, Alpha Vantage provides latest available data
+        if now.weekday() >= 5:  # Saturday = 5, Sunday = 6
+            return False
+
+        market_open = now.replace(hour=9, minute=15, second=0, microsecond=0)
+        market_close = now.replace(hour=15, minute=30, second=0, microsecond=0)
+
+        return market_open <= now <= market_close
+
+
+class StockDataFetcher(AlphaVantageClientBase):
+    """Blocking Alpha Vantage client for scripts; reuses one keep-alive session"""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 scheduler: Optional[AlphaVantageScheduler] = None):
+        super().__init__(api_key, base_url, scheduler)
+        self.session = requests.Session()
+
+    def _get(self, params: Dict[str, str], timeout: float, priority: Priority) -> requests.Response:
+        self.scheduler.acquire_blocking(priority)
+        # Timed after the token is granted so quota waits don't read as upstream latency
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = self.session.get(self.base_url, params=params, timeout=timeout)
+            outcome = self._outcome(response.status_code)
+            return response
+        except requests.exceptions.Timeout:
+            outcome = "timeout"
+            raise
+        finally:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, function=params["function"], outcome=outcome)
+
+    def close(self):
+        self.session.close()
+
+    def get_live_price(self, symbol: str, timeout: float = QUOTE_TIMEOUT,
+                       priority: Priority = Priority.INTERACTIVE) -> Optional[Dict[str, Any]]:
+        """Fetch live price data for a symbol using Alpha Vantage"""
+        try:
+            logger.debug("🔍 Fetching live price for %s...", symbol)
+            response = self._get(self._live_price_params(symbol), timeout, priority)
+
+            logger.debug("📡 API Response Status: %s", response.status_code)
+
+            if response.status_code != 200:
+                logger.warning("❌ HTTP Error for %s: %s", symbol, response.status_code)
+                logger.debug("   Full Response: %s", response.text)
                 return None
 
-            if current_price and previous_close:
-                change_percent = ((current_price - previous_close) / previous_close) * 100
-            else:
-                change_percent = 0.0
-
-            print(f"✅ Successfully fetched data for {symbol}: ₹{current_price:.2f}")
-            return {
-                'symbol': symbol,
-                'price': current_price,
-                'change_percent': change_percent,
-                'volume': volume,
-                'last_updated': datetime.now()
-            }
+            quote = self._parse_live_price(symbol, response.json())
+            if quote:
+                self.cache.set(symbol, quote)
+            return quote
+        except RateLimitExceeded as e:
+            logger.warning("🚦 Rate limited fetching %s: %s", symbol, e)
+            return None
         except requests.exceptions.Timeout:
-            print(f"⏰ Timeout error fetching {symbol}: Request timed out after 10 seconds")
+            logger.warning("⏰ Timeout error fetching %s: Request timed out after %s seconds", symbol, timeout)
             return None
         except requests.exceptions.ConnectionError:
-            print(f"🌐 Connection error fetching {symbol}: Unable to connect to Alpha Vantage")
+            logger.warning("🌐 Connection error fetching %s: Unable to connect to Alpha Vantage", symbol)
             return None
         except requests.exceptions.RequestException as e:
-            print(f"📡 Request error fetching {symbol}: {e}")
+            logger.warning("📡 Request error fetching %s: %s", symbol, e)
             return None
         except ValueError as e:
-            print(f"🔢 Data parsing error for {symbol}: {e}")
+            logger.warning("🔢 Data parsing error for %s: %s", symbol, e)
             return None
         except Exception as e:
-            print(f"💥 Unexpected error fetching {symbol}: {type(e).__name__}: {e}")
+            logger.error("💥 Unexpected error fetching %s: %s: %s", symbol, type(e).__name__, e)
             return None
 
-    def get_historic_data(self, symbol: str, period: str = "1y") -> Optional[pd.DataFrame]:
-        """Fetch historic data for a symbol using Alpha Vantage"""
-        try:
-            # Convert period to Alpha Vantage format
-            if period == "1y":
-                function = "TIME_SERIES_DAILY"
-                outputsize = "compact"
-            elif period == "2y":
-                function = "TIME_SERIES_DAILY"
-                outputsize = "full"
-            else:
-                function = "TIME_SERIES_DAILY"
-                outputsize = "compact"
-
-            params = {
-                "function": function,
-                "symbol": symbol,
-                "outputsize": outputsize,
-                "apikey": self.api_key
-            }
-
-            print(f"📈 Fetching historical data for {symbol} ({period})...")
-            response = requests.get(self.base_url, params=params, timeout=15)
-
-            print(f"📡 Historical API Response Status: {response.status_code}")
-
-            if response.status_code != 200:
-                print(f"❌ HTTP Error for {symbol} historical data: {response.status_code}")
-                print(f"   Full Response: {response.text}")
-                return None
-
-            data = response.json()
-
-            # Check for Alpha Vantage specific errors
-            if "Error Message" in data:
-                print(f"❌ Alpha Vantage Error for {symbol} historical: {data['Error Message']}")
-                print(f"   Full Response: {data}")
-                return None
-
-            if "Note" in data:
-                print(f"⚠️ Alpha Vantage Note for {symbol} historical: {data['Note']}")
-                print(f"   Full Response: {data}")
-
-            if "Time Series (Daily)" not in data:
-                print(f"❌ No historical data available for {symbol}")
-                print(f"   Response keys: {list(data.keys())}")
-                print(f"   Full Response: {data}")
-                return None
+    def _fetch_series(self, symbol: str, params: Dict[str, str], timeout: float, priority: Priority,
+                      series_key: str = DAILY_SERIES_KEY) -> Optional[pd.DataFrame]:
+        response = self._get(params, timeout, priority)
 
-            time_series = data["Time Series (Daily)"]
-            record_count = len(time_series)
-            print(f"📊 Retrieved {record_count} historical records for {symbol}")
-
-            # Convert to DataFrame
-            records = []
-            for date_str, daily_data in time_series.items():
-                try:
-                    records.append({
-                        'Date': date_str,
-                        'Open': float(daily_data['1. open']),
-                        'High': float(daily_data['2. high']),
-                        'Low': float(daily_data['3. low']),
-                        'Close': float(daily_data['4. close']),
-                        'Volume': int(daily_data['5. volume'])
-                    })
-                except (ValueError, KeyError) as e:
-                    print(f"⚠️ Skipping invalid record for {date_str}: {e}")
-                    continue
-
-            if not records:
-                print(f"❌ No valid records found for {symbol}")
-                return None
+        logger.debug("📡 Historical API Response Status: %s", response.status_code)
 
-            df = pd.DataFrame(records)
-            df['Date'] = pd.to_datetime(df['Date'])
-            df.set_index('Date', inplace=True)
-            df.sort_index(inplace=True)
+        if response.status_code != 200:
+            logger.warning("❌ HTTP Error for %s historical data: %s", symbol, response.status_code)
+            logger.debug("   Full Response: %s", response.text)
+            return None
 
-            print(f"✅ Successfully processed {len(df)} historical records for {symbol}")
-            return df
+        return self._parse_historic_response(symbol, response.content, params.get("datatype", "json"), series_key)
 
+    def get_historic_data(self, symbol: str, period: str = "1y", timeout: float = HISTORY_TIMEOUT,
+                          priority: Priority = Priority.INTERACTIVE) -> Optional[pd.DataFrame]:
+        """Fetch historic data for a symbol using Alpha Vantage"""
+        try:
+            logger.debug("📈 Fetching historical data for %s (%s)...", symbol, period)
+            return self._fetch_series(
+                symbol, self._historic_params(symbol, period, self.history_datatype), timeout, priority)
+
+        except CsvFormatError as e:
+            # Not retried as JSON: a second request would spend another token from the daily budget
+            logger.warning("⚠️ Unreadable CSV for %s historical data (set ALPHA_VANTAGE_HISTORY_DATATYPE=json "
+                           "if this persists): %s", symbol, e)
+            return None
+        except RateLimitExceeded as e:
+            logger.warning("🚦 Rate limited fetching %s historical data: %s", symbol, e)
+            return None
         except requests.exceptions.Timeout:
-            print(f"⏰ Timeout error fetching {symbol} historical data: Request timed out after 15 seconds")
+            logger.warning("⏰ Timeout error fetching %s historical data: Request timed out after %s seconds", symbol, timeout)
             return None
         except requests.exceptions.ConnectionError:
-            print(f"🌐 Connection error fetching {symbol} historical data: Unable to connect to Alpha Vantage")
+            logger.warning("🌐 Connection error fetching %s historical data: Unable to connect to Alpha Vantage", symbol)
             return None
         except requests.exceptions.RequestException as e:
-            print(f"📡 Request error fetching {symbol} historical data: {e}")
+            logger.warning("📡 Request error fetching %s historical data: %s", symbol, e)
             return None
         except ValueError as e:
-            print(f"🔢 Data parsing error for {symbol} historical data: {e}")
+            logger.warning("🔢 Data parsing error for %s historical data: %s", symbol, e)
             return None
         except Exception as e:
-            print(f"💥 Unexpected error fetching {symbol} historical data: {type(e).__name__}: {e}")
+            logger.error("💥 Unexpected error fetching %s historical data: %s: %s", symbol, type(e).__name__, e)
             return None
 
-    def get_historic_data_date_range(self, symbol: str, start_date: str, end_date: str) -> Optional[pd.DataFrame]:
+    def get_historic_data_date_range(self, symbol: str, start_date: str, end_date: str,
+                                     priority: Priority = Priority.INTERACTIVE) -> Optional[pd.DataFrame]:
         """Fetch historic data for a specific date range using Alpha Vantage"""
         try:
             # Alpha Vantage doesn't support custom date ranges directly
             # We'll fetch full data and filter
-            df = self.get_historic_data(symbol, "2y")  # Get full 2 years
-
-            if df is None or df.empty:
-                return None
-
-            # Filter by date range
-            start = pd.to_datetime(start_date)
-            end = pd.to_datetime(end_date)
-
-            mask = (df.index >= start) & (df.index <= end)
-            filtered_df = df[mask]
-
-            return filtered_df
+            df = self.get_historic_data(symbol, "2y", priority=priority)  # Get full 2 years
+            return self._filter_date_range(df, start_date, end_date)
         except Exception as e:
-            print(f"Error fetching historic data for {symbol} in date range: {e}")
+            logger.warning("Error fetching historic data for %s in date range: %s", symbol, e)
             return None
 
-    def search_symbol(self, keywords: str) -> Optional[str]:
-        """Search for the correct symbol using Alpha Vantage SYMBOL_SEARCH API"""
+    def get_intraday_data(self, symbol: str, interval_minutes: int = 5, outputsize: str = "compact",
+                          timeout: float = HISTORY_TIMEOUT,
+                          priority: Priority = Priority.INTERACTIVE) -> Optional[pd.DataFrame]:
+        """Fetch intraday bars (1/5/15/30/60 min) for a symbol; compact is the latest 100 bars"""
+        series_key = f"Time Series ({interval_minutes}min)"
         try:
-            params = {
-                "function": "SYMBOL_SEARCH",
-                "keywords": keywords,
-                "apikey": self.api_key
-            }
+            logger.debug("📈 Fetching %smin intraday data for %s (%s)...", interval_minutes, symbol, outputsize)
+            return self._fetch_series(
+                symbol, self._intraday_params(symbol, interval_minutes, outputsize, self.history_datatype),
+                timeout, priority, series_key)
+
+        except CsvFormatError as e:
+            logger.warning("⚠️ Unreadable CSV for %s intraday data (set ALPHA_VANTAGE_HISTORY_DATATYPE=json "
+                           "if this persists): %s", symbol, e)
+            return None
+        except RateLimitExceeded as e:
+            logger.warning("🚦 Rate limited fetching %s intraday data: %s", symbol, e)
+            return None
+        except requests.exceptions.Timeout:
+            logger.warning("⏰ Timeout error fetching %s intraday data: Request timed out after %s seconds", symbol, timeout)
+            return None
+        except requests.exceptions.ConnectionError:
+            logger.warning("🌐 Connection error fetching %s intraday data: Unable to connect to Alpha Vantage", symbol)
+            return None
+        except requests.exceptions.RequestException as e:
+            logger.warning("📡 Request error fetching %s intraday data: %s", symbol, e)
+            return None
+        except ValueError as e:
+            logger.warning("🔢 Data parsing error for %s intraday data: %s", symbol, e)
+            return None
+        except Exception as e:
+            logger.error("💥 Unexpected error fetching %s intraday data: %s: %s", symbol, type(e).__name__, e)
+            return None
 
-            print(f"🔍 Searching for symbol: {keywords}")
-            response = requests.get(self.base_url, params=params, timeout=10)
+    def search_symbol(self, keywords: str, timeout: float = SEARCH_TIMEOUT,
+                      priority: Priority = Priority.INTERACTIVE):
+        """Search for the correct symbol using Alpha Vantage SYMBOL_SEARCH API
 
-            print(f"📡 Symbol Search Response Status: {response.status_code}")
+        Returns the symbol, None when nothing matched, or the falsy
+        SEARCH_FAILED when the search could not be completed.
+        """
+        try:
+            logger.debug("🔍 Searching for symbol: %s", keywords)
+            response = self._get(self._search_params(keywords), timeout, priority)
+
+            logger.debug("📡 Symbol Search Response Status: %s", response.status_code)
 
             if response.status_code != 200:
-                print(f"❌ HTTP Error in symbol search: {response.status_code}")
-                print(f"   Full Response: {response.text}")
-                return None
+                logger.warning("❌ HTTP Error in symbol search: %s", response.status_code)
+                logger.debug("   Full Response: %s", response.text)
+                return SEARCH_FAILED
 
-            data = response.json()
+            return self._select_symbol(keywords, response.json())
 
-            # Check for Alpha Vantage specific errors
-            if "Error Message" in data:
-                print(f"❌ Alpha Vantage Error in symbol search: {data['Error Message']}")
-                print(f"   Full Response: {data}")
-                return None
+        except RateLimitExceeded as e:
+            logger.warning("🚦 Rate limited in symbol search for %s: %s", keywords, e)
+            return SEARCH_FAILED
+        except requests.exceptions.Timeout:
+            logger.warning("⏰ Timeout error in symbol search for %s: Request timed out after %s seconds", keywords, timeout)
+            return SEARCH_FAILED
+        except requests.exceptions.ConnectionError:
+            logger.warning("🌐 Connection error in symbol search for %s: Unable to connect to Alpha Vantage", keywords)
+            return SEARCH_FAILED
+        except requests.exceptions.RequestException as e:
+            logger.warning("📡 Request error in symbol search for %s: %s", keywords, e)
+            return SEARCH_FAILED
+        except Exception as e:
+            logger.error("💥 Unexpected error in symbol search for %s: %s: %s", keywords, type(e).__name__, e)
+            return SEARCH_FAILED
+
+
+class AsyncStockDataFetcher(AlphaVantageClientBase):
+    """Non-blocking Alpha Vantage client backed by a pooled keep-alive httpx client
+
+    Same parsing and error semantics as StockDataFetcher: every call returns
+    None on failure instead of raising. ``timeout`` on each call is a hard
+    deadline for the whole request, not just a single connect/read phase.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 scheduler: Optional[AlphaVantageScheduler] = None,
+                 max_connections: int = 10, keepalive_expiry: float = 30.0):
+        super().__init__(api_key, base_url, scheduler)
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so it binds to the event loop that first uses it
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self._limits)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get(self, params: Dict[str, str], timeout: float, priority: Priority) -> httpx.Response:
+        await self.scheduler.acquire(priority)
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await asyncio.wait_for(
+                self.client.get(self.base_url, params=params, timeout=timeout),
+                timeout
+            )
+            outcome = self._outcome(response.status_code)
+            return response
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            outcome = "timeout"
+            raise
+        finally:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, function=params["function"], outcome=outcome)
+
+    async def get_live_price(self, symbol: str, timeout: float = QUOTE_TIMEOUT,
+                             priority: Priority = Priority.INTERACTIVE) -> Optional[Dict[str, Any]]:
+        """Fetch live price data for a symbol using Alpha Vantage"""
+        try:
+            logger.debug("🔍 Fetching live price for %s...", symbol)
+            response = await self._get(self._live_price_params(symbol), timeout, priority)
 
-            if "Note" in data:
-                print(f"⚠️ Alpha Vantage Note in symbol search: {data['Note']}")
+            logger.debug("📡 API Response Status: %s", response.status_code)
 
-            # Check if we have search results
-            if "bestMatches" not in data or not data["bestMatches"]:
-                print(f"❌ No symbol matches found for: {keywords}")
-                print(f"   Response keys: {list(data.keys())}")
+            if response.status_code != 200:
+                logger.warning("❌ HTTP Error for %s: %s", symbol, response.status_code)
+                logger.debug("   Full Response: %s", response.text)
                 return None
 
-            best_matches = data["bestMatches"]
-            print(f"📊 Found {len(best_matches)} symbol matches")
+            quote = self._parse_live_price(symbol, response.json())
+            if quote:
+                self.cache.set(symbol, quote)
+            return quote
+        except RateLimitExceeded as e:
+            logger.warning("🚦 Rate limited fetching %s: %s", symbol, e)
+            return None
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            logger.warning("⏰ Timeout error fetching %s: Request timed out after %s seconds", symbol, timeout)
+            return None
+        except httpx.ConnectError:
+            logger.warning("🌐 Connection error fetching %s: Unable to connect to Alpha Vantage", symbol)
+            return None
+        except httpx.HTTPError as e:
+            logger.warning("📡 Request error fetching %s: %s", symbol, e)
+            return None
+        except ValueError as e:
+            logger.warning("🔢 Data parsing error for %s: %s", symbol, e)
+            return None
+        except Exception as e:
+            logger.error("💥 Unexpected error fetching %s: %s: %s", symbol, type(e).__name__, e)
+            return None
 
-            # Look for the best match (prioritize NSE symbols for Indian stocks)
-            for match in best_matches:
-                symbol = match.get("1. symbol", "")
-                name = match.get("2. name", "")
-                region = match.get("4. region", "")
+    async def _fetch_series(self, symbol: str, params: Dict[str, str], timeout: float, priority: Priority,
+                            series_key: str = DAILY_SERIES_KEY) -> Optional[pd.DataFrame]:
+        response = await self._get(params, timeout, priority)
 
-                print(f"   Match: {symbol} - {name} ({region})")
+        logger.debug("📡 Historical API Response Status: %s", response.status_code)
 
-                # For Indian stocks, prefer NSE (.NS) over BSE (.BO)
-                if keywords.upper() in ["TCS", "RELIANCE", "INFY", "HDFCBANK", "ICICIBANK"]:
-                    if symbol.endswith(".NS"):
-                        print(f"✅ Selected NSE symbol: {symbol}")
-                        return symbol
-                    elif symbol.endswith(".BO") and not any(m.get("1. symbol", "").endswith(".NS") for m in best_matches):
-                        print(f"✅ Selected BSE symbol: {symbol}")
-                        return symbol
+        if response.status_code != 200:
+            logger.warning("❌ HTTP Error for %s historical data: %s", symbol, response.status_code)
+            logger.debug("   Full Response: %s", response.text)
+            return None
 
-            # If no preference, return the first match
-            if best_matches:
-                best_symbol = best_matches[0].get("1. symbol", "")
-                print(f"✅ Selected best match: {best_symbol}")
-                return best_symbol
+        return self._parse_historic_response(symbol, response.content, params.get("datatype", "json"), series_key)
 
+    async def get_historic_data(self, symbol: str, period: str = "1y", timeout: float = HISTORY_TIMEOUT,
+                                priority: Priority = Priority.INTERACTIVE) -> Optional[pd.DataFrame]:
+        """Fetch historic data for a symbol using Alpha Vantage"""
+        try:
+            logger.debug("📈 Fetching historical data for %s (%s)...", symbol, period)
+            return await self._fetch_series(
+                symbol, self._historic_params(symbol, period, self.history_datatype), timeout, priority)
+
+        except CsvFormatError as e:
+            # Not retried as JSON: a second request would spend another token from the daily budget
+            logger.warning("⚠️ Unreadable CSV for %s historical data (set ALPHA_VANTAGE_HISTORY_DATATYPE=json "
+                           "if this persists): %s", symbol, e)
+            return None
+        except RateLimitExceeded as e:
+            logger.warning("🚦 Rate limited fetching %s historical data: %s", symbol, e)
+            return None
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            logger.warning("⏰ Timeout error fetching %s historical data: Request timed out after %s seconds", symbol, timeout)
+            return None
+        except httpx.ConnectError:
+            logger.warning("🌐 Connection error fetching %s historical data: Unable to connect to Alpha Vantage", symbol)
+            return None
+        except httpx.HTTPError as e:
+            logger.warning("📡 Request error fetching %s historical data: %s", symbol, e)
+            return None
+        except ValueError as e:
+            logger.warning("🔢 Data parsing error for %s historical data: %s", symbol, e)
+            return None
+        except Exception as e:
+            logger.error("💥 Unexpected error fetching %s historical data: %s: %s", symbol, type(e).__name__, e)
             return None
 
-        except requests.exceptions.Timeout:
-            print(f"⏰ Timeout error in symbol search for {keywords}: Request timed out after 10 seconds")
+    async def get_historic_data_date_range(self, symbol: str, start_date: str, end_date: str,
+                                           priority: Priority = Priority.INTERACTIVE) -> Optional[pd.DataFrame]:
+        """Fetch historic data for a specific date range using Alpha Vantage"""
+        try:
+            # Alpha Vantage doesn't support custom date ranges directly
+            # We'll fetch full data and filter
+            df = await self.get_historic_data(symbol, "2y", priority=priority)  # Get full 2 years
+            return self._filter_date_range(df, start_date, end_date)
+        except Exception as e:
+            logger.warning("Error fetching historic data for %s in date range: %s", symbol, e)
             return None
-        except requests.exceptions.ConnectionError:
-            print(f"🌐 Connection error in symbol search for {keywords}: Unable to connect to Alpha Vantage")
+
+    async def get_intraday_data(self, symbol: str, interval_minutes: int = 5, outputsize: str = "compact",
+                                timeout: float = HISTORY_TIMEOUT,
+                                priority: Priority = Priority.INTERACTIVE) -> Optional[pd.DataFrame]:
+        """Fetch intraday bars (1/5/15/30/60 min) for a symbol; compact is the latest 100 bars"""
+        series_key = f"Time Series ({interval_minutes}min)"
+        try:
+            logger.debug("📈 Fetching %smin intraday data for %s (%s)...", interval_minutes, symbol, outputsize)
+            return await self._fetch_series(
+                symbol, self._intraday_params(symbol, interval_minutes, outputsize, self.history_datatype),
+                timeout, priority, series_key)
+
+        except CsvFormatError as e:
+            logger.warning("⚠️ Unreadable CSV for %s intraday data (set ALPHA_VANTAGE_HISTORY_DATATYPE=json "
+                           "if this persists): %s", symbol, e)
             return None
-        except requests.exceptions.RequestException as e:
-            print(f"📡 Request error in symbol search for {keywords}: {e}")
+        except RateLimitExceeded as e:
+            logger.warning("🚦 Rate limited fetching %s intraday data: %s", symbol, e)
+            return None
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            logger.warning("⏰ Timeout error fetching %s intraday data: Request timed out after %s seconds", symbol, timeout)
+            return None
+        except httpx.ConnectError:
+            logger.warning("🌐 Connection error fetching %s intraday data: Unable to connect to Alpha Vantage", symbol)
+            return None
+        except httpx.HTTPError as e:
+            logger.warning("📡 Request error fetching %s intraday data: %s", symbol, e)
+            return None
+        except ValueError as e:
+            logger.warning("🔢 Data parsing error for %s intraday data: %s", symbol, e)
             return None
         except Exception as e:
-            print(f"💥 Unexpected error in symbol search for {keywords}: {type(e).__name__}: {e}")
+            logger.error("💥 Unexpected error fetching %s intraday data: %s: %s", symbol, type(e).__name__, e)
             return None
 
-    def is_market_open(self) -> bool:
-        """Check if the market is currently open (for informational purposes)"""
-        now = datetime.now()
-        # Simple check for weekdays and typical market hours (9:15 AM - 3:30 PM IST)
-        # Note: Even when market is closed, Alpha Vantage provides latest available data
-        if now.weekday() >= 5:  # Saturday = 5, Sunday = 6
-            return False
+    async def search_symbol(self, keywords: str, timeout: float = SEARCH_TIMEOUT,
+                            priority: Priority = Priority.INTERACTIVE):
+        """Search for the correct symbol using Alpha Vantage SYMBOL_SEARCH API
 
-        market_open = now.replace(hour=9, minute=15, second=0, microsecond=0)
-        market_close = now.replace(hour=15, minute=30, second=0, microsecond=0)
+        Returns the symbol, None when nothing matched, or the falsy
+        SEARCH_FAILED when the search could not be completed.
+        """
+        try:
+            logger.debug("🔍 Searching for symbol: %s", keywords)
+            response = await self._get(self._search_params(keywords), timeout, priority)
 
-        return market_open <= now <= market_close
+            logger.debug("📡 Symbol Search Response Status: %s", response.status_code)
+
+            if response.status_code != 200:
+                logger.warning("❌ HTTP Error in symbol search: %s", response.status_code)
+                logger.debug("   Full Response: %s", response.text)
+                return SEARCH_FAILED
+
+            return self._select_symbol(keywords, response.json())
+
+        except RateLimitExceeded as e:
+            logger.warning("🚦 Rate limited in symbol search for %s: %s", keywords, e)
+            return SEARCH_FAILED
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            logger.warning("⏰ Timeout error in symbol search for %s: Request timed out after %s seconds", keywords, timeout)
+            return SEARCH_FAILED
+        except httpx.ConnectError:
+            logger.warning("🌐 Connection error in symbol search for %s: Unable to connect to Alpha Vantage", keywords)
+            return SEARCH_FAILED
+        except httpx.HTTPError as e:
+            logger.warning("📡 Request error in symbol search for %s: %s", keywords, e)
+            return SEARCH_FAILED
+        except Exception as e:
+            logger.error("💥 Unexpected error in symbol search for %s: %s: %s", keywords, type(e).__name__, e)
+            return SEARCH_FAILED
@@ -1,30 +1,178 @@
 import duckdb
 from datetime import datetime
+import glob
 import os
+import re
+import uuid
+from urllib.parse import quote
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
 
+from observability import DB_LATENCY, DB_ROWS_WRITTEN, timed_method
+
+logger = logging.getLogger("ohlcv.database")
+
+# Hot queries kept as constants so every cursor runs identical statement text
+LATEST_PRICE_QUERY = "SELECT * FROM latest_prices WHERE symbol = ?"
+LATEST_PRICES_QUERY = "SELECT * FROM latest_prices WHERE symbol IN (SELECT unnest(?::VARCHAR[]))"
+ALL_SYMBOLS_QUERY = "SELECT symbol FROM stock_prices UNION SELECT symbol FROM archive_state"
+WATERMARK_QUERY = "SELECT last_timestamp FROM symbol_watermarks WHERE symbol = ?"
+LAST_INGESTED_QUERY = "SELECT last_ingested FROM symbol_watermarks WHERE symbol = ?"
+# stock_prices has no primary key: uniqueness of (symbol, timestamp) is kept by
+# deduplicating on load under the writer lock, which avoids maintaining an ART
+# index over every bar. Tables created by older versions keep their key until
+# the next cluster_prices() rewrite.
+STOCK_PRICES_COLUMNS = """
+    symbol VARCHAR NOT NULL,
+    timestamp TIMESTAMP NOT NULL,
+    open_price DOUBLE,
+    high_price DOUBLE,
+    low_price DOUBLE,
+    close_price DOUBLE,
+    volume BIGINT
+"""
+UPSERT_LATEST_PRICE = """
+    INSERT OR REPLACE INTO latest_prices
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+# Resampling intervals: count + unit, e.g. 5d, 1w, 1mo, 1q, 1y
+INTERVAL_PATTERN = re.compile(r'^(\d*)(d|w|mo|q|y)$')
+INTERVAL_UNITS = {'d': 'days', 'w': 'weeks', 'mo': 'months', 'q': 'months', 'y': 'years'}
+# Approximate calendar days per unit, used to size buckets for max_points
+INTERVAL_UNIT_DAYS = {'d': 1.0, 'w': 7.0, 'mo': 30.44, 'q': 91.31, 'y': 365.25}
+# Candidate bucket sizes for max_points mode, smallest first
+INTERVAL_LADDER = ['1d', '2d', '3d', '1w', '2w', '1mo', '2mo', '1q', '6mo', '1y', '2y', '5y', '10y']
+
+
+def parse_interval(interval):
+    """Translate an API interval (5d, 1w, 1mo, 1q, 1y) into a DuckDB INTERVAL literal"""
+    match = INTERVAL_PATTERN.match(interval.strip().lower())
+    if not match or match.group(1) == '0':
+        raise ValueError(f"Invalid interval: {interval}. Use Nd, Nw, Nmo, Nq or Ny (e.g. 5d, 1w, 1mo)")
+    count = int(match.group(1) or 1)
+    unit = match.group(2)
+    if unit == 'q':
+        count *= 3
+    return f"{count} {INTERVAL_UNITS[unit]}"
+
+
+# Bar sizes (minutes) served by TIME_SERIES_INTRADAY
+INTRADAY_INTERVALS = (1, 5, 15, 30, 60)
+INTRADAY_INTERVAL_PATTERN = re.compile(r'^(\d+)\s*(min|m)?$')
+# symbol_ids are USMALLINT and volumes UINTEGER in the compact intraday layout
+MAX_SYMBOL_ID = 2**16 - 1
+MAX_INTRADAY_VOLUME = 2**32 - 1
+
+
+def parse_intraday_interval(interval):
+    """Translate 1min/5min/15min/30min/60min (or a bare minute count) into minutes"""
+    match = INTRADAY_INTERVAL_PATTERN.match(str(interval).strip().lower())
+    if not match or int(match.group(1)) not in INTRADAY_INTERVALS:
+        raise ValueError(f"Invalid intraday interval: {interval}. "
+                         f"Use one of: {', '.join(f'{m}min' for m in INTRADAY_INTERVALS)}")
+    return int(match.group(1))
+
+
+def interval_days(interval):
+    match = INTERVAL_PATTERN.match(interval)
+    return int(match.group(1) or 1) * INTERVAL_UNIT_DAYS[match.group(2)]
+
+
 class StockDatabase:
-    def __init__(self, db_path='stock_data.duckdb'):
+    def __init__(self, db_path='stock_data.duckdb', archive_path='stock_archive'):
         self.db_path = db_path
-        self.connection = None
+        # Root of the Hive-partitioned (symbol=/year=) Parquet cold tier
+        self.archive_path = archive_path
+        # Long-lived writer connection; readers get per-thread cursors off it
+        self.connection = duckdb.connect(self.db_path)
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._cursors = []
+        self._cursors_lock = threading.Lock()
+        self._closed = False
+        self._write_listeners = []
         self._create_tables()
+        # symbol -> archived_until; bars before it live only in the Parquet archive
+        self._archived = dict(self.connection.execute(
+            "SELECT symbol, archived_until FROM archive_state"
+        ).fetchall())
+        # symbol -> 2-byte id used by intraday_bars, and (id, interval) -> newest stored bar (epoch seconds)
+        self._symbol_ids = dict(self.connection.execute("SELECT symbol, symbol_id FROM symbol_ids").fetchall())
+        self._intraday_watermarks = {
+            (symbol_id, interval): last_ts
+            for symbol_id, interval, last_ts in self.connection.execute(
+                "SELECT symbol_id, interval_minutes, last_ts FROM intraday_watermarks"
+            ).fetchall()
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @contextmanager
+    def _writer(self):
+        """Serialize access to the shared writer connection"""
+        if self._closed:
+            raise RuntimeError("StockDatabase is closed")
+        with self._write_lock:
+            yield self.connection
+
+    def _reader(self):
+        """Return the calling thread's read cursor, opening it on first use"""
+        if self._closed:
+            raise RuntimeError("StockDatabase is closed")
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            with self._cursors_lock:
+                cursor = self.connection.cursor()
+                self._cursors.append(cursor)
+            self._local.cursor = cursor
+        return cursor
+
+    def add_write_listener(self, listener):
+        """Register ``listener(table, ranges)`` to run after every committed write
+
+        ``ranges`` maps each written symbol to the (min, max) timestamp of
+        the rows written. Listeners run on the writer's thread and must be quick.
+        """
+        self._write_listeners.append(listener)
+
+    def _notify_write(self, table, ranges):
+        for listener in self._write_listeners:
+            try:
+                listener(table, ranges)
+            except Exception as e:
+                logger.warning("⚠️ Write listener failed for %s: %s", table, e)
+
+    def close(self):
+        """Close all reader cursors and the writer connection"""
+        if self._closed:
+            return
+        with self._write_lock:
+            self._closed = True
+            with self._cursors_lock:
+                for cursor in self._cursors:
+                    try:
+                        cursor.close()
+                    except Exception:
+                        pass
+                self._cursors.clear()
+            self.connection.close()
 
     def _create_tables(self):
         """Create necessary tables if they don't exist"""
-        with duckdb.connect(self.db_path) as conn:
-            # Table for storing stock price data
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS stock_prices (
-                    symbol VARCHAR,
-                    timestamp TIMESTAMP,
-                    open_price DOUBLE,
-                    high_price DOUBLE,
-                    low_price DOUBLE,
-                    close_price DOUBLE,
-                    volume BIGINT,
-                    PRIMARY KEY (symbol, timestamp)
-                )
-            """)
+        with self._writer() as conn:
+            # Table for storing stock price data, kept sorted by (symbol, timestamp) by cluster_prices()
+            conn.execute(f"CREATE TABLE IF NOT EXISTS stock_prices ({STOCK_PRICES_COLUMNS})")
 
             # Table for storing latest prices
             conn.execute("""
@@ -37,88 +185,933 @@ class StockDatabase:
                 )
             """)
 
+            # Per-symbol ingestion watermark: newest stored bar and when it was written
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS symbol_watermarks (
+                    symbol VARCHAR PRIMARY KEY,
+                    last_timestamp TIMESTAMP,
+                    last_ingested TIMESTAMP
+                )
+            """)
+
+            # Resolved user input -> canonical symbol; NULL symbol marks a negative result
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS symbol_aliases (
+                    alias VARCHAR PRIMARY KEY,
+                    symbol VARCHAR,
+                    source VARCHAR,
+                    resolved_at TIMESTAMP,
+                    expires_at TIMESTAMP
+                )
+            """)
+
+            # Per-symbol cold-tier boundary: bars before archived_until are in Parquet
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS archive_state (
+                    symbol VARCHAR PRIMARY KEY,
+                    archived_until TIMESTAMP,
+                    archived_rows BIGINT,
+                    archived_at TIMESTAMP
+                )
+            """)
+
+            # Dictionary for compact tables: symbols are stored as 2-byte ids instead of strings
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS symbol_ids (
+                    symbol_id USMALLINT PRIMARY KEY,
+                    symbol VARCHAR NOT NULL UNIQUE
+                )
+            """)
+
+            # Intraday bars: dictionary-encoded symbol, epoch-second timestamps and
+            # float32 prices, about 27 bytes a bar before compression. Append-only
+            # apart from each series' newest bar; bars land in time order, so per-row-group ts min/max let day-range
+            # queries skip every other day.
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS intraday_bars (
+                    symbol_id USMALLINT NOT NULL,
+                    interval_minutes UTINYINT NOT NULL,
+                    ts UINTEGER NOT NULL,
+                    open REAL,
+                    high REAL,
+                    low REAL,
+                    close REAL,
+                    volume UINTEGER
+                )
+            """)
+
+            # Newest stored bar per intraday series; later batches skip older bars and replace this one
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS intraday_watermarks (
+                    symbol_id USMALLINT,
+                    interval_minutes UTINYINT,
+                    last_ts UINTEGER,
+                    PRIMARY KEY (symbol_id, interval_minutes)
+                )
+            """)
+
+            # Seed watermarks for symbols stored before the table existed
+            conn.execute("""
+                INSERT INTO symbol_watermarks
+                SELECT symbol, max(timestamp), now()::TIMESTAMP
+                FROM stock_prices
+                WHERE symbol NOT IN (SELECT symbol FROM symbol_watermarks)
+                GROUP BY symbol
+            """)
+
+    @staticmethod
+    def _normalize_price_frame(symbol, data):
+        """Reshape a fetcher-style OHLCV frame into stock_prices column order"""
+        if 'symbol' in data.columns:
+            symbols = data['symbol'].astype(str).to_numpy()
+        elif symbol is None:
+            raise ValueError("symbol is required when the frame has no 'symbol' column")
+        else:
+            symbols = symbol
+
+        if 'timestamp' in data.columns:
+            timestamps = pd.to_datetime(data['timestamp'])
+        else:
+            timestamps = pd.to_datetime(data.index)
+
+        frame = pd.DataFrame({
+            'symbol': symbols,
+            'timestamp': pd.Series(timestamps, index=data.index).to_numpy(dtype='datetime64[us]'),
+            'open_price': data['Open'].to_numpy(dtype='float64'),
+            'high_price': data['High'].to_numpy(dtype='float64'),
+            'low_price': data['Low'].to_numpy(dtype='float64'),
+            'close_price': data['Close'].to_numpy(dtype='float64'),
+            'volume': data['Volume'].to_numpy(dtype='int64')
+        })
+        # Last occurrence wins, same as the old row-by-row INSERT OR REPLACE
+        return frame.drop_duplicates(['symbol', 'timestamp'], keep='last')
+
+    @timed_method(DB_LATENCY)
     def insert_historic_data(self, symbol, data):
-        """Insert historic stock data"""
-        with duckdb.connect(self.db_path) as conn:
-            # Convert data to the format expected
-            records = []
-            for index, row in data.iterrows():
-                # Use datetime object directly for TIMESTAMP column
-                records.append((
-                    symbol,
-                    index.to_pydatetime(),  # Convert pandas Timestamp to Python datetime
-                    float(row['Open']),
-                    float(row['High']),
-                    float(row['Low']),
-                    float(row['Close']),
-                    int(row['Volume'])
-                ))
-
-            # Use INSERT OR REPLACE for DuckDB
-            conn.executemany("""
-                INSERT OR REPLACE INTO stock_prices
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, records)
+        """Bulk upsert historic stock data; returns inserted and updated row counts
+
+        ``data`` is a fetcher-style frame indexed by date with Open/High/Low/
+        Close/Volume columns. Frames that carry a ``symbol`` column may hold
+        several symbols at once, in which case ``symbol`` can be None.
+        """
+        if data is None or data.empty:
+            return {'inserted': 0, 'updated': 0}
+
+        incoming = self._normalize_price_frame(symbol, data)
+        if self._archived:
+            # Closed years are immutable once archived; don't let backfills resurrect them
+            cutoffs = pd.to_datetime(incoming['symbol'].map(self._archived))
+            incoming = incoming[cutoffs.isna() | (incoming['timestamp'] >= cutoffs)]
+            if incoming.empty:
+                return {'inserted': 0, 'updated': 0}
+
+        with self._writer() as conn:
+            conn.register('incoming_prices', incoming)
+            try:
+                conn.execute("BEGIN TRANSACTION")
+                try:
+                    # Dedupe on load: replace existing bars by deleting them first. The
+                    # symbol list lets min/max pruning skip other symbols' row groups.
+                    updated = conn.execute("""
+                        DELETE FROM stock_prices
+                        USING incoming_prices i
+                        WHERE stock_prices.symbol IN (SELECT unnest(?::VARCHAR[]))
+                          AND stock_prices.symbol = i.symbol
+                          AND stock_prices.timestamp = i.timestamp
+                    """, [incoming['symbol'].unique().tolist()]).fetchone()[0]
+
+                    conn.execute("""
+                        INSERT INTO stock_prices
+                        SELECT symbol, timestamp, open_price, high_price,
+                               low_price, close_price, volume
+                        FROM incoming_prices
+                        ORDER BY symbol, timestamp
+                    """)
 
+                    conn.execute("""
+                        INSERT INTO symbol_watermarks
+                        SELECT symbol, max(timestamp), now()::TIMESTAMP
+                        FROM incoming_prices
+                        GROUP BY symbol
+                        ON CONFLICT (symbol) DO UPDATE SET
+                            last_timestamp = greatest(symbol_watermarks.last_timestamp, excluded.last_timestamp),
+                            last_ingested = excluded.last_ingested
+                    """)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            finally:
+                conn.unregister('incoming_prices')
+
+        DB_ROWS_WRITTEN.inc(len(incoming), table='stock_prices')
+        bounds = incoming.groupby('symbol')['timestamp'].agg(['min', 'max'])
+        self._notify_write('stock_prices', {
+            symbol: (row['min'].to_pydatetime(), row['max'].to_pydatetime())
+            for symbol, row in bounds.iterrows()
+        })
+
+        return {'inserted': len(incoming) - updated, 'updated': updated}
+
+    @timed_method(DB_LATENCY)
     def update_latest_price(self, symbol, price, change_percent, volume):
         """Update the latest price for a symbol"""
-        with duckdb.connect(self.db_path) as conn:
+        with self._writer() as conn:
             current_time = datetime.now()
-            conn.execute("""
-                INSERT OR REPLACE INTO latest_prices
-                VALUES (?, ?, ?, ?, ?)
-            """, (symbol, price, change_percent, volume, current_time))
+            conn.execute(UPSERT_LATEST_PRICE, (symbol, price, change_percent, volume, current_time))
+        DB_ROWS_WRITTEN.inc(table='latest_prices')
 
-    def get_historic_data(self, symbol, start_date=None, end_date=None):
-        """Get historic data for a symbol"""
-        with duckdb.connect(self.db_path) as conn:
-            query = "SELECT * FROM stock_prices WHERE symbol = ?"
-            params = [symbol]
+        self._notify_write('latest_prices', {symbol: (current_time, current_time)})
 
-            # Convert date strings to datetime objects for filtering
-            if start_date:
-                start_datetime = pd.to_datetime(start_date)
-                query += " AND timestamp >= ?"
-                params.append(start_datetime)
+    @staticmethod
+    def _date_range_filter(start_date=None, end_date=None):
+        """Build the optional timestamp range predicate and its parameters"""
+        clause = ""
+        params = []
+
+        # Convert date strings to datetime objects for filtering
+        if start_date:
+            clause += " AND timestamp >= ?"
+            params.append(pd.to_datetime(start_date))
+
+        if end_date:
+            clause += " AND timestamp <= ?"
+            params.append(pd.to_datetime(end_date))
+
+        return clause, params
+
+    def _archive_dir(self, symbol):
+        """Partition directory of one symbol (DuckDB percent-encodes partition values)"""
+        return os.path.join(self.archive_path, f"symbol={quote(symbol, safe='')}")
 
+    def _archive_glob(self, symbol):
+        """Parquet glob for one symbol's archived partitions, as a quoted SQL literal"""
+        path = os.path.join(self._archive_dir(symbol), "year=*", "*.parquet")
+        return "'" + path.replace("'", "''") + "'"
+
+    def _price_source(self, symbols, start_date=None, end_date=None):
+        """SQL (and params) for stock_prices rows of ``symbols`` in a date range
+
+        Hot rows come from the stock_prices table. For symbols with archived
+        years, the matching Parquet partitions are unioned in; the year
+        predicate lets DuckDB skip partitions outside the range.
+        """
+        range_clause, range_params = self._date_range_filter(start_date, end_date)
+        symbols = list(symbols)
+        sql = """
+            SELECT symbol, timestamp, open_price, high_price, low_price, close_price, volume
+            FROM stock_prices
+            WHERE symbol IN (SELECT unnest(?::VARCHAR[]))
+        """ + range_clause
+        params = [symbols] + range_params
+
+        archived = [s for s in symbols if s in self._archived and os.path.isdir(self._archive_dir(s))]
+        if archived:
+            year_clause = ""
+            if start_date:
+                year_clause += f" AND year >= {pd.to_datetime(start_date).year:d}"
             if end_date:
-                end_datetime = pd.to_datetime(end_date)
-                query += " AND timestamp <= ?"
-                params.append(end_datetime)
+                year_clause += f" AND year <= {pd.to_datetime(end_date).year:d}"
+            sql += f"""
+            UNION ALL
+            SELECT c.symbol, c.timestamp, c.open_price, c.high_price, c.low_price, c.close_price, c.volume
+            FROM read_parquet([{', '.join(self._archive_glob(s) for s in archived)}],
+                              hive_partitioning = true,
+                              hive_types = {{'symbol': VARCHAR, 'year': INTEGER}}) c
+            JOIN archive_state a ON a.symbol = c.symbol
+            WHERE c.timestamp < a.archived_until
+            """ + range_clause.replace("timestamp", "c.timestamp") + year_clause
+            params += range_params
+        return sql, params
+
+    @timed_method(DB_LATENCY)
+    def get_historic_data(self, symbol, start_date=None, end_date=None):
+        """Get historic data for a symbol (hot rows plus any archived years)"""
+        conn = self._reader()
+        source, params = self._price_source([symbol], start_date, end_date)
+        query = f"SELECT * FROM ({source}) ORDER BY timestamp"
+
+        df = conn.execute(query, params).fetchdf()
+
+        # Set timestamp as index directly since it's already a datetime
+        if not df.empty and 'timestamp' in df.columns:
+            df.set_index('timestamp', inplace=True)
+            df.index.name = 'Date'  # Match the original format
+
+        return df
+
+    @timed_method(DB_LATENCY)
+    def count_historic_records(self, symbols):
+        """Stored bar count per symbol (hot rows plus archived years) in one grouped query"""
+        conn = self._reader()
+        source, params = self._price_source(symbols)
+        counts = dict(conn.execute(f"SELECT symbol, count(*) FROM ({source}) GROUP BY symbol", params).fetchall())
+        return {symbol: counts.get(symbol, 0) for symbol in symbols}
 
-            query += " ORDER BY timestamp"
+    @timed_method(DB_LATENCY)
+    def get_historic_arrow(self, symbols, start_date=None, end_date=None):
+        """Get historic data for one or more symbols as a pyarrow Table
 
-            df = conn.execute(query, params).fetchdf()
+        Columns use the API field names (symbol, timestamp, open, high, low,
+        close, volume) and rows are ordered by symbol then timestamp.
+        """
+        conn = self._reader()
+        source, params = self._price_source(symbols, start_date, end_date)
+        query = f"""
+            SELECT symbol, timestamp,
+                   open_price AS open, high_price AS high, low_price AS low,
+                   close_price AS close, volume
+            FROM ({source})
+            ORDER BY symbol, timestamp
+        """
 
-            # Set timestamp as index directly since it's already a datetime
-            if not df.empty and 'timestamp' in df.columns:
-                df.set_index('timestamp', inplace=True)
-                df.index.name = 'Date'  # Match the original format
+        return conn.execute(query, params).to_arrow_table()
 
-            return df
+    @staticmethod
+    def _resample_query(source):
+        """OHLCV aggregation per time bucket: first open, max high, min low, last close, summed volume"""
+        return f"""
+            SELECT symbol,
+                   bucket AS timestamp,
+                   arg_min(open_price, timestamp) AS open_price,
+                   max(high_price) AS high_price,
+                   min(low_price) AS low_price,
+                   arg_max(close_price, timestamp) AS close_price,
+                   sum(volume)::BIGINT AS volume
+            FROM (
+                SELECT *, time_bucket(?::INTERVAL, timestamp) AS bucket
+                FROM ({source})
+            )
+            GROUP BY symbol, bucket
+            ORDER BY symbol, bucket
+        """
 
+    @timed_method(DB_LATENCY)
+    def get_resampled_data(self, symbol, interval, start_date=None, end_date=None):
+        """Get OHLCV bars for a symbol aggregated into ``interval`` buckets (e.g. 1w, 1mo)
+
+        Returns the same frame layout as get_historic_data, indexed by bucket start.
+        """
+        conn = self._reader()
+        bucket = parse_interval(interval)
+        source, params = self._price_source([symbol], start_date, end_date)
+        query = self._resample_query(source)
+
+        df = conn.execute(query, [bucket] + params).fetchdf()
+        if not df.empty:
+            df.set_index('timestamp', inplace=True)
+            df.index.name = 'Date'
+        return df
+
+    @timed_method(DB_LATENCY)
+    def get_resampled_arrow(self, symbols, interval, start_date=None, end_date=None):
+        """Get resampled bars for one or more symbols as a pyarrow Table (see get_historic_arrow)"""
+        conn = self._reader()
+        bucket = parse_interval(interval)
+        source, params = self._price_source(symbols, start_date, end_date)
+        query = f"""
+            SELECT symbol, timestamp,
+                   open_price AS open, high_price AS high, low_price AS low,
+                   close_price AS close, volume
+            FROM ({self._resample_query(source)})
+        """
+        return conn.execute(query, [bucket] + params).to_arrow_table()
+
+    @timed_method(DB_LATENCY)
+    def choose_interval(self, symbol, max_points, start_date=None, end_date=None):
+        """Pick the smallest bucket from INTERVAL_LADDER that keeps a range under ``max_points`` bars
+
+        Returns None when the raw daily bars already fit.
+        """
+        conn = self._reader()
+        source, params = self._price_source([symbol], start_date, end_date)
+        count, first, last = conn.execute(
+            f"SELECT count(*), min(timestamp), max(timestamp) FROM ({source})", params
+        ).fetchone()
+
+        if count <= max_points:
+            return None
+
+        span_days = (last - first).total_seconds() / 86400
+        for interval in INTERVAL_LADDER:
+            if span_days / interval_days(interval) + 1 <= max_points:
+                return interval
+        return f"{int(span_days // 365.25 // max_points) + 1}y"
+
+    @timed_method(DB_LATENCY)
+    def archive_closed_years(self, before_year=None):
+        """Move bars from years before ``before_year`` (default: this year) into the Parquet archive
+
+        Rows are written as ``archive_path/symbol=X/year=YYYY/part_<uuid>.parquet``
+        and then deleted from stock_prices in the same transaction that moves
+        each symbol's archived_until forward. Returns archived row counts per symbol.
+        """
+        cutoff = datetime(before_year or datetime.now().year, 1, 1)
+        target = "'" + self.archive_path.replace("'", "''") + "'"
+
+        with self._writer() as conn:
+            counts = dict(conn.execute(
+                "SELECT symbol, count(*) FROM stock_prices WHERE timestamp < ? GROUP BY symbol", [cutoff]
+            ).fetchall())
+            if not counts:
+                return {}
+
+            os.makedirs(self.archive_path, exist_ok=True)
+            conn.execute(f"""
+                COPY (
+                    SELECT symbol, year(timestamp)::INTEGER AS year, timestamp,
+                           open_price, high_price, low_price, close_price, volume
+                    FROM stock_prices
+                    WHERE timestamp < ?
+                    ORDER BY symbol, timestamp
+                ) TO {target} (
+                    FORMAT parquet, COMPRESSION zstd,
+                    PARTITION_BY (symbol, year),
+                    FILENAME_PATTERN 'part_{{uuid}}',
+                    OVERWRITE_OR_IGNORE true
+                )
+            """, [cutoff])
+
+            conn.execute("BEGIN TRANSACTION")
+            try:
+                conn.execute("""
+                    INSERT INTO archive_state
+                    SELECT symbol, ?, count(*), now()::TIMESTAMP
+                    FROM stock_prices
+                    WHERE timestamp < ?
+                    GROUP BY symbol
+                    ON CONFLICT (symbol) DO UPDATE SET
+                        archived_until = greatest(archive_state.archived_until, excluded.archived_until),
+                        archived_rows = archive_state.archived_rows + excluded.archived_rows,
+                        archived_at = excluded.archived_at
+                """, [cutoff, cutoff])
+                conn.execute("DELETE FROM stock_prices WHERE timestamp < ?", [cutoff])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            self._archived = dict(conn.execute("SELECT symbol, archived_until FROM archive_state").fetchall())
+            # Give the freed blocks back to the database file; skipped while readers hold transactions
+            try:
+                conn.execute("CHECKPOINT")
+            except duckdb.TransactionException:
+                pass
+
+        return counts
+
+    @timed_method(DB_LATENCY)
+    def compact_archive(self):
+        """Rewrite every archive partition holding several files as one deduplicated, sorted file
+
+        The merged file is renamed into place before the old files are
+        removed, so concurrent readers never miss a partition (at worst they
+        briefly see its rows twice).
+        """
+        compacted = 0
+        removed = 0
+        with self._writer() as conn:
+            for partition in sorted(glob.glob(os.path.join(self.archive_path, "symbol=*", "year=*"))):
+                files = sorted(glob.glob(os.path.join(partition, "*.parquet")))
+                if len(files) < 2:
+                    continue
+
+                sources = ", ".join("'" + f.replace("'", "''") + "'" for f in files)
+                staging = os.path.join(partition, "compacting.tmp")
+                conn.execute(f"""
+                    COPY (
+                        SELECT DISTINCT ON (timestamp)
+                               timestamp, open_price, high_price, low_price, close_price, volume
+                        FROM read_parquet([{sources}], hive_partitioning = false)
+                        ORDER BY timestamp
+                    ) TO '{staging.replace("'", "''")}' (FORMAT parquet, COMPRESSION zstd)
+                """)
+                os.replace(staging, os.path.join(partition, f"part_{uuid.uuid4()}.parquet"))
+                for f in files:
+                    os.remove(f)
+                compacted += 1
+                removed += len(files)
+
+        return {'partitions_compacted': compacted, 'files_removed': removed}
+
+    def archive_status(self):
+        """Per-symbol archive boundary, row count, and Parquet file count/bytes"""
+        conn = self._reader()
+        rows = conn.execute(
+            "SELECT symbol, archived_until, archived_rows, archived_at FROM archive_state ORDER BY symbol"
+        ).fetchall()
+
+        status = {}
+        for symbol, archived_until, archived_rows, archived_at in rows:
+            files = glob.glob(os.path.join(self._archive_dir(symbol), "year=*", "*.parquet"))
+            status[symbol] = {
+                'archived_until': archived_until,
+                'archived_rows': archived_rows,
+                'archived_at': archived_at,
+                'files': len(files),
+                'bytes': sum(os.path.getsize(f) for f in files)
+            }
+        return status
+
+    def _storage_layout(self, conn):
+        """Row groups of stock_prices and how many of them an average symbol's bars span
+
+        Uses the per-row-group min/max of the symbol column, the same
+        statistics DuckDB prunes scans with. Row groups without statistics
+        (not yet checkpointed) count as overlapping every symbol.
+        """
+        row_groups, symbols, spans, max_span = conn.execute("""
+            WITH groups AS (
+                SELECT row_group_id,
+                       min(nullif(regexp_extract(stats, 'Min: ([^,\\]]*)', 1), '')) AS lo,
+                       max(nullif(regexp_extract(stats, 'Max: ([^,\\]]*)', 1), '')) AS hi
+                FROM pragma_storage_info('stock_prices')
+                WHERE column_name = 'symbol'
+                GROUP BY row_group_id
+            ),
+            symbols AS (SELECT DISTINCT symbol FROM stock_prices),
+            spans AS (
+                SELECT s.symbol, count(g.row_group_id) AS row_groups
+                FROM symbols s
+                LEFT JOIN groups g
+                  ON (g.lo IS NULL OR s.symbol >= g.lo) AND (g.hi IS NULL OR s.symbol <= g.hi)
+                GROUP BY s.symbol
+            )
+            SELECT (SELECT count(*) FROM groups), count(*), avg(row_groups), max(row_groups)
+            FROM spans
+        """).fetchone()
+        return {
+            'row_groups': row_groups,
+            'symbols': symbols,
+            'row_groups_per_symbol': round(spans, 2) if spans is not None else 0.0,
+            'max_row_groups_per_symbol': max_span or 0,
+        }
+
+    @timed_method(DB_LATENCY)
+    def storage_report(self):
+        """Database, stock_prices and index sizes plus how well stock_prices is clustered"""
+        conn = self._reader()
+        size = conn.execute("PRAGMA database_size").fetchdf().iloc[0]
+        block_size = int(size['block_size'])
+        rows, table_blocks = conn.execute("""
+            SELECT (SELECT count(*) FROM stock_prices),
+                   count(DISTINCT block_id) FILTER (WHERE persistent)
+            FROM pragma_storage_info('stock_prices')
+        """).fetchone()
+        intraday_rows, intraday_blocks = conn.execute("""
+            SELECT (SELECT count(*) FROM intraday_bars),
+                   count(DISTINCT block_id) FILTER (WHERE persistent)
+            FROM pragma_storage_info('intraday_bars')
+        """).fetchone()
+        indexes = conn.execute("""
+            SELECT table_name, constraint_text
+            FROM duckdb_constraints()
+            WHERE constraint_type IN ('PRIMARY KEY', 'UNIQUE')
+            UNION ALL
+            SELECT table_name, sql FROM duckdb_indexes()
+            ORDER BY 1
+        """).fetchall()
+        memory = dict(conn.execute("SELECT tag, memory_usage_bytes FROM duckdb_memory()").fetchall())
+
+        return {
+            'database': {
+                'file_bytes': int(size['total_blocks']) * block_size,
+                'used_bytes': int(size['used_blocks']) * block_size,
+                'free_bytes': int(size['free_blocks']) * block_size,
+                'wal_size': size['wal_size'],
+                'memory_usage': size['memory_usage'],
+            },
+            'stock_prices': dict(
+                rows=rows,
+                bytes=table_blocks * block_size,
+                primary_key=any(table == 'stock_prices' for table, _ in indexes),
+                **self._storage_layout(conn)
+            ),
+            'intraday_bars': {
+                'rows': intraday_rows,
+                'bytes': intraday_blocks * block_size,
+                'symbols': len(self._symbol_ids),
+            },
+            'indexes': [{'table': table, 'definition': definition} for table, definition in indexes],
+            'index_memory_bytes': memory.get('ART_INDEX', 0),
+        }
+
+    @timed_method(DB_LATENCY)
+    def cluster_prices(self):
+        """Rewrite stock_prices sorted by (symbol, timestamp), deduplicated and without a primary key
+
+        The sorted copy is built while readers keep querying the current
+        table, then swapped in by one catalog transaction. Queries that are
+        already running finish against the old table. Writers wait on the
+        writer lock for the whole rewrite. Returns the layout before and after.
+        """
+        with self._writer() as conn:
+            before = self._storage_layout(conn)
+            conn.execute("DROP TABLE IF EXISTS stock_prices_clustered")
+            conn.execute(f"CREATE TABLE stock_prices_clustered ({STOCK_PRICES_COLUMNS})")
+            conn.execute("""
+                INSERT INTO stock_prices_clustered
+                SELECT DISTINCT ON (symbol, timestamp)
+                       symbol, timestamp, open_price, high_price, low_price, close_price, volume
+                FROM (SELECT *, rowid AS row_id FROM stock_prices)
+                ORDER BY symbol, timestamp, row_id DESC
+            """)
+
+            conn.execute("BEGIN TRANSACTION")
+            try:
+                conn.execute("DROP TABLE stock_prices")
+                conn.execute("ALTER TABLE stock_prices_clustered RENAME TO stock_prices")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                conn.execute("DROP TABLE IF EXISTS stock_prices_clustered")
+                raise
+
+            # Persist the sorted row groups (and their statistics); skipped while readers hold transactions
+            try:
+                conn.execute("CHECKPOINT")
+            except duckdb.TransactionException:
+                pass
+            after = self._storage_layout(conn)
+
+        logger.info("🧹 Clustered stock_prices: %s row groups per symbol -> %s",
+                    before['row_groups_per_symbol'], after['row_groups_per_symbol'])
+        return {'before': before, 'after': after}
+
+    def _ensure_symbol_ids(self, conn, symbols):
+        """Assign dictionary ids to unseen symbols (caller holds the writer lock)"""
+        new = sorted(set(symbols) - self._symbol_ids.keys())
+        if new:
+            next_id = max(self._symbol_ids.values(), default=-1) + 1
+            if next_id + len(new) - 1 > MAX_SYMBOL_ID:
+                raise ValueError(f"symbol_ids is full ({MAX_SYMBOL_ID + 1} symbols)")
+            rows = list(zip(range(next_id, next_id + len(new)), new))
+            conn.executemany("INSERT INTO symbol_ids VALUES (?, ?)", rows)
+            self._symbol_ids.update((symbol, symbol_id) for symbol_id, symbol in rows)
+        return self._symbol_ids
+
+    @timed_method(DB_LATENCY)
+    def insert_intraday_bars(self, symbol, interval, data):
+        """Append intraday bars in the compact layout; returns the number of new bars
+
+        ``data`` is a fetcher-style frame (date-indexed Open/High/Low/Close/
+        Volume, optionally with a ``symbol`` column for multi-symbol batches).
+        Per (symbol, interval), bars older than the last stored one are
+        skipped, so overlapping upstream windows can be appended as-is. The
+        last stored bar itself is replaced, since it may have been stored
+        while still forming; everything before it is append-only.
+        """
+        interval = parse_intraday_interval(interval)
+        if data is None or data.empty:
+            return 0
+
+        incoming = self._normalize_price_frame(symbol, data)
+        if (incoming['volume'] > MAX_INTRADAY_VOLUME).any() or (incoming['volume'] < 0).any():
+            raise ValueError("Intraday volume outside the UINTEGER range")
+
+        with self._writer() as conn:
+            ids = self._ensure_symbol_ids(conn, incoming['symbol'].unique())
+            symbol_ids = incoming['symbol'].map(ids).to_numpy(dtype='uint16')
+            ts = incoming['timestamp'].to_numpy(dtype='datetime64[s]').astype('int64')
+            last = np.array([self._intraday_watermarks.get((i, interval), -1) for i in symbol_ids.tolist()])
+            keep = ts >= last
+            if not keep.any():
+                return 0
+            rewrites = bool((ts == last).any())
+
+            # Time order keeps each row group's ts range narrow, which is what day queries prune on
+            bars = pd.DataFrame({
+                'symbol_id': symbol_ids[keep],
+                'interval_minutes': np.full(keep.sum(), interval, dtype='uint8'),
+                'ts': ts[keep].astype('uint32'),
+                'open': incoming['open_price'].to_numpy(dtype='float32')[keep],
+                'high': incoming['high_price'].to_numpy(dtype='float32')[keep],
+                'low': incoming['low_price'].to_numpy(dtype='float32')[keep],
+                'close': incoming['close_price'].to_numpy(dtype='float32')[keep],
+                'volume': incoming['volume'].to_numpy(dtype='uint32')[keep],
+            }).sort_values(['ts', 'symbol_id'])
+
+            conn.register('incoming_bars', bars)
+            try:
+                conn.execute("BEGIN TRANSACTION")
+                try:
+                    replaced = 0
+                    if rewrites:
+                        # Only the watermark bars can match; the ts bound keeps the scan on the newest row groups
+                        replaced = conn.execute("""
+                            DELETE FROM intraday_bars
+                            USING incoming_bars i
+                            WHERE intraday_bars.ts >= ?
+                              AND intraday_bars.symbol_id = i.symbol_id
+                              AND intraday_bars.interval_minutes = i.interval_minutes
+                              AND intraday_bars.ts = i.ts
+                        """, [int(bars['ts'].min())]).fetchone()[0]
+                    conn.execute("INSERT INTO intraday_bars SELECT * FROM incoming_bars")
+                    watermarks = conn.execute("""
+                        INSERT INTO intraday_watermarks
+                        SELECT symbol_id, interval_minutes, max(ts)
+                        FROM incoming_bars
+                        GROUP BY symbol_id, interval_minutes
+                        ON CONFLICT (symbol_id, interval_minutes) DO UPDATE SET
+                            last_ts = greatest(intraday_watermarks.last_ts, excluded.last_ts)
+                        RETURNING symbol_id, interval_minutes, last_ts
+                    """).fetchall()
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            finally:
+                conn.unregister('incoming_bars')
+
+            for symbol_id, bar_interval, last_ts in watermarks:
+                self._intraday_watermarks[(symbol_id, bar_interval)] = last_ts
+
+        DB_ROWS_WRITTEN.inc(len(bars), table='intraday_bars')
+        written = incoming[keep]
+        bounds = written.groupby('symbol')['timestamp'].agg(['min', 'max'])
+        self._notify_write('intraday_bars', {
+            sym: (row['min'].to_pydatetime(), row['max'].to_pydatetime())
+            for sym, row in bounds.iterrows()
+        })
+        return len(bars) - replaced
+
+    def get_intraday_watermark(self, symbol, interval):
+        """Timestamp of the newest stored intraday bar for a symbol, or None"""
+        symbol_id = self._symbol_ids.get(symbol)
+        last_ts = self._intraday_watermarks.get((symbol_id, parse_intraday_interval(interval)))
+        return None if last_ts is None else pd.Timestamp(last_ts, unit='s').to_pydatetime()
+
+    def _intraday_source(self, symbols, interval, start_date=None, end_date=None):
+        """SQL (and params) for intraday bars of ``symbols`` on whole days start_date..end_date
+
+        Day bounds become epoch-second limits on ts, so DuckDB reads only the
+        row groups whose ts range overlaps the requested days.
+        """
+        ids = [self._symbol_ids[s] for s in symbols if s in self._symbol_ids]
+        sql = """
+            SELECT s.symbol, make_timestamp(b.ts::BIGINT * 1000000) AS timestamp,
+                   round(b.open::DOUBLE, 4) AS open_price, round(b.high::DOUBLE, 4) AS high_price,
+                   round(b.low::DOUBLE, 4) AS low_price, round(b.close::DOUBLE, 4) AS close_price,
+                   b.volume::BIGINT AS volume, b.ts
+            FROM intraday_bars b
+            JOIN symbol_ids s USING (symbol_id)
+            WHERE b.symbol_id IN (SELECT unnest(?::USMALLINT[]))
+              AND b.interval_minutes = ?
+        """
+        params = [ids, parse_intraday_interval(interval)]
+        if start_date:
+            sql += " AND b.ts >= ?"
+            params.append(int(pd.Timestamp(start_date).normalize().timestamp()))
+        if end_date:
+            sql += " AND b.ts < ?"
+            params.append(int((pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)).timestamp()))
+        return sql, params
+
+    @timed_method(DB_LATENCY)
+    def get_intraday_data(self, symbol, interval, start_date=None, end_date=None):
+        """Intraday bars for a symbol as a timestamp-indexed frame with the stock_prices column names"""
+        conn = self._reader()
+        source, params = self._intraday_source([symbol], interval, start_date, end_date)
+        df = conn.execute(f"""
+            SELECT timestamp, open_price, high_price, low_price, close_price, volume
+            FROM ({source})
+            ORDER BY ts
+        """, params).fetchdf()
+        df.set_index('timestamp', inplace=True)
+        df.index.name = 'Date'
+        return df
+
+    @timed_method(DB_LATENCY)
+    def get_intraday_arrow(self, symbols, interval, start_date=None, end_date=None):
+        """Intraday bars for one or more symbols as a pyarrow Table, same columns as get_historic_arrow"""
+        conn = self._reader()
+        source, params = self._intraday_source(symbols, interval, start_date, end_date)
+        return conn.execute(f"""
+            SELECT symbol, timestamp,
+                   open_price AS open, high_price AS high, low_price AS low,
+                   close_price AS close, volume
+            FROM ({source})
+            ORDER BY symbol, ts
+        """, params).to_arrow_table()
+
+    @timed_method(DB_LATENCY)
+    def get_watermark(self, symbol):
+        """Get the timestamp of the newest stored bar for a symbol, or None"""
+        conn = self._reader()
+        result = conn.execute(WATERMARK_QUERY, (symbol,)).fetchone()
+        return result[0] if result else None
+
+    @timed_method(DB_LATENCY)
+    def get_last_ingested(self, symbol):
+        """Get when a symbol's bars were last written (its data version), or None"""
+        conn = self._reader()
+        result = conn.execute(LAST_INGESTED_QUERY, (symbol,)).fetchone()
+        return result[0] if result else None
+
+    @timed_method(DB_LATENCY)
+    def get_symbol_aliases(self):
+        """Get every unexpired symbol alias as (alias, symbol, source, resolved_at, expires_at) rows"""
+        conn = self._reader()
+        return conn.execute("""
+            SELECT alias, symbol, source, resolved_at, expires_at
+            FROM symbol_aliases
+            WHERE expires_at IS NULL OR expires_at > now()::TIMESTAMP
+        """).fetchall()
+
+    @timed_method(DB_LATENCY)
+    def upsert_symbol_aliases(self, rows):
+        """Bulk upsert (alias, symbol, source, resolved_at, expires_at) rows"""
+        if not rows:
+            return 0
+        aliases = pd.DataFrame(rows, columns=['alias', 'symbol', 'source', 'resolved_at', 'expires_at'])
+        aliases = aliases.drop_duplicates('alias', keep='last')
+        with self._writer() as conn:
+            conn.register('incoming_aliases', aliases)
+            try:
+                conn.execute("""
+                    INSERT OR REPLACE INTO symbol_aliases
+                    SELECT alias, symbol, source,
+                           CAST(resolved_at AS TIMESTAMP), CAST(expires_at AS TIMESTAMP)
+                    FROM incoming_aliases
+                """)
+            finally:
+                conn.unregister('incoming_aliases')
+        return len(aliases)
+
+    @timed_method(DB_LATENCY)
     def get_latest_price(self, symbol):
         """Get the latest price for a symbol"""
-        with duckdb.connect(self.db_path) as conn:
-            result = conn.execute("""
-                SELECT * FROM latest_prices WHERE symbol = ?
-            """, (symbol,)).fetchone()
-
-            if result:
-                # last_updated is already a datetime object from TIMESTAMP column
-                return {
-                    'symbol': result[0],
-                    'price': result[1],
-                    'change_percent': result[2],
-                    'volume': result[3],
-                    'last_updated': result[4]
-                }
-            return None
+        conn = self._reader()
+        result = conn.execute(LATEST_PRICE_QUERY, (symbol,)).fetchone()
 
+        if result:
+            # last_updated is already a datetime object from TIMESTAMP column
+            return {
+                'symbol': result[0],
+                'price': result[1],
+                'change_percent': result[2],
+                'volume': result[3],
+                'last_updated': result[4]
+            }
+        return None
+
+    @timed_method(DB_LATENCY)
+    def get_latest_prices(self, symbols):
+        """Get the latest prices for several symbols in one query, keyed by symbol (missing ones omitted)"""
+        conn = self._reader()
+        rows = conn.execute(LATEST_PRICES_QUERY, [list(symbols)]).fetchall()
+        return {
+            row[0]: {
+                'symbol': row[0],
+                'price': row[1],
+                'change_percent': row[2],
+                'volume': row[3],
+                'last_updated': row[4]
+            }
+            for row in rows
+        }
+
+    @timed_method(DB_LATENCY)
     def get_all_symbols(self):
         """Get all unique symbols in the database"""
-        with duckdb.connect(self.db_path) as conn:
-            result = conn.execute("""
-                SELECT DISTINCT symbol FROM stock_prices
-            """).fetchall()
-            return [row[0] for row in result]
+        conn = self._reader()
+        result = conn.execute(ALL_SYMBOLS_QUERY).fetchall()
+        return [row[0] for row in result]
+
+
+class AsyncStockDatabase:
+    """Async facade that runs StockDatabase calls on bounded thread pools
+
+    Reads and writes use separate executors so a long backfill insert can't
+    take every worker away from request-path queries. Each call is awaited
+    with a timeout; on expiry the caller gets asyncio.TimeoutError while the
+    statement finishes in its worker thread.
+    """
+
+    def __init__(self, db, read_workers=4, write_workers=1, read_timeout=30.0, write_timeout=120.0):
+        self.db = db
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self._read_executor = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix='duckdb-read')
+        self._write_executor = ThreadPoolExecutor(max_workers=write_workers, thread_name_prefix='duckdb-write')
+
+    async def _submit(self, executor, timeout, fn, args, kwargs):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+        return await asyncio.wait_for(future, timeout)
+
+    async def run_read(self, fn, *args, timeout=None, **kwargs):
+        """Run a read-only callable on the reader pool"""
+        return await self._submit(self._read_executor, timeout or self.read_timeout, fn, args, kwargs)
+
+    async def run_write(self, fn, *args, timeout=None, **kwargs):
+        """Run a mutating callable on the writer pool"""
+        return await self._submit(self._write_executor, timeout or self.write_timeout, fn, args, kwargs)
+
+    async def insert_historic_data(self, symbol, data, timeout=None):
+        return await self.run_write(self.db.insert_historic_data, symbol, data, timeout=timeout)
+
+    async def update_latest_price(self, symbol, price, change_percent, volume, timeout=None):
+        return await self.run_write(self.db.update_latest_price, symbol, price, change_percent, volume, timeout=timeout)
+
+    async def get_historic_data(self, symbol, start_date=None, end_date=None, timeout=None):
+        return await self.run_read(self.db.get_historic_data, symbol, start_date, end_date, timeout=timeout)
+
+    async def count_historic_records(self, symbols, timeout=None):
+        return await self.run_read(self.db.count_historic_records, symbols, timeout=timeout)
+
+    async def get_historic_arrow(self, symbols, start_date=None, end_date=None, timeout=None):
+        return await self.run_read(self.db.get_historic_arrow, symbols, start_date, end_date, timeout=timeout)
+
+    async def get_resampled_data(self, symbol, interval, start_date=None, end_date=None, timeout=None):
+        return await self.run_read(self.db.get_resampled_data, symbol, interval, start_date, end_date, timeout=timeout)
+
+    async def get_resampled_arrow(self, symbols, interval, start_date=None, end_date=None, timeout=None):
+        return await self.run_read(self.db.get_resampled_arrow, symbols, interval, start_date, end_date, timeout=timeout)
+
+    async def choose_interval(self, symbol, max_points, start_date=None, end_date=None, timeout=None):
+        return await self.run_read(self.db.choose_interval, symbol, max_points, start_date, end_date, timeout=timeout)
+
+    async def insert_intraday_bars(self, symbol, interval, data, timeout=None):
+        return await self.run_write(self.db.insert_intraday_bars, symbol, interval, data, timeout=timeout)
+
+    async def get_intraday_data(self, symbol, interval, start_date=None, end_date=None, timeout=None):
+        return await self.run_read(self.db.get_intraday_data, symbol, interval, start_date, end_date,
+                                   timeout=timeout)
+
+    async def get_intraday_arrow(self, symbols, interval, start_date=None, end_date=None, timeout=None):
+        return await self.run_read(self.db.get_intraday_arrow, symbols, interval, start_date, end_date,
+                                   timeout=timeout)
+
+    async def storage_report(self, timeout=None):
+        return await self.run_read(self.db.storage_report, timeout=timeout)
+
+    async def cluster_prices(self, timeout=None):
+        return await self.run_write(self.db.cluster_prices, timeout=timeout)
+
+    async def get_watermark(self, symbol, timeout=None):
+        return await self.run_read(self.db.get_watermark, symbol, timeout=timeout)
+
+    async def get_last_ingested(self, symbol, timeout=None):
+        return await self.run_read(self.db.get_last_ingested, symbol, timeout=timeout)
+
+    async def get_symbol_aliases(self, timeout=None):
+        return await self.run_read(self.db.get_symbol_aliases, timeout=timeout)
+
+    async def upsert_symbol_aliases(self, rows, timeout=None):
+        return await self.run_write(self.db.upsert_symbol_aliases, rows, timeout=timeout)
+
+    async def get_latest_price(self, symbol, timeout=None):
+        return await self.run_read(self.db.get_latest_price, symbol, timeout=timeout)
+
+    async def get_latest_prices(self, symbols, timeout=None):
+        return await self.run_read(self.db.get_latest_prices, symbols, timeout=timeout)
+
+    async def get_all_symbols(self, timeout=None):
+        return await self.run_read(self.db.get_all_symbols, timeout=timeout)
+
+    def close(self):
+        """Drain both pools, then close the underlying database"""
+        self._write_executor.shutdown(wait=True)
+        self._read_executor.shutdown(wait=True)
+        self.db.close()
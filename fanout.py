@@ -0,0 +1,272 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Callable, Dict, Iterable, Optional, Set
+
+from fastapi import WebSocket
+
+try:
+    import msgpack
+except ImportError:  # MessagePack framing is optional
+    msgpack = None
+
+logger = logging.getLogger("ohlcv.fanout")
+
+# Wire encodings for /ws/stream frames
+STREAM_ENCODINGS = ("json", "msgpack")
+
+# What to do when a client's outbound queue is full
+OVERFLOW_DROP = "drop"              # discard the new message
+OVERFLOW_CONFLATE = "conflate"      # replace everything queued with the new message
+OVERFLOW_DISCONNECT = "disconnect"  # close the slow client
+OVERFLOW_POLICIES = (OVERFLOW_DROP, OVERFLOW_CONFLATE, OVERFLOW_DISCONNECT)
+
+
+class ClientChannel:
+    """Bounded outbound queue plus a writer task for one WebSocket
+
+    ``offer`` never blocks, so a broadcaster can hand the same pre-serialized
+    text to thousands of channels without waiting on any of them. Each
+    channel's writer drains its own queue. A client that can't keep up hits
+    the overflow policy. A send that takes longer than ``send_timeout``
+    counts as a stalled client and closes the channel.
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue: int = 64, policy: str = OVERFLOW_CONFLATE,
+                 send_timeout: Optional[float] = 10.0, on_close: Optional[Callable[["ClientChannel"], None]] = None):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}. Use one of: {', '.join(OVERFLOW_POLICIES)}")
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.on_close = on_close
+
+        self._queue: deque = deque()
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.conflated = 0
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def offer(self, text: str) -> bool:
+        """Queue a serialized message; returns False if it was dropped or the channel closed"""
+        if self.closed:
+            return False
+        if len(self._queue) >= self.max_queue:
+            if self.policy == OVERFLOW_DROP:
+                self.dropped += 1
+                return False
+            if self.policy == OVERFLOW_DISCONNECT:
+                self.close()
+                return False
+            self.conflated += len(self._queue)
+            self._queue.clear()
+        self._queue.append(text)
+        self._ready.set()
+        return True
+
+    def deliver(self, symbol: str, payload: dict, text: str) -> bool:
+        """ConnectionManager hook: single-symbol sockets get the shared serialized tick"""
+        return self.offer(text)
+
+    async def _write_loop(self):
+        try:
+            while not self.closed:
+                if not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                text = self._queue.popleft()
+                await asyncio.wait_for(self.websocket.send_text(text), self.send_timeout)
+                self.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning("⚠️ Closing WebSocket channel after failed send: %r", e)
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop the writer and close the socket in the background (idempotent)"""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        self._ready.set()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        asyncio.ensure_future(self._close_socket())
+        if self.on_close is not None:
+            self.on_close(self)
+
+    async def _close_socket(self):
+        try:
+            await asyncio.wait_for(self.websocket.close(), self.send_timeout)
+        except Exception:
+            pass
+
+    async def wait_closed(self):
+        """Wait for the writer task to finish after close()"""
+        if self._writer is not None:
+            await asyncio.gather(self._writer, return_exceptions=True)
+
+    def pending(self) -> int:
+        return len(self._queue)
+
+
+class StreamSession:
+    """One multiplexed ``/ws/stream`` client: many symbols over a single socket
+
+    Ticks are not queued one by one. Each symbol keeps only its latest
+    pending tick, and the writer sends everything pending as one
+    ``{"type": "ticks", "data": {symbol: tick}}`` frame, waiting
+    ``flush_interval`` after the first tick so that ticks arriving together
+    share a frame. A slow client therefore gets fewer, fuller frames, and
+    memory stays bounded by its subscription count.
+
+    With ``deltas`` on, a tick only carries the fields that changed since
+    the last one this client received for that symbol (the first is
+    always full). ``encoding="msgpack"`` sends binary MessagePack frames
+    instead of JSON text.
+    """
+
+    def __init__(self, websocket: WebSocket, encoding: str = "json", deltas: bool = False,
+                 flush_interval: float = 0.05, send_timeout: Optional[float] = 10.0,
+                 on_close: Optional[Callable[["StreamSession"], None]] = None):
+        if encoding not in STREAM_ENCODINGS:
+            raise ValueError(f"Unknown encoding: {encoding}. Use one of: {', '.join(STREAM_ENCODINGS)}")
+        if encoding == "msgpack" and msgpack is None:
+            raise ValueError("msgpack encoding requires the msgpack package")
+        self.websocket = websocket
+        self.encoding = encoding
+        self.deltas = deltas
+        self.flush_interval = flush_interval
+        self.send_timeout = send_timeout
+        self.on_close = on_close
+
+        self.symbols: Set[str] = set()
+        self._pending: Dict[str, dict] = {}
+        self._last_sent: Dict[str, dict] = {}
+        self._control: deque = deque()
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self.closed = False
+        self.frames_sent = 0
+        self.ticks_sent = 0
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def encode(self, message: dict):
+        if self.encoding == "msgpack":
+            return msgpack.packb(message, use_bin_type=True)
+        return json.dumps(message, separators=(',', ':'))
+
+    def decode(self, message: dict) -> dict:
+        """Decode an inbound ASGI ``websocket.receive`` message (JSON text or MessagePack bytes)"""
+        if message.get("text") is not None:
+            return json.loads(message["text"])
+        if msgpack is None:
+            raise ValueError("Binary messages require the msgpack package")
+        return msgpack.unpackb(message["bytes"], raw=False)
+
+    def deliver(self, symbol: str, payload: dict, text: str = None) -> bool:
+        """ConnectionManager hook: keep only the newest tick per symbol until the next frame"""
+        if self.closed or symbol not in self.symbols:
+            return False
+        self._pending[symbol] = payload
+        self._ready.set()
+        return True
+
+    def reply(self, message: dict):
+        """Queue a control message (acks, errors); sent ahead of pending ticks"""
+        if not self.closed:
+            self._control.append(message)
+            self._ready.set()
+
+    def forget(self, symbols: Iterable[str]):
+        """Drop state for unsubscribed symbols so a later subscribe starts with a full tick"""
+        for symbol in symbols:
+            self.symbols.discard(symbol)
+            self._pending.pop(symbol, None)
+            self._last_sent.pop(symbol, None)
+
+    def _tick_frame(self) -> Optional[dict]:
+        pending, self._pending = self._pending, {}
+        data = {}
+        for symbol, payload in pending.items():
+            if "error" in payload or not self.deltas:
+                data[symbol] = payload
+                continue
+            last = self._last_sent.get(symbol, {})
+            changed = {k: v for k, v in payload.items() if last.get(k) != v}
+            self._last_sent[symbol] = payload
+            if changed:
+                data[symbol] = changed
+        return {"type": "ticks", "data": data} if data else None
+
+    async def _send(self, message: dict):
+        body = self.encode(message)
+        if isinstance(body, bytes):
+            await asyncio.wait_for(self.websocket.send_bytes(body), self.send_timeout)
+        else:
+            await asyncio.wait_for(self.websocket.send_text(body), self.send_timeout)
+
+    async def _write_loop(self):
+        try:
+            while not self.closed:
+                if self._control:
+                    await self._send(self._control.popleft())
+                    continue
+                if not self._pending:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+
+                # Let ticks that arrive together share one frame
+                await asyncio.sleep(self.flush_interval)
+                frame = self._tick_frame()
+                if frame is not None:
+                    await self._send(frame)
+                    self.frames_sent += 1
+                    self.ticks_sent += len(frame["data"])
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning("⚠️ Closing stream session after failed send: %r", e)
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop the writer and close the socket in the background (idempotent)"""
+        if self.closed:
+            return
+        self.closed = True
+        self._pending.clear()
+        self._control.clear()
+        self._ready.set()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        asyncio.ensure_future(self._close_socket())
+        if self.on_close is not None:
+            self.on_close(self)
+
+    async def _close_socket(self):
+        try:
+            await asyncio.wait_for(self.websocket.close(), self.send_timeout)
+        except Exception:
+            pass
+
+    async def wait_closed(self):
+        """Wait for the writer task to finish after close()"""
+        if self._writer is not None:
+            await asyncio.gather(self._writer, return_exceptions=True)
+
+    def pending(self) -> int:
+        return len(self._pending) + len(self._control)
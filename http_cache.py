@@ -0,0 +1,166 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+
+def make_etag(symbol: str, version: datetime, variant: Tuple = ()) -> str:
+    """Strong ETag for one representation of a symbol's data at ``version``"""
+    digest = hashlib.blake2b(repr((symbol, variant)).encode(), digest_size=8).hexdigest()
+    return '"%s-%x-%s"' % (symbol, int(version.timestamp() * 1_000_000), digest)
+
+
+def http_date(value: datetime) -> str:
+    """Format a (naive local or aware) datetime as an HTTP-date"""
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def is_not_modified(headers, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against the current validators"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison, as RFC 9110 requires for If-None-Match
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag in candidates
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP-dates have whole-second resolution
+        return last_modified.astimezone(timezone.utc).replace(microsecond=0) <= since
+    return False
+
+
+class ResponseCache:
+    """Per-symbol data versions plus an LRU of encoded response bodies
+
+    A symbol's version is the ``last_ingested`` time of its newest write.
+    It is read from ``symbol_watermarks`` on first use, never from
+    ``stock_prices``. After that it is kept in memory until
+    ``on_write`` (a StockDatabase write listener) forgets it. The write
+    also drops every cached body for the symbol.
+
+    Bodies are keyed by (symbol, variant), where variant covers range,
+    interval and format. An entry is served only if it was stored under
+    the symbol's current version. Total size is bounded by ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entry_bytes: int = 8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+
+        self._versions: Dict[str, Optional[datetime]] = {}
+        # Bumped on every write so a version read that raced a write is discarded
+        self._generations: Dict[str, int] = {}
+        self._entries: "OrderedDict[Tuple, Tuple[datetime, bytes, str]]" = OrderedDict()
+        self._keys_by_symbol: Dict[str, set] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    # Versions
+    def cached_version(self, symbol: str) -> Tuple[bool, Optional[datetime], int]:
+        """Return (known, version, generation); pass generation back to remember_version"""
+        with self._lock:
+            return symbol in self._versions, self._versions.get(symbol), self._generations.get(symbol, 0)
+
+    def remember_version(self, symbol: str, version: Optional[datetime], generation: int):
+        with self._lock:
+            if self._generations.get(symbol, 0) == generation:
+                self._versions[symbol] = version
+
+    def on_write(self, table: str, ranges: dict):
+        """StockDatabase write listener: forget versions and bodies of rewritten symbols"""
+        if table != 'stock_prices':
+            return
+        with self._lock:
+            for symbol in ranges:
+                self._generations[symbol] = self._generations.get(symbol, 0) + 1
+                self._versions.pop(symbol, None)
+                for key in self._keys_by_symbol.pop(symbol, ()):
+                    entry = self._entries.pop(key, None)
+                    if entry is not None:
+                        self._bytes -= len(entry[1])
+                self.invalidations += 1
+
+    # Bodies
+    def get(self, symbol: str, variant: Tuple, version: datetime) -> Optional[Tuple[bytes, str]]:
+        key = (symbol, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def set(self, symbol: str, variant: Tuple, version: datetime, body: bytes, media_type: str):
+        if len(body) > self.max_entry_bytes:
+            return
+        key = (symbol, variant)
+        with self._lock:
+            # A write since this body's version was read makes it stale already
+            if self._versions.get(symbol) != version:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[1])
+            self._entries[key] = (version, body, media_type)
+            self._keys_by_symbol.setdefault(symbol, set()).add(key)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes and self._entries:
+                (old_symbol, old_variant), (_, old_body, _) = self._entries.popitem(last=False)
+                self._bytes -= len(old_body)
+                self._keys_by_symbol.get(old_symbol, set()).discard((old_symbol, old_variant))
+
+    def tee(self, symbol: str, variant: Tuple, version: datetime, media_type: str,
+            chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Pass a streamed body through, caching it once it completes (if it fits)"""
+        parts, size = [], 0
+        for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                if size > self.max_entry_bytes:
+                    parts = None
+                else:
+                    parts.append(chunk)
+            yield chunk
+        if parts is not None:
+            self.set(symbol, variant, version, b"".join(parts), media_type)
+
+    def clear(self):
+        """Drop every cached body (data versions are kept); used to measure uncached responses"""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_symbol.clear()
+            self._bytes = 0
+
+    def record_not_modified(self):
+        self.not_modified += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "versions": len(self._versions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,385 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Indicators computed when a request doesn't name any
+DEFAULT_INDICATORS = "sma:20,ema:20,rsi:14,macd:12:26:9,bbands:20:2,atr:14,vwap:20"
+
+
+def _ewm(values: np.ndarray, alpha: float, seed: Optional[float] = None) -> np.ndarray:
+    """Recursive exponential average y[t] = alpha*x[t] + (1-alpha)*y[t-1], optionally continuing from ``seed``"""
+    series = pd.Series(values, dtype='float64')
+    if seed is None:
+        return series.ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    seeded = pd.concat([pd.Series([seed], dtype='float64'), series], ignore_index=True)
+    return seeded.ewm(alpha=alpha, adjust=False).mean().to_numpy()[1:]
+
+
+def _warmup_mask(values: np.ndarray, seen_before: int, warmup: int) -> np.ndarray:
+    """Blank out values until ``warmup`` bars have been seen in total"""
+    seen = seen_before + np.arange(1, len(values) + 1)
+    return np.where(seen < warmup, np.nan, values)
+
+
+class Indicator:
+    """One indicator with fixed parameters
+
+    ``compute(bars, state)`` takes new bars (oldest first, columns open/high/
+    low/close/volume) plus the state returned by the previous call, and
+    returns ``(columns, state)``. Feeding bars in several batches gives the
+    same values as one batch, which is what makes cached results
+    incrementally extendable.
+    """
+
+    name = ""
+
+    def __init__(self, *params):
+        self.params = params
+
+    @property
+    def key(self) -> str:
+        return ":".join([self.name] + [f"{p:g}" for p in self.params])
+
+    @property
+    def label(self) -> str:
+        return "_".join([self.name] + [f"{p:g}" for p in self.params])
+
+    def compute(self, bars: pd.DataFrame, state: Optional[dict]) -> Tuple[Dict[str, np.ndarray], dict]:
+        raise NotImplementedError
+
+
+class _WindowIndicator(Indicator):
+    """Rolling-window indicator; its state is the tail of bars the next window needs"""
+
+    window = 1
+
+    def compute(self, bars, state):
+        tail = state["tail"] if state else bars.iloc[:0]
+        frame = pd.concat([tail, bars]) if len(tail) else bars
+        columns = {name: values[len(tail):] for name, values in self.rolling(frame).items()}
+        return columns, {"tail": frame.iloc[-(self.window - 1):] if self.window > 1 else frame.iloc[:0]}
+
+    def rolling(self, frame: pd.DataFrame) -> Dict[str, np.ndarray]:
+        raise NotImplementedError
+
+
+class SMA(_WindowIndicator):
+    name = "sma"
+
+    def __init__(self, period=20):
+        super().__init__(int(period))
+        self.window = int(period)
+
+    def rolling(self, frame):
+        return {self.label: frame['close'].rolling(self.window).mean().to_numpy()}
+
+
+class BollingerBands(_WindowIndicator):
+    name = "bbands"
+
+    def __init__(self, period=20, k=2):
+        super().__init__(int(period), float(k))
+        self.window = int(period)
+        self.k = float(k)
+
+    def rolling(self, frame):
+        rolling = frame['close'].rolling(self.window)
+        middle = rolling.mean().to_numpy()
+        width = self.k * rolling.std(ddof=0).to_numpy()
+        return {
+            f"{self.label}_upper": middle + width,
+            f"{self.label}_middle": middle,
+            f"{self.label}_lower": middle - width,
+        }
+
+
+class VWAP(_WindowIndicator):
+    """Rolling volume-weighted average of the typical price over ``period`` bars"""
+
+    name = "vwap"
+
+    def __init__(self, period=20):
+        super().__init__(int(period))
+        self.window = int(period)
+
+    def rolling(self, frame):
+        typical = (frame['high'] + frame['low'] + frame['close']) / 3
+        volume = frame['volume'].astype('float64')
+        weighted = (typical * volume).rolling(self.window).sum()
+        total = volume.rolling(self.window).sum()
+        return {self.label: (weighted / total.where(total != 0)).to_numpy()}
+
+
+class EMA(Indicator):
+    name = "ema"
+
+    def __init__(self, period=20):
+        super().__init__(int(period))
+        self.period = int(period)
+
+    def compute(self, bars, state):
+        seen = state["seen"] if state else 0
+        values = _ewm(bars['close'].to_numpy(), 2 / (self.period + 1), state["ema"] if state else None)
+        new_state = {"ema": values[-1], "seen": seen + len(values)} if len(values) else state
+        return {self.label: _warmup_mask(values, seen, self.period)}, new_state
+
+
+class MACD(Indicator):
+    name = "macd"
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        super().__init__(int(fast), int(slow), int(signal))
+        self.fast, self.slow, self.signal = int(fast), int(slow), int(signal)
+
+    def compute(self, bars, state):
+        state = state or {"fast": None, "slow": None, "signal": None, "seen": 0}
+        close = bars['close'].to_numpy()
+        fast = _ewm(close, 2 / (self.fast + 1), state["fast"])
+        slow = _ewm(close, 2 / (self.slow + 1), state["slow"])
+        macd = fast - slow
+        signal = _ewm(macd, 2 / (self.signal + 1), state["signal"])
+        seen = state["seen"]
+        columns = {
+            self.label: _warmup_mask(macd, seen, self.slow),
+            f"{self.label}_signal": _warmup_mask(signal, seen, self.slow + self.signal - 1),
+            f"{self.label}_hist": _warmup_mask(macd - signal, seen, self.slow + self.signal - 1),
+        }
+        if len(close):
+            state = {"fast": fast[-1], "slow": slow[-1], "signal": signal[-1], "seen": seen + len(close)}
+        return columns, state
+
+
+class RSI(Indicator):
+    """Wilder's RSI (exponential smoothing with alpha = 1/period)"""
+
+    name = "rsi"
+
+    def __init__(self, period=14):
+        super().__init__(int(period))
+        self.period = int(period)
+
+    def compute(self, bars, state):
+        close = bars['close'].to_numpy()
+        if not len(close):
+            return {self.label: close.astype('float64')}, state
+
+        if state:
+            change = np.diff(close, prepend=state["close"])
+        else:
+            change = np.concatenate([[np.nan], np.diff(close)])
+        gain = np.where(np.isnan(change), np.nan, np.clip(change, 0, None))
+        loss = np.where(np.isnan(change), np.nan, np.clip(-change, 0, None))
+
+        alpha = 1 / self.period
+        avg_gain = _ewm(gain, alpha, state["gain"] if state else None)
+        avg_loss = _ewm(loss, alpha, state["loss"] if state else None)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+        rsi = np.where(np.isnan(avg_gain), np.nan, rsi)
+
+        seen = state["seen"] if state else 0
+        new_state = {"close": close[-1], "gain": avg_gain[-1], "loss": avg_loss[-1], "seen": seen + len(close)}
+        # First bar has no change, so a full period needs period + 1 bars
+        return {self.label: _warmup_mask(rsi, seen, self.period + 1)}, new_state
+
+
+class ATR(Indicator):
+    """Wilder's average true range"""
+
+    name = "atr"
+
+    def __init__(self, period=14):
+        super().__init__(int(period))
+        self.period = int(period)
+
+    def compute(self, bars, state):
+        high = bars['high'].to_numpy()
+        low = bars['low'].to_numpy()
+        close = bars['close'].to_numpy()
+        if not len(close):
+            return {self.label: close.astype('float64')}, state
+
+        previous = np.concatenate([[state["close"] if state else np.nan], close[:-1]])
+        true_range = np.nanmax(np.vstack([high - low, np.abs(high - previous), np.abs(low - previous)]), axis=0)
+        atr = _ewm(true_range, 1 / self.period, state["atr"] if state else None)
+
+        seen = state["seen"] if state else 0
+        new_state = {"close": close[-1], "atr": atr[-1], "seen": seen + len(close)}
+        return {self.label: _warmup_mask(atr, seen, self.period)}, new_state
+
+
+INDICATORS = {cls.name: cls for cls in (SMA, EMA, RSI, MACD, BollingerBands, ATR, VWAP)}
+
+
+def parse_indicators(spec: Optional[str]) -> List[Indicator]:
+    """Parse ``"sma:50,rsi:14,macd:12:26:9"`` into indicator instances (defaults when params are omitted)"""
+    indicators = []
+    for item in (spec or DEFAULT_INDICATORS).split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        name, *params = item.split(":")
+        if name not in INDICATORS:
+            raise ValueError(f"Unknown indicator: {name}. Available: {', '.join(INDICATORS)}")
+        try:
+            indicator = INDICATORS[name](*(float(p) for p in params))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid parameters for {name}: {item}")
+        if any(p <= 0 for p in indicator.params):
+            raise ValueError(f"Indicator parameters must be positive: {item}")
+        indicators.append(indicator)
+    if not indicators:
+        raise ValueError("No indicators requested")
+    return indicators
+
+
+class IndicatorEngine:
+    """Computes indicators over stock_prices and keeps results cached per (symbol, indicator)
+
+    Register ``on_write`` with StockDatabase.add_write_listener. Bars appended
+    after a cached entry's last timestamp mark it for extension; the next
+    read only loads and processes those new bars, continuing from the saved
+    state. Each entry also keeps the state as of its next-to-last bar, so a
+    write that starts at the last cached bar (the update cycle re-upserts
+    it every pass) rewinds one bar and re-extends from there. Writes that
+    touch anything older drop the entry.
+    """
+
+    def __init__(self, db, max_entries: int = 512):
+        self.db = db
+        self.max_entries = max_entries
+        # (symbol, indicator key) -> {"frame", "state", "last", "prev_state", "prev_last", "stale", "rewind"}
+        self._cache: "OrderedDict[tuple, dict]" = OrderedDict()
+        # Bumped on every write so an entry computed from bars that raced a write is not stored
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.full_computes = 0
+        self.incremental_updates = 0
+        self.hits = 0
+
+    def on_write(self, table: str, ranges: dict):
+        if table != 'stock_prices':
+            return
+        with self._lock:
+            for symbol in ranges:
+                self._generations[symbol] = self._generations.get(symbol, 0) + 1
+            for key, entry in list(self._cache.items()):
+                if key[0] not in ranges:
+                    continue
+                first, _last = ranges[key[0]]
+                if entry["last"] is None or first > entry["last"]:
+                    entry["stale"] = True
+                elif first == entry["last"] and entry["prev_last"] is not None:
+                    entry["stale"] = entry["rewind"] = True
+                else:
+                    del self._cache[key]
+
+    @staticmethod
+    def _extend(indicator: Indicator, bars: pd.DataFrame, state: Optional[dict]):
+        """Run ``indicator`` over ``bars`` from ``state``; returns (columns, state before the last bar, final state)"""
+        head, prev_state = indicator.compute(bars.iloc[:-1], state)
+        tail, final_state = indicator.compute(bars.iloc[-1:], prev_state)
+        return {name: np.concatenate([head[name], values]) for name, values in tail.items()}, prev_state, final_state
+
+    @staticmethod
+    def _entry(frame: pd.DataFrame, new_bars: pd.DataFrame, prev_state, state, after) -> dict:
+        index = new_bars.index
+        return {"frame": frame, "state": state, "last": index[-1].to_pydatetime(),
+                "prev_state": prev_state, "prev_last": index[-2].to_pydatetime() if len(index) > 1 else after,
+                "stale": False, "rewind": False}
+
+    def _load_bars(self, symbols: List[str], since=None) -> Dict[str, pd.DataFrame]:
+        """Load bars for several symbols in one query, grouped per symbol"""
+        table = self.db.get_historic_arrow(symbols, start_date=since)
+        frame = table.to_pandas()
+        if since is not None:
+            frame = frame[frame['timestamp'] > since]
+        return {
+            symbol: group.set_index('timestamp')[['open', 'high', 'low', 'close', 'volume']]
+            for symbol, group in frame.groupby('symbol', sort=False)
+        }
+
+    def compute(self, symbols: List[str], indicators: List[Indicator]) -> Dict[str, pd.DataFrame]:
+        """Return a timestamp-indexed frame of indicator columns for each symbol that has bars"""
+        with self._lock:
+            entries = {(s, i.key): self._cache.get((s, i.key)) for s in symbols for i in indicators}
+            generations = {s: self._generations.get(s, 0) for s in symbols}
+
+        # Symbols with any missing entry get a full reload; stale ones only load their tail
+        full = [s for s in symbols if any(entries[(s, i.key)] is None for i in indicators)]
+        stale = {s: min(self._resume_point(entries[(s, i.key)])[2] for i in indicators)
+                 for s in symbols if s not in full and any(entries[(s, i.key)]["stale"] for i in indicators)}
+
+        bars = self._load_bars(full) if full else {}
+        for symbol, since in stale.items():
+            bars.update(self._load_bars([symbol], since))
+
+        results = {}
+        for symbol in symbols:
+            columns = []
+            for indicator in indicators:
+                key = (symbol, indicator.key)
+                entry = entries[key]
+                if entry is None:
+                    new_bars = bars.get(symbol)
+                    if new_bars is None or new_bars.empty:
+                        continue
+                    values, prev_state, state = self._extend(indicator, new_bars, None)
+                    entry = self._entry(pd.DataFrame(values, index=new_bars.index), new_bars, prev_state, state, None)
+                    self.full_computes += 1
+                elif entry["stale"]:
+                    frame, state, after = self._resume_point(entry)
+                    new_bars = bars.get(symbol)
+                    if new_bars is not None:
+                        new_bars = new_bars[new_bars.index > after]
+                    if new_bars is not None and not new_bars.empty:
+                        values, prev_state, state = self._extend(indicator, new_bars, state)
+                        frame = pd.concat([frame, pd.DataFrame(values, index=new_bars.index)])
+                        entry = self._entry(frame, new_bars, prev_state, state, after)
+                    else:
+                        entry = dict(entry, stale=False, rewind=False)
+                    self.incremental_updates += 1
+                else:
+                    self.hits += 1
+
+                with self._lock:
+                    # A write since the snapshot has already invalidated or stale-marked this entry
+                    if self._generations.get(symbol, 0) == generations[symbol]:
+                        self._cache[key] = entry
+                        self._cache.move_to_end(key)
+                        while len(self._cache) > self.max_entries:
+                            self._cache.popitem(last=False)
+                columns.append(entry["frame"])
+
+            if columns:
+                results[symbol] = pd.concat(columns, axis=1)
+        return results
+
+    @staticmethod
+    def _resume_point(entry: dict) -> tuple:
+        """(frame, state, timestamp) to extend a stale entry from; one bar back when the last bar was rewritten"""
+        if entry["rewind"]:
+            return entry["frame"].iloc[:-1], entry["prev_state"], entry["prev_last"]
+        return entry["frame"], entry["state"], entry["last"]
+
+    def get(self, symbol: str, indicators: List[Indicator], start_date=None, end_date=None) -> pd.DataFrame:
+        """Indicator frame for one symbol, sliced to an optional date range"""
+        frame = self.compute([symbol], indicators).get(symbol)
+        if frame is None:
+            return pd.DataFrame()
+        if start_date:
+            frame = frame[frame.index >= pd.to_datetime(start_date)]
+        if end_date:
+            frame = frame[frame.index <= pd.to_datetime(end_date)]
+        return frame
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "full_computes": self.full_computes,
+            "incremental_updates": self.incremental_updates,
+        }
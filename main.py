@@ -1,20 +1,54 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, BackgroundTasks, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Awaitable, Callable, Dict, Optional, List, Set
 import uvicorn
 from datetime import datetime
 import asyncio
+import json
+import logging
+import os
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from dotenv import load_dotenv
-from database import StockDatabase
-from data_fetcher import StockDataFetcher
+from database import AsyncStockDatabase, StockDatabase, parse_interval, parse_intraday_interval
+from data_fetcher import SEARCH_FAILED, AsyncStockDataFetcher
+from rate_limiter import Priority
+from singleflight import SingleFlight
+from symbol_resolver import SymbolResolver, normalize_alias
+from indicators import IndicatorEngine, parse_indicators
+from http_cache import ResponseCache, http_date, is_not_modified, make_etag
+from fanout import OVERFLOW_CONFLATE, OVERFLOW_POLICIES, ClientChannel, StreamSession
+from replay import MAX_REPLAY_BATCH, REPLAY_ORDERS, HistoryReplay, parse_speed
+from observability import (
+    BACKGROUND_CYCLE,
+    PROMETHEUS_CONTENT_TYPE,
+    REGISTRY,
+    MetricsMiddleware,
+    configure_logging,
+    gauge,
+)
+from responses import (
+    FORMAT_MEDIA_TYPES,
+    encode_arrow_table,
+    indicators_json,
+    iter_history_json,
+    iter_multi_history_json,
+    negotiate_format,
+)
 
 
 # Load environment variables
 load_dotenv()
+configure_logging()
+logger = logging.getLogger("ohlcv.api")
 
-from database import StockDatabase
-from data_fetcher import StockDataFetcher
+from database import AsyncStockDatabase, StockDatabase
+from data_fetcher import AsyncStockDataFetcher
 
 app = FastAPI(title="Stock Market API", description="API for fetching stock prices and historic data", version="1.0.0")
 
@@ -26,155 +60,385 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Initialize components
-db = StockDatabase()
-fetcher = StockDataFetcher()
+db = AsyncStockDatabase(
+    StockDatabase(archive_path=os.getenv("ARCHIVE_PATH", "stock_archive")),
+    read_workers=int(os.getenv("DB_READ_WORKERS", "4")),
+    write_workers=int(os.getenv("DB_WRITE_WORKERS", "1")),
+    read_timeout=float(os.getenv("DB_READ_TIMEOUT", "30")),
+    write_timeout=float(os.getenv("DB_WRITE_TIMEOUT", "120"))
+)
+fetcher = AsyncStockDataFetcher()
+# Coalesces concurrent cache misses into a single upstream fetch + insert
+flights = SingleFlight()
+# User input -> canonical symbol, backed by the symbol_aliases table
+symbol_resolver = SymbolResolver(negative_ttl=float(os.getenv("SYMBOL_NEGATIVE_TTL", "3600")))
+# Cached indicator series, extended in place when new bars are appended
+indicator_engine = IndicatorEngine(db.db, max_entries=int(os.getenv("INDICATOR_CACHE_SIZE", "512")))
+db.db.add_write_listener(indicator_engine.on_write)
+# Encoded history/indicator bodies plus per-symbol data versions for ETag / 304 handling
+response_cache = ResponseCache(max_bytes=int(os.getenv("RESPONSE_CACHE_MB", "64")) * 1024 * 1024)
+db.db.add_write_listener(response_cache.on_write)
 
 
 # ----------------------------
 # 📡 WebSocket Manager
 # ----------------------------
 class ConnectionManager:
-    def __init__(self):
-        # key = symbol, value = list of websocket connections
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+    """Tracks WebSocket subscribers per symbol and runs one live-price producer per symbol
+
+    However many clients watch a symbol, a single producer task polls
+    upstream for it and fans each tick out to every subscriber. The
+    producer starts with the first subscriber and stops with the last.
+    A subscriber is either a ClientChannel (one socket per symbol) or a
+    StreamSession (one /ws/stream socket that subscribes to many symbols).
+    Both take ticks through ``deliver`` without blocking, so a slow client
+    only ever delays itself.
+    """
+
+    def __init__(self, tick_source: Callable[[str], Awaitable[dict]], poll_interval: float = 10.0,
+                 max_queue: int = 64, overflow_policy: str = OVERFLOW_CONFLATE, send_timeout: float = 10.0,
+                 max_stream_symbols: int = 200):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}. Use one of: {', '.join(OVERFLOW_POLICIES)}")
+        # key = symbol, value = {websocket: its ClientChannel or StreamSession}
+        self.active_connections: Dict[str, Dict[WebSocket, object]] = {}
+        # key = symbol, value = the producer task polling it
+        self.producers: Dict[str, asyncio.Task] = {}
+        # Last payload per symbol so new subscribers don't wait a full interval
+        self.last_ticks: Dict[str, dict] = {}
+        self.streams: Set[StreamSession] = set()
+        self.tick_source = tick_source
+        self.poll_interval = poll_interval
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.send_timeout = send_timeout
+        self.max_stream_symbols = max_stream_symbols
+        self.forced_disconnects = 0
+
+    def attach(self, websocket: WebSocket, symbol: str, subscriber):
+        """Register a subscriber for a symbol and make sure the symbol has a producer"""
+        self.active_connections.setdefault(symbol, {})[websocket] = subscriber
+        if symbol in self.last_ticks:
+            payload = self.last_ticks[symbol]
+            subscriber.deliver(symbol, payload, json.dumps(payload, separators=(',', ':')))
+        if symbol not in self.producers:
+            self.producers[symbol] = asyncio.create_task(self._produce(symbol))
+            logger.info("▶️ Started live producer for %s | Producers: %s", symbol, len(self.producers))
+
+    def detach(self, websocket: WebSocket, symbol: str):
+        """Unregister a socket from a symbol, stopping the producer with its last subscriber"""
+        connections = self.active_connections.get(symbol)
+        subscriber = connections.pop(websocket, None) if connections else None
+        if connections is not None and not connections:
+            del self.active_connections[symbol]
+        if symbol not in self.active_connections:
+            self._stop_producer(symbol)
+        return subscriber
 
-    async def connect(self, websocket: WebSocket, symbol: str):
+    async def subscribe(self, websocket: WebSocket, symbol: str):
+        """Accept a single-symbol live-price socket and attach its outbound channel"""
         await websocket.accept()
-        if symbol not in self.active_connections:
-            self.active_connections[symbol] = []
-        self.active_connections[symbol].append(websocket)
-        print(f"🔌 Client connected for {symbol} | Total: {len(self.active_connections[symbol])}")
+        channel = ClientChannel(
+            websocket,
+            max_queue=self.max_queue,
+            policy=self.overflow_policy,
+            send_timeout=self.send_timeout,
+            on_close=lambda ch: self._channel_closed(ch, symbol)
+        )
+        channel.start()
+        self.attach(websocket, symbol, channel)
+        logger.debug("🔌 Client connected for %s | Total: %s", symbol, len(self.active_connections[symbol]))
 
     def disconnect(self, websocket: WebSocket, symbol: str):
-        if symbol in self.active_connections:
-            self.active_connections[symbol].remove(websocket)
-            if not self.active_connections[symbol]:
-                del self.active_connections[symbol]
-        print(f"❌ Client disconnected from {symbol}")
-
-    async def broadcast(self, symbol: str, message: dict):
-        if symbol in self.active_connections:
-            for connection in list(self.active_connections[symbol]):
+        channel = self.detach(websocket, symbol)
+        if channel is not None:
+            channel.close()
+            logger.debug("❌ Client disconnected from %s", symbol)
+
+    def _channel_closed(self, channel: ClientChannel, symbol: str):
+        """Channel closed itself (overflow or failed send): drop it from the subscriber map"""
+        connections = self.active_connections.get(symbol)
+        if connections and connections.get(channel.websocket) is channel:
+            self.forced_disconnects += 1
+            self.disconnect(channel.websocket, symbol)
+
+    async def open_stream(self, websocket: WebSocket, encoding: str = "json", deltas: bool = False,
+                          flush_interval: float = 0.05) -> StreamSession:
+        """Accept a multiplexed /ws/stream socket; symbols are added with stream_subscribe"""
+        session = StreamSession(
+            websocket,
+            encoding=encoding,
+            deltas=deltas,
+            flush_interval=flush_interval,
+            send_timeout=self.send_timeout,
+            on_close=self._stream_closed
+        )
+        await websocket.accept()
+        session.start()
+        self.streams.add(session)
+        logger.debug("🔌 Stream client connected | Streams: %s", len(self.streams))
+        return session
+
+    def stream_subscribe(self, session: StreamSession, symbols: List[str]) -> List[str]:
+        """Attach a stream to more symbols; returns the symbols that were newly added"""
+        added = [s for s in dict.fromkeys(symbols) if s not in session.symbols]
+        if len(session.symbols) + len(added) > self.max_stream_symbols:
+            raise ValueError(f"At most {self.max_stream_symbols} symbols per stream")
+        session.symbols.update(added)
+        for symbol in added:
+            self.attach(session.websocket, symbol, session)
+        return added
+
+    def stream_unsubscribe(self, session: StreamSession, symbols: List[str]) -> List[str]:
+        """Detach a stream from symbols; returns the symbols that were removed"""
+        removed = [s for s in dict.fromkeys(symbols) if s in session.symbols]
+        for symbol in removed:
+            self.detach(session.websocket, symbol)
+        session.forget(removed)
+        return removed
+
+    def _stream_closed(self, session: StreamSession):
+        if session in self.streams:
+            self.streams.discard(session)
+            self.stream_unsubscribe(session, list(session.symbols))
+            logger.debug("❌ Stream client disconnected | Streams: %s", len(self.streams))
+
+    def _stop_producer(self, symbol: str):
+        task = self.producers.pop(symbol, None)
+        if task is not None:
+            task.cancel()
+            self.last_ticks.pop(symbol, None)
+            logger.info("⏹️ Stopped live producer for %s | Producers: %s", symbol, len(self.producers))
+
+    async def _produce(self, symbol: str):
+        """Poll upstream once per interval for as long as the symbol has subscribers"""
+        try:
+            while symbol in self.active_connections:
                 try:
-                    await connection.send_json(message)
+                    payload = await self.tick_source(symbol)
                 except Exception as e:
-                    print(f"⚠️ Error sending to client ({symbol}): {e}")
-                    self.disconnect(connection, symbol)
+                    logger.warning("⚠️ Live producer error for %s: %s", symbol, e)
+                    payload = {"error": f"No data for {symbol}"}
 
+                if "error" not in payload:
+                    self.last_ticks[symbol] = payload
+                self.broadcast(symbol, payload)
 
-manager = ConnectionManager()
+                # send every poll_interval seconds (tweak as needed)
+                await asyncio.sleep(self.poll_interval)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if self.producers.get(symbol) is asyncio.current_task():
+                del self.producers[symbol]
+
+    def broadcast(self, symbol: str, message: dict):
+        """Serialize ``message`` once and hand it to every subscriber of the symbol"""
+        text = json.dumps(message, separators=(',', ':'))
+        for subscriber in list(self.active_connections.get(symbol, {}).values()):
+            subscriber.deliver(symbol, message, text)
+
+    def _subscribers(self) -> list:
+        unique = {id(s): s for connections in self.active_connections.values() for s in connections.values()}
+        return list(unique.values()) + [s for s in self.streams if id(s) not in unique]
+
+    def stats(self) -> dict:
+        subscribers = self._subscribers()
+        return {
+            "symbols": len(self.active_connections),
+            "clients": len(subscribers),
+            "streams": len(self.streams),
+            "producers": len(self.producers),
+            "overflow_policy": self.overflow_policy,
+            "queued": sum(s.pending() for s in subscribers),
+            "dropped": sum(getattr(s, "dropped", 0) for s in subscribers),
+            "conflated": sum(getattr(s, "conflated", 0) for s in subscribers),
+            "forced_disconnects": self.forced_disconnects
+        }
+
+    async def shutdown(self):
+        """Cancel every producer task and close every subscriber"""
+        tasks = list(self.producers.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.producers.clear()
+        subscribers = self._subscribers()
+        self.active_connections.clear()
+        self.streams.clear()
+        for subscriber in subscribers:
+            subscriber.close()
+        await asyncio.gather(*(s.wait_closed() for s in subscribers), return_exceptions=True)
+
+
+async def fetch_live_tick(symbol: str) -> dict:
+    """Fetch one live-price tick in the WebSocket payload format"""
+    live_data = await fetcher.get_live_price(symbol, priority=Priority.REALTIME)
+    if not live_data:
+        return {"error": f"No data for {symbol}"}
+    return {
+        "symbol": symbol,
+        "price": live_data["price"],
+        "change_percent": live_data["change_percent"],
+        "volume": live_data["volume"],
+        "last_updated": live_data["last_updated"].isoformat()
+    }
+
+
+manager = ConnectionManager(
+    fetch_live_tick,
+    poll_interval=float(os.getenv("WS_POLL_INTERVAL", "10")),
+    max_queue=int(os.getenv("WS_QUEUE_SIZE", "64")),
+    overflow_policy=os.getenv("WS_OVERFLOW_POLICY", OVERFLOW_CONFLATE),
+    send_timeout=float(os.getenv("WS_SEND_TIMEOUT", "10")),
+    max_stream_symbols=int(os.getenv("WS_STREAM_MAX_SYMBOLS", "200"))
+)
 
 # ----------------------------
 # 📡 WebSocket Endpoint
 # ----------------------------
 @app.websocket("/ws/stocks/{symbol}")
-
 async def websocket_stock_data(websocket: WebSocket, symbol: str):
-    await manager.connect(websocket, symbol)
+    await manager.subscribe(websocket, symbol)
 
     try:
+        # Ticks are pushed by the shared producer; just hold the socket open
         while True:
-            # Fetch latest live price
-            live_data = fetcher.get_live_price(symbol)
+            await websocket.receive_text()
 
-            if live_data:
-                payload = {
-                    "symbol": symbol,
-                    "price": live_data["price"],
-                    "change_percent": live_data["change_percent"],
-                    "volume": live_data["volume"],
-                    "last_updated": live_data["last_updated"].isoformat()
-                }
-                await manager.broadcast(symbol, payload)
-            else:
-                await manager.broadcast(symbol, {"error": f"No data for {symbol}"})
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: the channel already closed a slow client's socket
+        pass
+    finally:
+        manager.disconnect(websocket, symbol)
 
-            # send every 10 seconds (tweak as needed)
-            await asyncio.sleep(10)
 
-    except WebSocketDisconnect:
-        manager.disconnect(websocket, symbol)@app.websocket("/ws/stocks/{symbol}")
-async def websocket_stock_data(websocket: WebSocket, symbol: str):
-    await manager.connect(websocket, symbol)
+@app.websocket("/ws/stream")
+async def websocket_stream(
+    websocket: WebSocket,
+    encoding: str = "json",
+    deltas: bool = False,
+    flush_ms: int = 50
+):
+    """Multiplexed live prices: one socket, many symbols
+
+    Client messages: ``{"action": "subscribe" | "unsubscribe", "symbols": [...]}``
+    (JSON text, or MessagePack bytes). Server frames:
+    ``{"type": "ticks", "data": {symbol: tick}}`` plus ``subscribed``,
+    ``unsubscribed`` and ``error`` replies. With ``deltas=true`` a tick only
+    carries the fields that changed; ``encoding=msgpack`` sends binary frames.
+    """
+    try:
+        session = await manager.open_stream(websocket, encoding, deltas, max(flush_ms, 0) / 1000)
+    except ValueError as e:
+        await websocket.accept()
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close(code=1008)
+        return
 
     try:
         while True:
-            # Fetch latest live price
-            live_data = fetcher.get_live_price(symbol)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
 
-            if live_data:
-                payload = {
-                    "symbol": symbol,
-                    "price": live_data["price"],
-                    "change_percent": live_data["change_percent"],
-                    "volume": live_data["volume"],
-                    "last_updated": live_data["last_updated"].isoformat()
-                }
-                await manager.broadcast(symbol, payload)
-            else:
-                await manager.broadcast(symbol, {"error": f"No data for {symbol}"})
-
-            # send every 10 seconds (tweak as needed)
-            await asyncio.sleep(10)
+            try:
+                request = session.decode(message)
+                action = request.get("action")
+                symbols = request.get("symbols") or []
+                if isinstance(symbols, str):
+                    symbols = symbols.split(",")
+                symbols = [str(s).strip() for s in symbols if str(s).strip()]
+
+                if action == "subscribe":
+                    added = manager.stream_subscribe(session, symbols)
+                    session.reply({"type": "subscribed", "symbols": added, "active": sorted(session.symbols)})
+                elif action == "unsubscribe":
+                    removed = manager.stream_unsubscribe(session, symbols)
+                    session.reply({"type": "unsubscribed", "symbols": removed, "active": sorted(session.symbols)})
+                else:
+                    raise ValueError("action must be 'subscribe' or 'unsubscribe'")
+            except Exception as e:
+                session.reply({"type": "error", "error": str(e)})
 
-    except WebSocketDisconnect:
-        manager.disconnect(websocket, symbol)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        session.close()
 
 
 @app.websocket("/ws/stocks/{symbol}/history")
-async def websocket_stock_history(websocket: WebSocket, symbol: str):
-    await manager.connect(websocket, symbol)
+async def websocket_stock_history(
+    websocket: WebSocket,
+    symbol: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+    batch: int = 1,
+    speed: Optional[str] = None,
+    credit: Optional[int] = None,
+    order: str = "desc"
+):
+    """Replay stored bars to this client only (see HistoryReplay for batch, speed, credit and cursor)
+
+    Bars go out newest first by default; ``order=asc`` replays them oldest first.
+    """
+    await websocket.accept()
 
     try:
-        # Use the same logic as your REST route without calling TestClient
-        df = db.get_historic_data(symbol)
-        if df.empty:
-            historic_data = fetcher.get_historic_data(symbol)
-            if historic_data is None or historic_data.empty:
-                corrected_symbol = fetcher.search_symbol(symbol)
-                if corrected_symbol and corrected_symbol != symbol:
-                    historic_data = fetcher.get_historic_data(corrected_symbol)
-                    symbol = corrected_symbol
-            if historic_data is not None and not historic_data.empty:
-                db.insert_historic_data(symbol, historic_data)
-                df = db.get_historic_data(symbol)
-
-        if df.empty:
+        if order not in REPLAY_ORDERS:
+            raise ValueError(f"order must be one of: {', '.join(REPLAY_ORDERS)}")
+        replay_speed = parse_speed(speed)
+        if not 1 <= batch <= MAX_REPLAY_BATCH:
+            raise ValueError(f"batch must be between 1 and {MAX_REPLAY_BATCH}")
+        if credit is not None and credit < 1:
+            raise ValueError("credit must be positive")
+        resume_after = pd.to_datetime(cursor) if cursor else None
+    except ValueError as e:
+        await websocket.send_json({"error": str(e)})
+        await websocket.close(code=1008)
+        return
+
+    try:
+        load_from = pd.to_datetime(start_date) if start_date else None
+        if order == "asc" and resume_after is not None and (load_from is None or resume_after > load_from):
+            load_from = resume_after
+        table = await db.get_historic_arrow([symbol], load_from, end_date)
+        if table.num_rows == 0 and resume_after is None:
+            stored_symbol = await fetch_and_store_history(symbol, start_date, end_date)
+            if stored_symbol:
+                symbol = stored_symbol
+                table = await db.get_historic_arrow([symbol], load_from, end_date)
+
+        if resume_after is not None:
+            # Resume strictly after the cursor bar the client already has, in replay order
+            resume_at = pa.scalar(resume_after.to_pydatetime(), table.schema.field('timestamp').type)
+            past_cursor = pc.greater if order == "asc" else pc.less
+            table = table.filter(past_cursor(table.column('timestamp'), resume_at))
+        if order == "desc":
+            table = table.sort_by([("timestamp", "descending")])
+
+        if table.num_rows == 0 and resume_after is None:
             await websocket.send_json({"error": f"No historical data for {symbol}"})
+            await websocket.close()
             return
 
-        # Stream the historical data
-        for index, row in df.iloc[::-1].iterrows():
-            timestamp = index.isoformat() if hasattr(index, "isoformat") else str(index)
-            payload = {
-                "symbol": symbol,
-                "timestamp": timestamp,
-                "open": float(row["open_price"]),
-                "high": float(row["high_price"]),
-                "low": float(row["low_price"]),
-                "close": float(row["close_price"]),
-                "volume": int(row["volume"])
-            }
-            await manager.broadcast(symbol, payload)
-            await asyncio.sleep(0.5)
-
-        await manager.broadcast(symbol, {"info": "history_end"})
-
-        # Keep connection alive
-        while True:
-            await asyncio.sleep(30)
+        replay = HistoryReplay(websocket, symbol, table, batch_size=batch, speed=replay_speed, credit=credit)
+        await replay.run()
+        await websocket.close()
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket, symbol)
+        pass
     except Exception as e:
-        print(f"⚠️ WebSocket error for {symbol}: {e}")
+        logger.warning("⚠️ WebSocket error for %s: %s", symbol, e)
         try:
             await websocket.send_json({"error": f"server_error: {str(e)}"})
+            await websocket.close(code=1011)
         except Exception:
             pass
-        manager.disconnect(websocket, symbol)
 
 
 # Pydantic models
@@ -194,179 +458,335 @@ class HistoricDataResponse(BaseModel):
     symbol: str
     data: List[dict]
 
+# Using symbols that are more likely to be available on Alpha Vantage
+POPULAR_SYMBOLS = ["IBM", "AAPL", "MSFT", "GOOGL"]
+
+# Largest gap (calendar days) that outputsize=compact's 100 trading days still covers
+COMPACT_MAX_GAP_DAYS = 130
+
 # Background task for updating popular stock prices
 async def update_popular_stocks():
     """Background task to update prices for popular stocks with logging and backfill"""
-    # Using symbols that are more likely to be available on Alpha Vantage
-    popular_symbols = ["IBM", "AAPL", "MSFT", "GOOGL"]
+    logger.info("🚀 Starting background task for %s popular stocks: %s", len(POPULAR_SYMBOLS), ', '.join(POPULAR_SYMBOLS))
+
+    while True:
+        try:
+            await run_update_cycle(POPULAR_SYMBOLS)
+            logger.debug("⏰ Next cycle in 5 minutes...")
+        except Exception as e:
+            logger.error("💥 Critical error in update cycle: %s", e)
+
+        # Wait for 5 minutes before next update cycle
+        await asyncio.sleep(300)
 
-    print(f"🚀 Starting background task for {len(popular_symbols)} popular stocks: {', '.join(popular_symbols)}")
+# stock_prices is re-clustered when an average symbol's bars span more row groups than this
+CLUSTER_MAX_ROW_GROUPS = float(os.getenv("CLUSTER_MAX_ROW_GROUPS_PER_SYMBOL", "2"))
+STORAGE_CHECK_HOURS = float(os.getenv("STORAGE_CHECK_HOURS", "24"))
 
+async def maintain_storage():
+    """Background task: rewrite stock_prices sorted by (symbol, timestamp) once appends have scattered it"""
     while True:
-        cycle_start = datetime.now()
-        print(f"📊 Starting update cycle at {cycle_start.strftime('%H:%M:%S')}")
+        await asyncio.sleep(STORAGE_CHECK_HOURS * 3600)
+        try:
+            report = await db.storage_report()
+            layout = report['stock_prices']
+            if layout['primary_key'] or layout['row_groups_per_symbol'] > CLUSTER_MAX_ROW_GROUPS:
+                # Readers keep going during the rewrite; writers wait for it, so allow it to run long
+                await db.cluster_prices(timeout=3600)
+            else:
+                logger.debug("🧹 stock_prices still clustered (%s row groups per symbol)",
+                             layout['row_groups_per_symbol'])
+        except Exception as e:
+            logger.error("💥 Storage maintenance failed: %s", e)
 
-        updated_count = 0
-        backfill_count = 0
+async def run_update_cycle(symbols: List[str]) -> dict:
+    """Run one refresh + backfill pass over ``symbols`` and return its counts and duration"""
+    cycle_start = datetime.now()
+    logger.info("📊 Starting update cycle at %s", cycle_start.strftime('%H:%M:%S'))
 
+    updated_count = 0
+    backfill_count = 0
+
+    for symbol in symbols:
         try:
-            for symbol in popular_symbols:
+            # Check if we need backfill (no data for today) from the ingestion watermark
+            today = datetime.now().date()
+            watermark = await db.get_watermark(symbol)
+
+            needs_backfill = False
+            outputsize = "compact"
+            if watermark is None:
+                needs_backfill = True
+                outputsize = "full"
+                logger.debug("📈 %s: No historical data found, will backfill", symbol)
+            elif watermark.date() != today:
+                needs_backfill = True
+                gap_days = (today - watermark.date()).days
+                # compact only covers the latest 100 trading days
+                if gap_days > COMPACT_MAX_GAP_DAYS:
+                    outputsize = "full"
+                logger.debug("📈 %s: Missing today's data (latest: %s, gap: %sd), will backfill (%s)", symbol, watermark.date(), gap_days, outputsize)
+
+            # Always try to fetch latest price data
+            live_data = await fetcher.get_live_price(symbol, priority=Priority.BACKGROUND)
+            if live_data:
+                await db.update_latest_price(
+                    live_data['symbol'],
+                    live_data['price'],
+                    live_data['change_percent'],
+                    live_data['volume']
+                )
+                logger.debug("✅ %s: Updated price to ₹%.2f (%+.2f%%)", symbol, live_data['price'], live_data['change_percent'])
+                updated_count += 1
+            else:
+                logger.warning("❌ %s: Failed to fetch live price", symbol)
+
+            # Backfill historical data if needed
+            if needs_backfill:
                 try:
-                    # Check if we need backfill (no data for today)
-                    today = datetime.now().date()
-                    existing_data = db.get_historic_data(symbol)
-
-                    needs_backfill = False
-                    if existing_data is None or existing_data.empty:
-                        needs_backfill = True
-                        print(f"📈 {symbol}: No historical data found, will backfill")
-                    else:
-                        try:
-                            # Check if we have today's data
-                            if len(existing_data) > 0 and hasattr(existing_data.index, 'max'):
-                                latest_timestamp = existing_data.index.max()
-                                if hasattr(latest_timestamp, 'date'):
-                                    latest_date = latest_timestamp.date()
-                                    if latest_date != today:
-                                        needs_backfill = True
-                                        print(f"📈 {symbol}: Missing today's data (latest: {latest_date}), will backfill")
-                                else:
-                                    # Handle case where index contains non-datetime values
-                                    needs_backfill = True
-                                    print(f"📈 {symbol}: Index format issue, will backfill")
-                            else:
-                                needs_backfill = True
-                                print(f"📈 {symbol}: Empty or invalid data, will backfill")
-                        except Exception as date_error:
-                            print(f"⚠️ {symbol}: Error checking dates ({date_error}), will backfill")
-                            needs_backfill = True
-
-                    # Always try to fetch latest price data
-                    live_data = fetcher.get_live_price(symbol)
-                    if live_data:
-                        db.update_latest_price(
-                            live_data['symbol'],
-                            live_data['price'],
-                            live_data['change_percent'],
-                            live_data['volume']
-                        )
-                        print(f"✅ {symbol}: Updated price to ₹{live_data['price']:.2f} ({live_data['change_percent']:+.2f}%)")
-                        updated_count += 1
+                    recent_data = await fetcher.get_historic_data(symbol, outputsize, priority=Priority.BACKGROUND)
+                    if recent_data is not None and not recent_data.empty:
+                        # Only the tail from the watermark on is new; the watermark bar itself is
+                        # rewritten in case it was stored mid-session as a partial bar. Cached
+                        # indicators rewind one bar for this instead of recomputing (IndicatorEngine.on_write)
+                        if watermark is not None:
+                            recent_data = recent_data[recent_data.index >= watermark]
+                        if not recent_data.empty:
+                            await db.insert_historic_data(symbol, recent_data)
+                            backfill_count += 1
+                        logger.debug("📊 %s: Backfilled %s historical records", symbol, len(recent_data))
                     else:
-                        print(f"❌ {symbol}: Failed to fetch live price")
-
-                    # Backfill historical data if needed
-                    if needs_backfill:
-                        try:
-                            # Fetch last 7 days to ensure we have recent data
-                            recent_data = fetcher.get_historic_data(symbol, "1y")  # Get 1 year of data
-                            if recent_data is not None and not recent_data.empty:
-                                db.insert_historic_data(symbol, recent_data)
-                                new_records = len(recent_data)
-                                print(f"📊 {symbol}: Backfilled {new_records} historical records")
-                                backfill_count += 1
-                            else:
-                                print(f"⚠️  {symbol}: No historical data available for backfill")
-                        except Exception as backfill_error:
-                            print(f"❌ {symbol}: Backfill failed - {backfill_error}")
-
-                except Exception as symbol_error:
-                    print(f"❌ {symbol}: Error processing - {symbol_error}")
-
-                # Small delay between symbols to respect API rate limits
-                await asyncio.sleep(1)
-
-            cycle_end = datetime.now()
-            duration = (cycle_end - cycle_start).total_seconds()
-
-            print(f"📊 Cycle completed in {duration:.1f}s")
-            print(f"✅ Updated {updated_count}/{len(popular_symbols)} prices")
-            print(f"📈 Backfilled {backfill_count}/{len(popular_symbols)} symbols")
-            print(f"⏰ Next cycle in 5 minutes...")
+                        logger.warning("⚠️  %s: No historical data available for backfill", symbol)
+                except Exception as backfill_error:
+                    logger.warning("❌ %s: Backfill failed - %s", symbol, backfill_error)
 
-        except Exception as e:
-            print(f"💥 Critical error in update cycle: {e}")
+        except Exception as symbol_error:
+            logger.warning("❌ %s: Error processing - %s", symbol, symbol_error)
 
-        # Wait for 5 minutes before next update cycle
-        await asyncio.sleep(300)
+        # No fixed delay here: fetcher.scheduler paces background calls
+
+    duration = (datetime.now() - cycle_start).total_seconds()
+    BACKGROUND_CYCLE.observe(duration)
+
+    logger.info("📊 Cycle completed in %.1fs", duration)
+    logger.info("✅ Updated %s/%s prices", updated_count, len(symbols))
+    logger.info("📈 Backfilled %s/%s symbols", backfill_count, len(symbols))
+    return {"updated": updated_count, "backfilled": backfill_count, "seconds": duration}
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize the database with historic data on startup"""
-    print("🚀 Starting Stock Market API...")
-    print("📊 Data Source: Alpha Vantage API")
-    print("🗄️  Database: stock_data.duckdb")
+    logger.info("🚀 Starting Stock Market API...")
+    logger.info("📊 Data Source: Alpha Vantage API")
+    logger.info("🗄️  Database: stock_data.duckdb")
 
     try:
+        # Warm the symbol alias map from DuckDB, plus an optional local listing file
+        loaded = symbol_resolver.load(await db.get_symbol_aliases())
+        logger.info("🔤 Loaded %s symbol aliases", loaded)
+        listing_file = os.getenv("SYMBOL_LISTING_FILE")
+        if listing_file:
+            rows = symbol_resolver.load_listing(listing_file)
+            await db.upsert_symbol_aliases(rows)
+            logger.info("🔤 Preloaded %s symbol aliases from %s", len(rows), listing_file)
+
         # Load historic data for IBM (reliable test symbol)
-        print("📈 Loading initial historical data for IBM...")
-        historic_data = fetcher.get_historic_data("IBM", period="2y")
+        logger.info("📈 Loading initial historical data for IBM...")
+        historic_data = await fetcher.get_historic_data("IBM", period="2y", priority=Priority.BACKGROUND)
         if historic_data is not None:
-            db.insert_historic_data("IBM", historic_data)
+            await db.insert_historic_data("IBM", historic_data)
             records_count = len(historic_data)
-            print(f"✅ Loaded {records_count} historical records for IBM")
+            logger.info("✅ Loaded %s historical records for IBM", records_count)
         else:
-            print("⚠️  Failed to load initial IBM data (will be fetched on-demand)")
+            logger.warning("⚠️  Failed to load initial IBM data (will be fetched on-demand)")
 
-        print("🔄 Starting background task for popular stocks...")
+        logger.info("🔄 Starting background task for popular stocks...")
         # Start background task for popular stock updates
         asyncio.create_task(update_popular_stocks())
+        asyncio.create_task(maintain_storage())
 
-        print("🎯 API ready! Endpoints available:")
-        print("   GET  /                    - API info")
-        print("   GET  /stocks/{symbol}     - Latest price")
-        print("   GET  /stocks/{symbol}/history - Historical data")
-        print("   GET  /market/status       - Market status")
-        print("   GET  /system/status       - System status")
-        print("   GET  /stocks              - Available stocks")
+        logger.info("🎯 API ready! Endpoints available:")
+        logger.info("   GET  /                    - API info")
+        logger.info("   GET  /stocks/{symbol}     - Latest price")
+        logger.info("   GET  /stocks/{symbol}/history - Historical data")
+        logger.info("   GET  /market/status       - Market status")
+        logger.info("   GET  /system/status       - System status")
+        logger.info("   GET  /stocks              - Available stocks")
 
     except Exception as e:
-        print(f"💥 Error during startup: {e}")
-        print("⚠️  API may still work but background tasks might be limited")
+        logger.error("💥 Error during startup: %s", e)
+        logger.warning("⚠️  API may still work but background tasks might be limited")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release long-lived resources when the server stops"""
+    logger.info("🛑 Shutting down Stock Market API...")
+    await manager.shutdown()
+    await fetcher.aclose()
+    db.close()
+    logger.info("🗄️  Database connections closed")
 
 @app.get("/")
 async def root():
     """Root endpoint"""
     return {"message": "Stock Market API", "version": "1.0.0"}
 
-@app.get("/stocks/{symbol}", response_model=StockResponse)
-async def get_stock_price(symbol: str):
-    """Get the latest price for a stock symbol"""
+# Upper bound on symbols per batch request
+BATCH_MAX_SYMBOLS = int(os.getenv("BATCH_MAX_SYMBOLS", "100"))
+
+def parse_symbol_list(symbols: str) -> List[str]:
+    """Split a comma-separated symbols parameter, dropping blanks and duplicates"""
+    symbol_list = list(dict.fromkeys(s.strip() for s in symbols.split(",") if s.strip()))
+    if not symbol_list:
+        raise HTTPException(status_code=400, detail="At least one symbol is required")
+    if len(symbol_list) > BATCH_MAX_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_SYMBOLS} symbols per request")
+    return symbol_list
+
+@app.get("/stocks/history")
+async def get_multi_stock_history(
+    request: Request,
+    symbols: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    format: Optional[str] = None,
+    interval: Optional[str] = None
+):
+    """Get historic data for several comma-separated symbols in one query
+
+    Symbols with no stored bars are fetched upstream (and replaced by their
+    corrected symbol if the search found one).
+    """
     try:
-        # Try to get from database first
-        db_result = db.get_latest_price(symbol)
-        if db_result:
-            return StockResponse(**db_result)
+        fmt = negotiate_format(request.headers.get("accept"), format)
+    except ValueError as e:
+        raise HTTPException(status_code=406, detail=str(e))
 
-        # If not in DB, fetch live data
-        live_data = fetcher.get_live_price(symbol)
-        if live_data:
-            # Update database
-            db.update_latest_price(
-                live_data['symbol'],
-                live_data['price'],
-                live_data['change_percent'],
-                live_data['volume']
+    if interval:
+        try:
+            parse_interval(interval)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    symbol_list = parse_symbol_list(symbols)
+
+    async def load(syms: List[str]):
+        if interval:
+            return await db.get_resampled_arrow(syms, interval, start_date, end_date)
+        return await db.get_historic_arrow(syms, start_date, end_date)
+
+    try:
+        table = await load(symbol_list)
+
+        # Only symbols with no stored bars go upstream, concurrently and under the rate budget
+        found = set(table.column('symbol').to_pylist()) if table.num_rows else set()
+        missing = [s for s in symbol_list if s not in found]
+        if missing:
+            stored = await asyncio.gather(
+                *(fetch_and_store_history(s, start_date, end_date) for s in missing),
+                return_exceptions=True
             )
-            return StockResponse(**live_data)
+            corrected = {s: r for s, r in zip(missing, stored) if isinstance(r, str)}
+            if corrected:
+                symbol_list = list(dict.fromkeys(corrected.get(s, s) for s in symbol_list))
+                table = await load(symbol_list)
 
-        # If direct fetch failed, try symbol search for common mistakes
-        print(f"⚠️ Direct fetch failed for {symbol}, attempting symbol search...")
-        corrected_symbol = fetcher.search_symbol(symbol)
+        if fmt != "json":
+            return await binary_history_response(table, fmt)
+        return StreamingResponse(iter_multi_history_json(symbol_list, table), media_type="application/json")
 
-        if corrected_symbol and corrected_symbol != symbol:
-            print(f"🔄 Found corrected symbol: {corrected_symbol}")
-            # Try again with corrected symbol
-            live_data = fetcher.get_live_price(corrected_symbol)
-            if live_data:
-                # Update database with corrected symbol
-                db.update_latest_price(
-                    live_data['symbol'],
-                    live_data['price'],
-                    live_data['change_percent'],
-                    live_data['volume']
-                )
-                return StockResponse(**live_data)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database query timed out")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching historic data: {str(e)}")
+
+@app.get("/stocks/batch")
+async def get_batch_stock_prices(symbols: str):
+    """Get latest prices for several comma-separated symbols as ``{"quotes": {symbol: ...}, "not_found": [...]}``
+
+    Cached quotes are served first, the rest come from one latest_prices
+    query, and only symbols missing from both are fetched upstream,
+    concurrently and through the shared rate scheduler.
+    """
+    symbol_list = parse_symbol_list(symbols)
+
+    try:
+        quotes = {}
+        for symbol in symbol_list:
+            quote = fetcher.cache.get(symbol)
+            if quote is not None:
+                quotes[symbol] = quote
+
+        uncached = [s for s in symbol_list if s not in quotes]
+        if uncached:
+            stored = await db.get_latest_prices(uncached)
+            for symbol, quote in stored.items():
+                fetcher.cache.set(symbol, quote)
+            quotes.update(stored)
+
+        for symbol, quote in quotes.items():
+            if not fetcher.cache.is_fresh(quote):
+                schedule_quote_refresh(symbol)
+
+        missing = [s for s in symbol_list if s not in quotes]
+        if missing:
+            results = await asyncio.gather(
+                *(flights.do(("live_price", s), lambda s=s: fetch_and_store_live_price(s)) for s in missing),
+                return_exceptions=True
+            )
+            for symbol, result in zip(missing, results):
+                if isinstance(result, Exception):
+                    logger.warning("⚠️ Batch fetch failed for %s: %s", symbol, result)
+                elif result[0]:
+                    quotes[symbol] = result[0]
+
+        return {
+            "quotes": {
+                symbol: {
+                    "symbol": quotes[symbol]['symbol'],
+                    "price": quotes[symbol]['price'],
+                    "change_percent": quotes[symbol]['change_percent'],
+                    "volume": quotes[symbol]['volume'],
+                    "last_updated": quotes[symbol]['last_updated']
+                }
+                for symbol in symbol_list if symbol in quotes
+            },
+            "not_found": [s for s in symbol_list if s not in quotes]
+        }
+
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database query timed out")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching stock data: {str(e)}")
+
+@app.get("/stocks/{symbol}", response_model=StockResponse)
+async def get_stock_price(request: Request, response: Response, symbol: str):
+    """Get the latest price for a stock symbol
+
+    Responses carry an ETag and Last-Modified derived from the quote's
+    last_updated, and max-age is set to the quote's remaining freshness.
+    """
+    try:
+        # Hot symbols come straight from the in-process quote cache, then DuckDB
+        quote = fetcher.cache.get(symbol)
+        if quote is None:
+            quote = await db.get_latest_price(symbol)
+            if quote:
+                fetcher.cache.set(symbol, quote)
+
+        if quote:
+            # Serve stale quotes immediately and refresh them in the background
+            if not fetcher.cache.is_fresh(quote):
+                schedule_quote_refresh(symbol)
+            return quote_response(request, response, symbol, quote)
+
+        # If not in DB, fetch live data (once, however many requests are waiting on it)
+        live_data, corrected_symbol = await flights.do(
+            ("live_price", symbol),
+            lambda: fetch_and_store_live_price(symbol)
+        )
+        if live_data:
+            return quote_response(request, response, live_data['symbol'], live_data)
 
         # If still no data, provide helpful error message
         error_msg = f"Stock data not found for symbol: {symbol}"
@@ -377,77 +797,406 @@ async def get_stock_price(symbol: str):
 
         raise HTTPException(status_code=404, detail=error_msg)
 
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database query timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching stock data: {str(e)}")
 
+def quote_response(request: Request, response: Response, symbol: str, quote: dict):
+    """StockResponse with validators from last_updated; max-age is the quote's remaining freshness"""
+    last_updated = quote.get('last_updated')
+    if last_updated is not None:
+        age = (datetime.now() - last_updated).total_seconds()
+        headers = validator_headers(make_etag(symbol, last_updated, ("quote",)), last_updated,
+                                    f"max-age={max(int(fetcher.cache.ttl() - age), 0)}")
+        if is_not_modified(request.headers, headers["ETag"], last_updated):
+            return not_modified_response(headers)
+        response.headers.update(headers)
+    return StockResponse(**quote)
+
+# Strong references to in-flight background refreshes so they aren't garbage collected
+refresh_tasks = set()
+
+def schedule_quote_refresh(symbol: str):
+    """Refresh a stale quote in the background, at most one refresh per symbol at a time"""
+    task = asyncio.create_task(flights.do(("refresh_quote", symbol), lambda: refresh_quote(symbol)))
+    refresh_tasks.add(task)
+    task.add_done_callback(refresh_tasks.discard)
+
+async def refresh_quote(symbol: str):
+    """Fetch a fresh quote for a known symbol and store it (the fetcher updates the cache)"""
+    try:
+        live_data = await fetcher.get_live_price(symbol, priority=Priority.REALTIME)
+        if live_data:
+            await db.update_latest_price(
+                live_data['symbol'],
+                live_data['price'],
+                live_data['change_percent'],
+                live_data['volume']
+            )
+    except Exception as e:
+        logger.warning("⚠️ Background quote refresh failed for %s: %s", symbol, e)
+
+async def resolve_symbol(symbol: str) -> Optional[str]:
+    """Resolve user input to a canonical symbol via the alias cache, then upstream search
+
+    Upstream results (including "no match") are remembered in memory and in
+    symbol_aliases, so repeated lookups don't spend API quota.
+    """
+    known, resolved = symbol_resolver.lookup(symbol)
+    if known:
+        return resolved
+    return await flights.do(("search", normalize_alias(symbol)), lambda: _search_and_remember(symbol))
+
+async def _search_and_remember(symbol: str) -> Optional[str]:
+    resolved = await fetcher.search_symbol(symbol)
+    if resolved is SEARCH_FAILED:
+        # Rate limits and outages say nothing about the symbol; don't cache a negative result
+        return None
+    row = symbol_resolver.remember(symbol, resolved)
+    try:
+        await db.upsert_symbol_aliases([row])
+    except Exception as e:
+        logger.warning("⚠️ Could not persist symbol alias %s -> %s: %s", symbol, resolved, e)
+    return resolved
+
+async def fetch_and_store_live_price(symbol: str):
+    """Fetch a live quote upstream (falling back to symbol search) and store it
+
+    Returns ``(live_data, corrected_symbol)``; live_data is None when nothing was found.
+    """
+    live_data = None
+    corrected_symbol = None
+
+    known, alias_target = symbol_resolver.lookup(symbol)
+    if known and alias_target is None:
+        logger.debug("🚫 %s: cached as unresolvable, skipping upstream", symbol)
+        return None, None
+
+    if known and alias_target != symbol:
+        # Input is a known alias; skip the direct fetch that would fail anyway
+        corrected_symbol = alias_target
+    else:
+        live_data = await fetcher.get_live_price(symbol)
+        if not live_data:
+            # If direct fetch failed, try symbol search for common mistakes
+            logger.warning("⚠️ Direct fetch failed for %s, attempting symbol search...", symbol)
+            corrected_symbol = await resolve_symbol(symbol)
+
+    if not live_data and corrected_symbol and corrected_symbol != symbol:
+        logger.info("🔄 Found corrected symbol: %s", corrected_symbol)
+        # Try again with corrected symbol
+        live_data = await fetcher.get_live_price(corrected_symbol)
+
+    if live_data:
+        # Update database (with the corrected symbol if there was one)
+        await db.update_latest_price(
+            live_data['symbol'],
+            live_data['price'],
+            live_data['change_percent'],
+            live_data['volume']
+        )
+
+    return live_data, corrected_symbol
+
+async def fetch_and_store_history(symbol: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Optional[str]:
+    """Fetch missing history upstream and store it; returns the symbol it was stored under
+
+    Concurrent misses for the same (symbol, range) share one fetch and insert.
+    """
+    return await flights.do(
+        ("history", symbol, start_date, end_date),
+        lambda: _fetch_and_store_history(symbol, start_date, end_date)
+    )
+
+async def _fetch_historic_range(symbol: str, start_date: Optional[str], end_date: Optional[str]):
+    if start_date and end_date:
+        return await fetcher.get_historic_data_date_range(symbol, start_date, end_date)
+    return await fetcher.get_historic_data(symbol)
+
+async def _fetch_and_store_history(symbol: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Optional[str]:
+    historic_data = None
+    corrected_symbol = None
+
+    known, alias_target = symbol_resolver.lookup(symbol)
+    if known and alias_target is None:
+        logger.debug("🚫 %s: cached as unresolvable, skipping upstream", symbol)
+        return None
+
+    if known and alias_target != symbol:
+        # Input is a known alias; skip the direct fetch that would fail anyway
+        corrected_symbol = alias_target
+    else:
+        historic_data = await _fetch_historic_range(symbol, start_date, end_date)
+
+        # If direct fetch failed, try symbol search
+        if historic_data is None or historic_data.empty:
+            logger.warning("⚠️ Direct historical fetch failed for %s, attempting symbol search...", symbol)
+            corrected_symbol = await resolve_symbol(symbol)
+
+    if (historic_data is None or historic_data.empty) and corrected_symbol and corrected_symbol != symbol:
+        logger.info("🔄 Found corrected symbol for history: %s", corrected_symbol)
+        # Try again with corrected symbol
+        historic_data = await _fetch_historic_range(corrected_symbol, start_date, end_date)
+
+        # Update symbol for database operations
+        if historic_data is not None and not historic_data.empty:
+            symbol = corrected_symbol  # Use corrected symbol for DB operations
+
+    if historic_data is not None and not historic_data.empty:
+        await db.insert_historic_data(symbol, historic_data)
+        return symbol
+
+    return None
+
+async def history_version(symbol: str) -> Optional[datetime]:
+    """When a symbol's bars were last written (None if it has none); read from symbol_watermarks, then memory"""
+    known, version, generation = response_cache.cached_version(symbol)
+    if not known:
+        version = await db.get_last_ingested(symbol)
+        response_cache.remember_version(symbol, version, generation)
+    return version
+
+def validator_headers(etag: str, last_modified: datetime, cache_control: str = "no-cache") -> Dict[str, str]:
+    """Conditional-request headers; no-cache lets clients keep the body but revalidate every time"""
+    return {
+        "ETag": etag,
+        "Last-Modified": http_date(last_modified),
+        "Cache-Control": cache_control,
+        "Vary": "Accept"
+    }
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    response_cache.record_not_modified()
+    return Response(status_code=304, headers=headers)
+
+async def binary_history_response(table, fmt: str) -> Response:
+    """Return an Arrow IPC stream or Parquet body built straight from an Arrow table"""
+    # Encoding (especially Parquet compression) is CPU work, keep it off the event loop
+    body = await run_in_threadpool(encode_arrow_table, table, fmt)
+    return Response(content=body, media_type=FORMAT_MEDIA_TYPES[fmt])
+
 @app.get("/stocks/{symbol}/history", response_model=HistoricDataResponse)
 async def get_stock_history(
+    request: Request,
     symbol: str,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    format: Optional[str] = None,
+    interval: Optional[str] = None,
+    max_points: Optional[int] = None
 ):
-    """Get historic data for a stock symbol"""
+    """Get historic data for a stock symbol as JSON, Arrow IPC or Parquet
+
+    ``interval`` (e.g. 5d, 1w, 1mo, 1q) aggregates bars inside DuckDB;
+    ``max_points`` picks the smallest interval that keeps the series under
+    that many bars.
+    """
     try:
+        fmt = negotiate_format(request.headers.get("accept"), format)
+    except ValueError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+    try:
+        if interval:
+            parse_interval(interval)
+        if max_points is not None and max_points < 1:
+            raise ValueError("max_points must be positive")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def load(sym: str):
+        bucket = interval
+        if bucket is None and max_points:
+            bucket = await db.choose_interval(sym, max_points, start_date, end_date)
+        if fmt != "json":
+            if bucket:
+                return await db.get_resampled_arrow([sym], bucket, start_date, end_date)
+            return await db.get_historic_arrow([sym], start_date, end_date)
+        if bucket:
+            return await db.get_resampled_data(sym, bucket, start_date, end_date)
+        return await db.get_historic_data(sym, start_date, end_date)
+
+    try:
+        # Symbols we already hold can be answered from the validators or the response cache
+        variant = ("history", start_date, end_date, interval, max_points, fmt)
+        version = await history_version(symbol)
+        headers = None
+        if version is not None:
+            headers = validator_headers(make_etag(symbol, version, variant), version)
+            if is_not_modified(request.headers, headers["ETag"], version):
+                return not_modified_response(headers)
+            cached = response_cache.get(symbol, variant, version)
+            if cached is not None:
+                return Response(content=cached[0], media_type=cached[1], headers=headers)
+
         # Get data from database
-        df = db.get_historic_data(symbol, start_date, end_date)
+        result = await load(symbol)
 
-        if df.empty:
+        if len(result) == 0:
             # If no data in DB, try to fetch and store
-            if start_date and end_date:
-                historic_data = fetcher.get_historic_data_date_range(symbol, start_date, end_date)
-            else:
-                historic_data = fetcher.get_historic_data(symbol)
-
-            # If direct fetch failed, try symbol search
-            if historic_data is None or historic_data.empty:
-                print(f"⚠️ Direct historical fetch failed for {symbol}, attempting symbol search...")
-                corrected_symbol = fetcher.search_symbol(symbol)
-
-                if corrected_symbol and corrected_symbol != symbol:
-                    print(f"🔄 Found corrected symbol for history: {corrected_symbol}")
-                    # Try again with corrected symbol
-                    if start_date and end_date:
-                        historic_data = fetcher.get_historic_data_date_range(corrected_symbol, start_date, end_date)
-                    else:
-                        historic_data = fetcher.get_historic_data(corrected_symbol)
+            stored_symbol = await fetch_and_store_history(symbol, start_date, end_date)
+            if stored_symbol:
+                symbol = stored_symbol
+                result = await load(symbol)
+            # Any write invalidated the version read above
+            version = headers = None
+
+        if fmt != "json":
+            response = await binary_history_response(result, fmt)
+            if version is not None:
+                response_cache.set(symbol, variant, version, response.body, response.media_type)
+                response.headers.update(headers)
+            return response
+
+        # Serialize columns in bulk and stream the body in chunks
+        chunks = iter_history_json(symbol, result)
+        if version is not None:
+            chunks = response_cache.tee(symbol, variant, version, "application/json", chunks)
+        return StreamingResponse(chunks, media_type="application/json", headers=headers)
+
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database query timed out")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching historic data: {str(e)}")
 
-                    # Update symbol for database operations
-                    if historic_data is not None and not historic_data.empty:
-                        symbol = corrected_symbol  # Use corrected symbol for DB operations
+# Seconds before a symbol's stored intraday bars are topped up from upstream again
+INTRADAY_REFRESH_SECONDS = float(os.getenv("INTRADAY_REFRESH_SECONDS", "300"))
+# Bars in an outputsize=compact intraday response
+INTRADAY_COMPACT_BARS = 100
+# (symbol, interval minutes) -> monotonic time of the last upstream fetch
+intraday_fetched_at: Dict[tuple, float] = {}
+
+async def refresh_intraday(symbol: str, minutes: int) -> int:
+    """Append upstream intraday bars from the newest stored one on; returns the number of new bars
+
+    The first fetch for a series (or one after a gap longer than a compact
+    response covers) asks for the full month; later ones for the latest
+    100 bars. Concurrent refreshes of the same series share one call.
+    """
+    async def refresh():
+        last = db.db.get_intraday_watermark(symbol, minutes)
+        outputsize = "compact"
+        if last is None or datetime.now() - last > pd.Timedelta(minutes=minutes * INTRADAY_COMPACT_BARS):
+            outputsize = "full"
+        bars = await fetcher.get_intraday_data(symbol, minutes, outputsize)
+        intraday_fetched_at[(symbol, minutes)] = time.monotonic()
+        if bars is None or bars.empty:
+            return 0
+        return await db.insert_intraday_bars(symbol, minutes, bars)
+
+    return await flights.do(("intraday", symbol, minutes), refresh)
+
+@app.get("/stocks/{symbol}/intraday", response_model=HistoricDataResponse)
+async def get_stock_intraday(
+    request: Request,
+    symbol: str,
+    interval: str = "5min",
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    format: Optional[str] = None
+):
+    """Get intraday bars (1min, 5min, 15min, 30min or 60min) as JSON, Arrow IPC or Parquet
 
-            if historic_data is not None and not historic_data.empty:
-                db.insert_historic_data(symbol, historic_data)
-                df = db.get_historic_data(symbol, start_date, end_date)
+    Dates select whole trading days; without them the latest stored day is
+    returned. Stored bars are topped up from upstream at most every
+    INTRADAY_REFRESH_SECONDS while the market is open.
+    """
+    try:
+        fmt = negotiate_format(request.headers.get("accept"), format)
+    except ValueError as e:
+        raise HTTPException(status_code=406, detail=str(e))
 
-        # Convert to list of dicts
-        data_list = []
-        for index, row in df.iterrows():
-            try:
-                # Handle different index formats safely
-                if hasattr(index, 'isoformat'):
-                    timestamp = index.isoformat()
-                elif hasattr(index, 'strftime'):
-                    timestamp = index.strftime('%Y-%m-%dT%H:%M:%S')
-                else:
-                    # Fallback for unexpected formats
-                    timestamp = str(index)
-
-                data_list.append({
-                    'timestamp': timestamp,
-                    'open': float(row['open_price']),
-                    'high': float(row['high_price']),
-                    'low': float(row['low_price']),
-                    'close': float(row['close_price']),
-                    'volume': int(row['volume'])
-                })
-            except Exception as row_error:
-                print(f"⚠️ Skipping invalid row: {row_error}")
-                continue
-
-        return HistoricDataResponse(symbol=symbol, data=data_list)
+    try:
+        minutes = parse_intraday_interval(interval)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+    # Known aliases map to their canonical symbol; intraday never triggers a symbol search
+    known, alias_target = symbol_resolver.lookup(symbol)
+    if known and alias_target:
+        symbol = alias_target
+
+    try:
+        fetched_at = intraday_fetched_at.get((symbol, minutes))
+        recent = fetched_at is not None and time.monotonic() - fetched_at < INTRADAY_REFRESH_SECONDS
+        if not recent and (db.db.get_intraday_watermark(symbol, minutes) is None or fetcher.is_market_open()):
+            await refresh_intraday(symbol, minutes)
+
+        last = db.db.get_intraday_watermark(symbol, minutes)
+        if last is None:
+            raise HTTPException(status_code=404, detail=f"No intraday data for {symbol}")
+        if not start_date and not end_date:
+            start_date = end_date = last.strftime("%Y-%m-%d")
+
+        if fmt != "json":
+            table = await db.get_intraday_arrow([symbol], minutes, start_date, end_date)
+            return await binary_history_response(table, fmt)
+        df = await db.get_intraday_data(symbol, minutes, start_date, end_date)
+        return StreamingResponse(iter_history_json(symbol, df), media_type="application/json")
+
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database query timed out")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching historic data: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching intraday data: {str(e)}")
+
+@app.get("/stocks/{symbol}/indicators")
+async def get_stock_indicators(
+    request: Request,
+    symbol: str,
+    indicators: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+):
+    """Get technical indicators, e.g. ?indicators=sma:50,ema:20,rsi:14,macd:12:26:9,bbands:20:2,atr:14,vwap:20
+
+    Indicators are computed over the full stored history (so warmup doesn't
+    depend on the requested range) and then sliced to start_date/end_date.
+    """
+    try:
+        specs = parse_indicators(indicators)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        variant = ("indicators", tuple(spec.key for spec in specs), start_date, end_date)
+        version = await history_version(symbol)
+        headers = None
+        if version is not None:
+            headers = validator_headers(make_etag(symbol, version, variant), version)
+            if is_not_modified(request.headers, headers["ETag"], version):
+                return not_modified_response(headers)
+            cached = response_cache.get(symbol, variant, version)
+            if cached is not None:
+                return Response(content=cached[0], media_type=cached[1], headers=headers)
+
+        frame = await db.run_read(indicator_engine.get, symbol, specs, start_date, end_date)
+
+        if frame.empty:
+            stored_symbol = await fetch_and_store_history(symbol)
+            if stored_symbol:
+                symbol = stored_symbol
+                frame = await db.run_read(indicator_engine.get, symbol, specs, start_date, end_date)
+            version = headers = None
+
+        if frame.empty:
+            raise HTTPException(status_code=404, detail=f"No historic data found for {symbol}")
+
+        body = await run_in_threadpool(indicators_json, symbol, frame)
+        if version is not None:
+            response_cache.set(symbol, variant, version, body, "application/json")
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database query timed out")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing indicators: {str(e)}")
 
 @app.get("/market/status")
 async def get_market_status():
@@ -464,13 +1213,13 @@ async def get_market_status():
 @app.get("/stocks")
 async def get_available_stocks():
     """Get list of available stocks"""
-    symbols = db.get_all_symbols()
+    symbols = await db.get_all_symbols()
     return {"available_stocks": symbols}
 
 @app.get("/system/status")
 async def get_system_status():
     """Get system status including background task info"""
-    popular_symbols = ["IBM", "AAPL", "MSFT", "GOOGL"]
+    popular_symbols = POPULAR_SYMBOLS
 
     status_info = {
         "database_path": "stock_data.duckdb",
@@ -482,16 +1231,27 @@ async def get_system_status():
             "symbols_per_cycle": len(popular_symbols)
         },
         "api_limits": {
-            "alpha_vantage_free_tier": "25 calls/day, 5 calls/minute"
-        }
+            "alpha_vantage_free_tier": "25 calls/day, 5 calls/minute",
+            "quota": fetcher.scheduler.status()
+        },
+        "request_coalescing": flights.stats(),
+        "quote_cache": fetcher.cache.stats(),
+        "symbol_aliases": symbol_resolver.stats(),
+        "indicator_cache": indicator_engine.stats(),
+        "response_cache": response_cache.stats(),
+        "websockets": manager.stats()
     }
 
     # Check data freshness for popular symbols
     data_status = {}
+    try:
+        historic_records = await db.count_historic_records(popular_symbols)
+    except Exception as e:
+        historic_records = {}
+        status_info["historic_records_error"] = str(e)
     for symbol in popular_symbols:
         try:
-            latest_price = db.get_latest_price(symbol)
-            historic_data = db.get_historic_data(symbol)
+            latest_price = await db.get_latest_price(symbol)
 
             if latest_price:
                 last_update = latest_price['last_updated']
@@ -499,7 +1259,7 @@ async def get_system_status():
                 data_status[symbol] = {
                     "price": latest_price['price'],
                     "last_updated_hours_ago": round(hours_since_update, 1),
-                    "historic_records": len(historic_data) if historic_data is not None else 0
+                    "historic_records": historic_records.get(symbol, 0)
                 }
             else:
                 data_status[symbol] = {"status": "no_data"}
@@ -509,6 +1269,74 @@ async def get_system_status():
     status_info["data_status"] = data_status
     return status_info
 
+# Component gauges, refreshed from each component's stats() on every scrape
+CACHE_HITS = gauge("cache_hits", "Lookups served from cache", ["cache"])
+CACHE_MISSES = gauge("cache_misses", "Lookups that missed the cache", ["cache"])
+CACHE_HIT_RATIO = gauge("cache_hit_ratio", "Cache hits / lookups", ["cache"])
+CACHE_ENTRIES = gauge("cache_entries", "Entries held by each cache", ["cache"])
+WEBSOCKET_GAUGE = gauge("websocket_connections", "Live WebSocket subscribers and producers", ["kind"])
+WEBSOCKET_QUEUED = gauge("websocket_queued_messages", "Messages waiting in outbound WebSocket queues")
+WEBSOCKET_SHED = gauge("websocket_shed_messages", "Messages dropped or conflated for slow clients", ["reason"])
+QUOTA_REMAINING = gauge("alpha_vantage_quota_remaining", "Upstream calls left in the current window", ["window"])
+QUOTA_QUEUED = gauge("alpha_vantage_queued_calls", "Calls waiting for an upstream token", ["priority"])
+
+
+def _set_cache(name: str, hits: int, misses: int, entries: int):
+    CACHE_HITS.set(hits, cache=name)
+    CACHE_MISSES.set(misses, cache=name)
+    CACHE_HIT_RATIO.set(hits / (hits + misses) if hits + misses else 0.0, cache=name)
+    CACHE_ENTRIES.set(entries, cache=name)
+
+
+def collect_component_metrics():
+    quotes = fetcher.cache.stats()
+    _set_cache("quote", quotes["hits"] + quotes["stale_hits"], quotes["misses"], quotes["size"])
+    indicators = indicator_engine.stats()
+    _set_cache("indicator", indicators["hits"], indicators["full_computes"] + indicators["incremental_updates"],
+               indicators["entries"])
+    aliases = symbol_resolver.stats()
+    _set_cache("symbol_alias", aliases["hits"], aliases["misses"], aliases["aliases"])
+    responses = response_cache.stats()
+    _set_cache("response", responses["hits"] + responses["not_modified"], responses["misses"], responses["entries"])
+    coalescing = flights.stats()
+    _set_cache("single_flight", coalescing["coalesced"], coalescing["executed"], coalescing["in_flight"])
+
+    sockets = manager.stats()
+    for kind in ("symbols", "clients", "streams", "producers"):
+        WEBSOCKET_GAUGE.set(sockets[kind], kind=kind)
+    WEBSOCKET_QUEUED.set(sockets["queued"])
+    WEBSOCKET_SHED.set(sockets["dropped"], reason="dropped")
+    WEBSOCKET_SHED.set(sockets["conflated"], reason="conflated")
+    WEBSOCKET_SHED.set(sockets["forced_disconnects"], reason="disconnected")
+
+    quota = fetcher.scheduler.status()
+    QUOTA_REMAINING.set(quota["minute_remaining"], window="minute")
+    QUOTA_REMAINING.set(quota["day_remaining"], window="day")
+    for priority, waiting in quota["queued"].items():
+        QUOTA_QUEUED.set(waiting, priority=priority)
+
+
+REGISTRY.add_collector(collect_component_metrics)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text-format metrics: upstream, DuckDB and endpoint latency, caches, WebSockets"""
+    return Response(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/system/storage")
+async def get_storage_status():
+    """Database, table and index sizes, plus how many row groups an average symbol's bars span"""
+    try:
+        return await db.storage_report()
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database query timed out")
+
+@app.get("/system/quota")
+async def get_api_quota():
+    """Get remaining Alpha Vantage budget and queued calls per priority"""
+    return fetcher.scheduler.status()
+
 @app.get("/debug/api-test")
 async def test_api_connection():
     """Test Alpha Vantage API connection and key validity"""
@@ -516,13 +1344,13 @@ async def test_api_connection():
         # Test with a simple symbol
         test_symbol = "IBM"  # International symbol that's usually available
 
-        print("🔧 Running API connectivity test...")
+        logger.info("🔧 Running API connectivity test...")
 
         # Test live price
-        live_result = fetcher.get_live_price(test_symbol)
+        live_result = await fetcher.get_live_price(test_symbol)
 
         # Test historical data
-        hist_result = fetcher.get_historic_data(test_symbol, "compact")
+        hist_result = await fetcher.get_historic_data(test_symbol, "compact")
 
         test_results = {
             "api_key_configured": bool(fetcher.api_key),
@@ -539,7 +1367,7 @@ async def test_api_connection():
         if hist_result is not None:
             test_results["sample_records"] = len(hist_result)
 
-        print(f"🔧 API Test Results: Live={test_results['live_price_test']}, Historical={test_results['historical_data_test']}")
+        logger.info("🔧 API Test Results: Live=%s, Historical=%s", test_results['live_price_test'], test_results['historical_data_test'])
 
         return test_results
 
@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+
+class QuoteCache:
+    """Bounded in-process latest-quote cache with LRU eviction
+
+    Entries never expire on their own; instead each read reports whether the
+    quote is still fresh, judged by the age of its ``last_updated`` against
+    a TTL that is short while the market is open and long when it is closed.
+    Callers serve stale quotes immediately and refresh them in the
+    background (stale-while-revalidate).
+    """
+
+    def __init__(self, max_entries: int = 1024, open_ttl: float = 15.0, closed_ttl: float = 3600.0,
+                 is_market_open: Optional[Callable[[], bool]] = None):
+        self.max_entries = max_entries
+        self.open_ttl = open_ttl
+        self.closed_ttl = closed_ttl
+        self.is_market_open = is_market_open or (lambda: True)
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def ttl(self) -> float:
+        """Seconds a quote stays fresh right now"""
+        return self.open_ttl if self.is_market_open() else self.closed_ttl
+
+    def is_fresh(self, quote: Dict[str, Any]) -> bool:
+        last_updated = quote.get('last_updated')
+        if last_updated is None:
+            return False
+        return (datetime.now() - last_updated).total_seconds() <= self.ttl()
+
+    def get(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """Return the cached quote (fresh or stale), or None on a miss"""
+        with self._lock:
+            quote = self._entries.get(symbol)
+            if quote is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(symbol)
+
+        if self.is_fresh(quote):
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+        return quote
+
+    def set(self, symbol: str, quote: Dict[str, Any]):
+        with self._lock:
+            current = self._entries.get(symbol)
+            # Never let an older row (e.g. from DuckDB) replace a newer fetch
+            if current is not None and quote.get('last_updated') and current.get('last_updated') \
+                    and quote['last_updated'] < current['last_updated']:
+                self._entries.move_to_end(symbol)
+                return
+            self._entries[symbol] = dict(quote)
+            self._entries.move_to_end(symbol)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, symbol: str):
+        with self._lock:
+            self._entries.pop(symbol, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl(),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
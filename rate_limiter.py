@@ -0,0 +1,257 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from enum import IntEnum
+from typing import Dict, Optional
+
+logger = logging.getLogger("ohlcv.rate_limiter")
+
+
+class Priority(IntEnum):
+    """Upstream call classes; lower values are served first"""
+    INTERACTIVE = 0  # REST requests a user is waiting on
+    REALTIME = 1     # WebSocket live-price refresh
+    BACKGROUND = 2   # Popular-stock updates and backfill
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call is shed instead of waiting for upstream budget"""
+
+
+class SlidingWindow:
+    """At most ``limit`` grants in any ``period``-second span, tracked as grant timestamps
+
+    Unlike a token bucket that starts full and refills continuously, this
+    never lets more than ``limit`` calls through in a single window.
+    """
+
+    def __init__(self, limit: int, period: float):
+        self.limit = limit
+        self.period = period
+        self.grants = deque()
+
+    def _expire(self, now: float):
+        while self.grants and self.grants[0] <= now - self.period:
+            self.grants.popleft()
+
+    def remaining(self, now: float) -> int:
+        self._expire(now)
+        return self.limit - len(self.grants)
+
+    def time_until(self, now: float) -> float:
+        """Seconds until another grant fits in the window (0 if one does now)"""
+        if self.remaining(now) > 0:
+            return 0.0
+        return self.grants[0] + self.period - now
+
+    def record(self, now: float):
+        self.grants.append(now)
+
+
+class DailyCounter:
+    """Calls made on the current UTC calendar day, against a ``limit``
+
+    The count resets at UTC midnight. With ``path`` set, it is saved to a
+    small JSON file after every call and reloaded on start, so restarting
+    the process doesn't hand out the day's budget again.
+    """
+
+    def __init__(self, limit: int, path: Optional[str] = None):
+        self.limit = limit
+        self.path = path
+        self.day = self._today()
+        self.used = 0
+        self._load()
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).date().isoformat()
+
+    def _roll(self):
+        today = self._today()
+        if today != self.day:
+            self.day = today
+            self.used = 0
+
+    def remaining(self) -> int:
+        self._roll()
+        return self.limit - self.used
+
+    def time_until(self) -> float:
+        """Seconds until a call is allowed: 0, or the time left until UTC midnight"""
+        if self.remaining() > 0:
+            return 0.0
+        now = datetime.now(timezone.utc)
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+        return (midnight - now).total_seconds()
+
+    def record(self):
+        self._roll()
+        self.used += 1
+        self._save()
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+            if state.get("day") == self.day:
+                self.used = int(state.get("used", 0))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.warning("⚠️ Ignoring unreadable quota state %s: %s", self.path, e)
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"day": self.day, "used": self.used}, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("⚠️ Could not save quota state %s: %s", self.path, e)
+
+
+class AlphaVantageScheduler:
+    """Central per-minute/per-day budget for every Alpha Vantage call
+
+    Callers acquire one token per upstream request. The minute limit is a
+    sliding 60 s window and the daily limit a UTC calendar-day count
+    (persisted to ``state_path`` when given). Waiting callers are
+    served strictly by priority, then arrival order. Each priority keeps a
+    share of the daily budget out of reach of lower priorities, so when the
+    day's quota runs low, background work is shed first, then WebSocket
+    refreshes, and interactive requests get what is left.
+    """
+
+    # Fraction of the daily budget each priority may not dip into
+    DEFAULT_RESERVES = {
+        Priority.INTERACTIVE: 0.0,
+        Priority.REALTIME: 0.2,
+        Priority.BACKGROUND: 0.4,
+    }
+    # How long each priority may queue before it is shed (None = wait indefinitely)
+    DEFAULT_MAX_WAIT = {
+        Priority.INTERACTIVE: 20.0,
+        Priority.REALTIME: 30.0,
+        Priority.BACKGROUND: None,
+    }
+
+    def __init__(self, per_minute: int = 5, per_day: int = 25,
+                 reserves: Optional[Dict[Priority, float]] = None,
+                 max_wait: Optional[Dict[Priority, Optional[float]]] = None,
+                 state_path: Optional[str] = None):
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self.minute_window = SlidingWindow(per_minute, 60.0)
+        self.day_counter = DailyCounter(per_day, state_path)
+        self.reserves = {p: (reserves or self.DEFAULT_RESERVES)[p] * per_day for p in Priority}
+        self.max_wait = dict(max_wait or self.DEFAULT_MAX_WAIT)
+
+        self._lock = threading.Lock()
+        self._waiters = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self.granted = {p.name.lower(): 0 for p in Priority}
+        self.shed = {p.name.lower(): 0 for p in Priority}
+
+    def _try_take(self, priority: Priority, entry=None) -> float:
+        """Take a token if allowed; returns 0 on success, else seconds to wait
+
+        Raises RateLimitExceeded when the daily budget left is inside this
+        priority's reserve.
+        """
+        with self._lock:
+            now = time.monotonic()
+            day_remaining = self.day_counter.remaining()
+
+            if day_remaining - 1 < self.reserves[priority]:
+                raise RateLimitExceeded(
+                    f"Daily Alpha Vantage budget reserved for higher-priority calls "
+                    f"({day_remaining}/{self.per_day} left)"
+                )
+
+            # Only the head of the queue may take a token
+            if self._waiters and self._waiters[0] != entry:
+                if entry is not None or self._waiters[0][0] <= priority:
+                    return max(self.minute_window.time_until(now), 0.05)
+
+            wait = max(self.minute_window.time_until(now), self.day_counter.time_until())
+            if wait > 0:
+                return wait
+
+            self.minute_window.record(now)
+            self.day_counter.record()
+            self.granted[priority.name.lower()] += 1
+            return 0.0
+
+    def _shed(self, priority: Priority, reason: str):
+        with self._lock:
+            self.shed[priority.name.lower()] += 1
+        raise RateLimitExceeded(reason)
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE):
+        """Wait for one upstream call's worth of budget, honoring priority"""
+        max_wait = self.max_wait.get(priority)
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+
+        entry = (int(priority), next(self._seq))
+        with self._lock:
+            heapq.heappush(self._waiters, entry)
+        try:
+            while True:
+                try:
+                    wait = self._try_take(priority, entry)
+                except RateLimitExceeded as e:
+                    self._shed(priority, str(e))
+                if wait == 0:
+                    return
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    self._shed(priority, f"Alpha Vantage rate limit: no budget within {max_wait:.0f}s")
+                # Re-check at least once a second so higher-priority arrivals are seen
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            with self._lock:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+
+    def acquire_blocking(self, priority: Priority = Priority.INTERACTIVE):
+        """Thread-blocking variant of acquire() for the sync fetcher"""
+        max_wait = self.max_wait.get(priority)
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        while True:
+            try:
+                wait = self._try_take(priority)
+            except RateLimitExceeded as e:
+                self._shed(priority, str(e))
+            if wait == 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                self._shed(priority, f"Alpha Vantage rate limit: no budget within {max_wait:.0f}s")
+            time.sleep(min(wait, 1.0))
+
+    def status(self) -> dict:
+        """Remaining quota and queue state for status endpoints"""
+        with self._lock:
+            now = time.monotonic()
+            queued = {p.name.lower(): 0 for p in Priority}
+            for priority, _ in self._waiters:
+                queued[Priority(priority).name.lower()] += 1
+            return {
+                "calls_per_minute": self.per_minute,
+                "calls_per_day": self.per_day,
+                "minute_remaining": self.minute_window.remaining(now),
+                "day_remaining": self.day_counter.remaining(),
+                "queued": queued,
+                "granted": dict(self.granted),
+                "shed": dict(self.shed),
+            }
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import time
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+from fastapi import WebSocket, WebSocketDisconnect
+
+from responses import HISTORY_FIELDS, format_timestamps
+
+# Upper bound on bars per frame
+MAX_REPLAY_BATCH = 5000
+
+# Replay directions: newest first (the history socket's original order) or oldest first
+REPLAY_ORDERS = ("desc", "asc")
+
+
+def parse_speed(speed: Optional[str]) -> Optional[float]:
+    """Parse ``speed``: "max"/empty for max throughput, otherwise a positive real-time multiple"""
+    if speed is None or speed.strip().lower() in ("", "max"):
+        return None
+    value = float(speed)
+    if value <= 0:
+        raise ValueError("speed must be positive or 'max'")
+    return value
+
+
+class HistoryReplay:
+    """Replays one symbol's bars to a single WebSocket in table order
+
+    The caller orders the table: newest first by default, oldest first with
+    ``order=asc``.
+
+    * ``batch_size`` bars go out per frame. With 1, each frame is the flat
+      per-bar payload the history socket has always sent. With more, a
+      frame is ``{"symbol", "bars": [...], "cursor"}``.
+    * ``speed`` is a multiple of real time: bars one trading day apart are
+      sent 86400 / speed seconds apart. None sends as fast as the socket
+      drains.
+    * ``credit`` turns on ack-based flow control. The server sends at most
+      that many frames ahead of the client, and the client grants more by
+      sending ``{"ack": n}``. ``{"action": "stop"}`` ends the replay early.
+    * Every frame's cursor is the timestamp of its last bar. Reconnecting
+      with ``?cursor=`` (and the same order) resumes strictly after it in
+      replay order.
+    """
+
+    def __init__(self, websocket: WebSocket, symbol: str, table: pa.Table, batch_size: int = 1,
+                 speed: Optional[float] = None, credit: Optional[int] = None):
+        self.websocket = websocket
+        self.symbol = symbol
+        self.table = table
+        self.batch_size = batch_size
+        self.speed = speed
+        self.credits = credit
+        self._credit_granted = asyncio.Event()
+        self.stopped = False
+        self.frames_sent = 0
+        self.bars_sent = 0
+
+    def _columns(self) -> tuple:
+        """Pull the replay columns out of the Arrow table once, plus epoch seconds for pacing"""
+        timestamps = self.table.column('timestamp').to_pandas()
+        return (
+            format_timestamps(timestamps),
+            self.table.column('open').to_pylist(),
+            self.table.column('high').to_pylist(),
+            self.table.column('low').to_pylist(),
+            self.table.column('close').to_pylist(),
+            self.table.column('volume').to_pylist(),
+        ), pd.DatetimeIndex(timestamps).as_unit('s').asi8
+
+    def _frame(self, columns: tuple, start: int, stop: int) -> str:
+        bars = [dict(zip(HISTORY_FIELDS, row)) for row in zip(*(column[start:stop] for column in columns))]
+        if self.batch_size == 1:
+            return json.dumps(dict(symbol=self.symbol, **bars[0]), separators=(',', ':'))
+        return json.dumps({"symbol": self.symbol, "bars": bars, "cursor": bars[-1]['timestamp']},
+                          separators=(',', ':'))
+
+    async def _receive_control(self):
+        """Read client control messages (acks, stop) until the socket closes"""
+        try:
+            while True:
+                try:
+                    message = json.loads(await self.websocket.receive_text())
+                except (ValueError, TypeError):
+                    continue
+                if not isinstance(message, dict):
+                    continue
+                if message.get("action") == "stop":
+                    self.stopped = True
+                elif "ack" in message and self.credits is not None:
+                    self.credits += max(int(message["ack"]), 0)
+                self._credit_granted.set()
+        except (WebSocketDisconnect, RuntimeError):
+            self.stopped = True
+            self._credit_granted.set()
+
+    async def _wait_for_credit(self):
+        while self.credits is not None and self.credits <= 0 and not self.stopped:
+            self._credit_granted.clear()
+            await self._credit_granted.wait()
+
+    async def run(self) -> Optional[str]:
+        """Send every bar (or until stopped) and return the cursor of the last bar sent"""
+        columns, seconds = self._columns()
+        total = len(columns[0])
+        cursor = None
+        control = asyncio.create_task(self._receive_control())
+        started = time.monotonic()
+
+        try:
+            for start in range(0, total, self.batch_size):
+                stop = min(start + self.batch_size, total)
+
+                if self.speed is not None:
+                    # Pace against the replay clock so sleep jitter doesn't accumulate
+                    due = started + abs(seconds[stop - 1] - seconds[0]) / self.speed
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+                await self._wait_for_credit()
+                if self.stopped:
+                    break
+
+                await self.websocket.send_text(self._frame(columns, start, stop))
+                cursor = columns[0][stop - 1]
+                self.frames_sent += 1
+                self.bars_sent += stop - start
+                if self.credits is not None:
+                    self.credits -= 1
+                # Give the control reader a turn even when sends never block
+                await asyncio.sleep(0)
+
+            if not self.stopped:
+                await self.websocket.send_text(json.dumps({
+                    "info": "history_end",
+                    "symbol": self.symbol,
+                    "bars_sent": self.bars_sent,
+                    "cursor": cursor
+                }))
+        finally:
+            control.cancel()
+            await asyncio.gather(control, return_exceptions=True)
+
+        return cursor
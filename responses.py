@@ -0,0 +1,139 @@
+import json
+from typing import Iterator, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Bars per streamed chunk for history responses
+HISTORY_CHUNK_SIZE = 2000
+
+HISTORY_FIELDS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+ARROW_STREAM_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+PARQUET_MEDIA_TYPE = 'application/vnd.apache.parquet'
+
+# Explicit ?format= values and the Accept media types that select them
+FORMAT_MEDIA_TYPES = {
+    'json': 'application/json',
+    'arrow': ARROW_STREAM_MEDIA_TYPE,
+    'parquet': PARQUET_MEDIA_TYPE,
+}
+ACCEPT_FORMATS = {
+    ARROW_STREAM_MEDIA_TYPE: 'arrow',
+    'application/vnd.apache.arrow.file': 'arrow',
+    PARQUET_MEDIA_TYPE: 'parquet',
+    'application/x-parquet': 'parquet',
+    'application/parquet': 'parquet',
+}
+
+
+def format_timestamps(index) -> list:
+    """Format a datetime index as ISO-8601 strings in one vectorized pass"""
+    return pd.DatetimeIndex(index).strftime('%Y-%m-%dT%H:%M:%S').tolist()
+
+
+def history_columns(df: pd.DataFrame) -> tuple:
+    """Pull the history columns out of a stock_prices frame as plain Python lists"""
+    return (
+        format_timestamps(df.index),
+        df['open_price'].astype('float64').tolist(),
+        df['high_price'].astype('float64').tolist(),
+        df['low_price'].astype('float64').tolist(),
+        df['close_price'].astype('float64').tolist(),
+        df['volume'].astype('int64').tolist(),
+    )
+
+
+def _iter_record_chunks(columns: tuple, chunk_size: int) -> Iterator[bytes]:
+    """Yield comma-joined JSON records for parallel column lists, chunk by chunk"""
+    total = len(columns[0])
+    for start in range(0, total, chunk_size):
+        stop = min(start + chunk_size, total)
+        records = [
+            dict(zip(HISTORY_FIELDS, row))
+            for row in zip(*(column[start:stop] for column in columns))
+        ]
+        body = json.dumps(records, separators=(',', ':'))[1:-1]
+        yield (body if start == 0 else ',' + body).encode()
+
+
+def iter_history_json(symbol: str, df: pd.DataFrame, chunk_size: int = HISTORY_CHUNK_SIZE) -> Iterator[bytes]:
+    """Stream ``{"symbol": ..., "data": [...]}`` in chunks of ``chunk_size`` bars
+
+    Produces the same document as HistoricDataResponse without building the
+    whole payload or validating every row through Pydantic.
+    """
+    yield ('{"symbol":%s,"data":[' % json.dumps(symbol)).encode()
+    if not df.empty:
+        yield from _iter_record_chunks(history_columns(df), chunk_size)
+    yield b']}'
+
+
+def iter_multi_history_json(symbols: list, table: pa.Table, chunk_size: int = HISTORY_CHUNK_SIZE) -> Iterator[bytes]:
+    """Stream ``{"symbols": [...], "data": {symbol: [...]}}`` from a get_historic_arrow table"""
+    yield ('{"symbols":%s,"data":{' % json.dumps(symbols)).encode()
+
+    df = table.to_pandas()
+    first = True
+    for symbol, group in df.groupby('symbol', sort=True):
+        columns = (
+            format_timestamps(group['timestamp']),
+            group['open'].astype('float64').tolist(),
+            group['high'].astype('float64').tolist(),
+            group['low'].astype('float64').tolist(),
+            group['close'].astype('float64').tolist(),
+            group['volume'].astype('int64').tolist(),
+        )
+        yield (('' if first else ',') + '%s:[' % json.dumps(symbol)).encode()
+        yield from _iter_record_chunks(columns, chunk_size)
+        yield b']'
+        first = False
+
+    yield b'}}'
+
+
+def negotiate_format(accept: Optional[str], requested: Optional[str] = None) -> str:
+    """Pick json/arrow/parquet from an explicit ?format= or the Accept header"""
+    if requested:
+        requested = requested.lower()
+        if requested not in FORMAT_MEDIA_TYPES:
+            raise ValueError(f"Unsupported format: {requested}. Use one of: {', '.join(FORMAT_MEDIA_TYPES)}")
+        return requested
+
+    if accept:
+        for part in accept.split(','):
+            media_type = part.split(';')[0].strip().lower()
+            if media_type in ACCEPT_FORMATS:
+                return ACCEPT_FORMATS[media_type]
+
+    return 'json'
+
+
+def encode_arrow_table(table: pa.Table, fmt: str) -> memoryview:
+    """Serialize an Arrow table as an IPC stream or Parquet file
+
+    Returns a memoryview over the Arrow output buffer so the bytes go to the
+    response body without another copy.
+    """
+    sink = pa.BufferOutputStream()
+    if fmt == 'arrow':
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif fmt == 'parquet':
+        pq.write_table(table, sink, compression='zstd')
+    else:
+        raise ValueError(f"Unsupported binary format: {fmt}")
+    return memoryview(sink.getvalue())
+
+
+def indicators_json(symbol: str, frame: pd.DataFrame) -> bytes:
+    """Serialize an indicator frame as ``{"symbol", "indicators", "data": [...]}`` with NaN as null"""
+    columns = list(frame.columns)
+    values = frame.astype('float64').round(6)
+    values = values.astype(object).where(values.notna(), None)
+    records = [
+        dict(zip(['timestamp'] + columns, row))
+        for row in zip(format_timestamps(frame.index), *(values[c].tolist() for c in columns))
+    ]
+    return json.dumps({"symbol": symbol, "indicators": columns, "data": records}, separators=(',', ':')).encode()
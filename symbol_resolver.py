@@ -0,0 +1,110 @@
+import csv
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+# Exchange suffixes in preference order when a bare ticker has several listings
+PREFERRED_SUFFIXES = (".NS", ".BO")
+
+
+def normalize_alias(text: str) -> str:
+    return text.strip().upper()
+
+
+class SymbolResolver:
+    """In-memory map of user input -> canonical symbol, mirrored in symbol_aliases
+
+    Positive entries never expire. Negative entries (searches that found
+    nothing) expire after ``negative_ttl`` seconds, which keeps repeated
+    typos from spending quota. Searches that failed (rate limits, upstream
+    errors) are not remembered at all.
+    """
+
+    def __init__(self, negative_ttl: float = 3600.0):
+        self.negative_ttl = negative_ttl
+        # alias -> (symbol or None, expires_at or None)
+        self._aliases: Dict[str, Tuple[Optional[str], Optional[datetime]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, rows):
+        """Load (alias, symbol, source, resolved_at, expires_at) rows, e.g. from get_symbol_aliases()"""
+        with self._lock:
+            for alias, symbol, _source, _resolved_at, expires_at in rows:
+                self._aliases[normalize_alias(alias)] = (symbol, expires_at)
+        return len(rows)
+
+    def lookup(self, text: str) -> Tuple[bool, Optional[str]]:
+        """Return (known, symbol); symbol is None for a cached negative result"""
+        alias = normalize_alias(text)
+        with self._lock:
+            entry = self._aliases.get(alias)
+            if entry is not None:
+                symbol, expires_at = entry
+                if expires_at is None or expires_at > datetime.now():
+                    self.hits += 1
+                    return True, symbol
+                del self._aliases[alias]
+            self.misses += 1
+            return False, None
+
+    def remember(self, text: str, symbol: Optional[str], source: str = "search") -> tuple:
+        """Record a resolution and return the row to persist in symbol_aliases"""
+        alias = normalize_alias(text)
+        now = datetime.now()
+        expires_at = None if symbol else now + timedelta(seconds=self.negative_ttl)
+        with self._lock:
+            self._aliases[alias] = (symbol, expires_at)
+        return (alias, symbol, source, now, expires_at)
+
+    def load_listing(self, path: str) -> List[tuple]:
+        """Preload aliases from a local listing file and return the rows to persist
+
+        Accepts either an ``alias,symbol`` mapping or an Alpha Vantage
+        LISTING_STATUS style CSV with a ``symbol`` column. For listings, each
+        symbol maps to itself and bare tickers of exchange-suffixed symbols
+        (TCS for TCS.NS) map to the preferred listing.
+        """
+        now = datetime.now()
+        mapping: Dict[str, str] = {}
+
+        with open(path, newline="") as f:
+            reader = csv.DictReader(f)
+            fields = {name.strip().lower() for name in reader.fieldnames or []}
+            if "symbol" not in fields:
+                raise ValueError(f"Listing file {path} has no 'symbol' column")
+
+            for row in reader:
+                row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+                symbol = row.get("symbol")
+                if not symbol:
+                    continue
+                if "alias" in fields:
+                    mapping[normalize_alias(row["alias"])] = symbol
+                    continue
+
+                mapping[normalize_alias(symbol)] = symbol
+                for rank, suffix in enumerate(PREFERRED_SUFFIXES):
+                    if symbol.upper().endswith(suffix):
+                        base = normalize_alias(symbol[:-len(suffix)])
+                        current = mapping.get(base)
+                        current_rank = next(
+                            (i for i, s in enumerate(PREFERRED_SUFFIXES) if current and current.upper().endswith(s)),
+                            len(PREFERRED_SUFFIXES)
+                        )
+                        # A bare ticker that is itself listed keeps mapping to itself
+                        if current is None or (current.upper() != base and rank < current_rank):
+                            mapping[base] = symbol
+
+        rows = [(alias, symbol, "listing", now, None) for alias, symbol in mapping.items()]
+        with self._lock:
+            for alias, symbol, _source, _resolved_at, expires_at in rows:
+                self._aliases[alias] = (symbol, expires_at)
+        return rows
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def stats(self) -> dict:
+        return {"aliases": len(self._aliases), "hits": self.hits, "misses": self.misses}